@@ -0,0 +1,140 @@
+"""
+Benchmark approximate FAISS index types against the exact flat index.
+
+For every index type and search setting, reports recall@k against the flat
+baseline, single-query latency and the serialized index size. Embeddings come
+from an existing flat index, from embedding the dataset with UniXcoder, or
+from a synthetic clustered collection for testing at larger scales.
+
+Usage (from the backend directory):
+    python benchmarks/ann_recall.py --index unixcoder-fft/faiss_index.bin
+    python benchmarks/ann_recall.py --synthetic 1000000 --output ann_recall.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(backend_dir)
+
+from common.generation.index_factory import create_index, set_search_params, train_index
+
+# Search settings swept for each index type
+SEARCH_SWEEPS = {
+    "flat": [{}],
+    "ivf": [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+    "hnsw": [{"ef_search": ef_search} for ef_search in (16, 64, 256)],
+    "ivfpq": [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+}
+
+
+def load_embeddings(args):
+    if args.index:
+        index = faiss.read_index(args.index)
+        return index.reconstruct_n(0, index.ntotal)
+
+    if args.synthetic:
+        # Gaussian clusters, so that neighborhoods are meaningful as in real embeddings
+        rng = np.random.default_rng(args.seed)
+        centers = rng.normal(size=(max(1, args.synthetic // 1000), args.dimension)).astype("float32")
+        assignments = rng.integers(len(centers), size=args.synthetic)
+        noise = rng.normal(scale=0.3, size=(args.synthetic, args.dimension)).astype("float32")
+        return centers[assignments] + noise
+
+    from transformers import AutoModel, RobertaTokenizerFast
+    from common.classification.dataset import load_dataset
+    from common.generation.rag_generator import embed_texts
+
+    tokenizer = RobertaTokenizerFast.from_pretrained('microsoft/unixcoder-base')
+    model = AutoModel.from_pretrained('microsoft/unixcoder-base')
+    texts = [example['input'] for example in load_dataset(args.dataset)]
+    return embed_texts(texts, model, tokenizer)
+
+
+def recall_at_k(found, expected):
+    hits = sum(len(set(row_found) & set(row_expected)) for row_found, row_expected in zip(found, expected))
+    return hits / expected.size
+
+
+def time_queries(index, queries, k):
+    # Query one at a time, as the API does
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--index", help="Existing flat FAISS index to take the embeddings from.")
+    source.add_argument("--synthetic", type=int, help="Number of synthetic vectors to generate.")
+    parser.add_argument("--dataset", default=os.path.join(backend_dir, "data", "6000-merged_dataset.json"))
+    parser.add_argument("--dimension", type=int, default=768, help="Size of synthetic vectors.")
+    parser.add_argument("--types", nargs="+", default=list(SEARCH_SWEEPS), choices=list(SEARCH_SWEEPS))
+    parser.add_argument("--queries", type=int, default=500, help="Number of held-out query vectors.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--pq-m", type=int, default=64, help="PQ sub-quantizers for ivfpq.")
+    parser.add_argument("--train-sample-size", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    embeddings = np.ascontiguousarray(load_embeddings(args), dtype="float32")
+    rng = np.random.default_rng(args.seed)
+    query_rows = rng.choice(len(embeddings), min(args.queries, len(embeddings) // 2), replace=False)
+    queries = embeddings[query_rows]
+    database = np.delete(embeddings, query_rows, axis=0)
+    print(f"{len(database)} database vectors, {len(queries)} queries, dimension {database.shape[1]}")
+
+    baseline = faiss.IndexFlatL2(database.shape[1])
+    baseline.add(database)
+    _, expected = baseline.search(queries, args.k)
+
+    results = []
+    print(f"{'type':>6} {'params':>16} {'build s':>8} {'recall@' + str(args.k):>9} {'mean ms':>8} {'p95 ms':>7} {'MB':>8}")
+    for index_type in args.types:
+        index_params = {"pq_m": args.pq_m} if index_type == "ivfpq" else {}
+
+        start = time.perf_counter()
+        index = create_index(database.shape[1], index_type, num_vectors=len(database), **index_params)
+        train_index(index, database, sample_size=args.train_sample_size, seed=args.seed)
+        index.add(database)
+        build_seconds = time.perf_counter() - start
+        memory_mb = len(faiss.serialize_index(index)) / (1024 * 1024)
+
+        for search_params in SEARCH_SWEEPS[index_type]:
+            set_search_params(index, **search_params)
+            found, latencies = time_queries(index, queries, args.k)
+            row = {
+                "index_type": index_type,
+                "search_params": search_params,
+                "build_seconds": build_seconds,
+                f"recall_at_{args.k}": recall_at_k(found, expected),
+                "mean_latency_ms": float(latencies.mean()),
+                "p95_latency_ms": float(np.percentile(latencies, 95)),
+                "memory_mb": memory_mb,
+            }
+            results.append(row)
+            params = ",".join(f"{key}={value}" for key, value in search_params.items()) or "-"
+            print(f"{index_type:>6} {params:>16} {build_seconds:>8.2f} {row[f'recall_at_{args.k}']:>9.3f} "
+                  f"{row['mean_latency_ms']:>8.3f} {row['p95_latency_ms']:>7.3f} {memory_mb:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"num_vectors": len(database), "num_queries": len(queries), "k": args.k, "results": results}, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Find the fastest CPU inference settings for a given number of cores.
+
+For every core count, splits the cores between 1, 2, 4, ... worker processes
+(each with cores / workers intra-op threads, pinned to its own cores when there
+are several) and measures classification throughput and per-request latency
+with torch.inference_mode and torch.no_grad, and optionally with torch.compile.
+The best setting per core count maps directly onto the INFERENCE_WORKERS,
+TORCH_INTRA_OP_THREADS, INFERENCE_MODE and TORCH_COMPILE environment variables
+read by common.inference_config.
+
+Usage (from the backend directory):
+    python benchmarks/inference_threads.py --model-dir unixcoder-fft/trained_model/fft_unixcoder --core-counts 2 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+from transformers import RobertaTokenizerFast
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(backend_dir)
+
+from common.classification.dataset import load_dataset
+from common.classification.prediction import predict_fix_categories
+from common.classification.runtimes import RUNTIMES, load_classifier
+from common.inference_config import InferenceConfig, available_cores, compile_model, configure_inference, warm_up_model
+
+
+def worker_counts(cores):
+    counts, workers = [], 1
+    while workers <= cores:
+        counts.append(workers)
+        workers *= 2
+    return counts
+
+
+def run_worker(config, worker_index, model_dir, runtime, texts, batch_size, barrier, results):
+    """
+    Apply the settings, load and warm up the model, then classify this worker's
+    share of the texts once every worker is ready.
+    """
+    configure_inference(config, worker_index)
+    model = compile_model(load_classifier(model_dir, runtime))
+    tokenizer = RobertaTokenizerFast.from_pretrained(model_dir)
+    warm_up_model(model, tokenizer)
+
+    barrier.wait()
+    start = time.time()
+    latencies = []
+    for position in range(0, len(texts), batch_size):
+        request_start = time.perf_counter()
+        predict_fix_categories(texts[position:position + batch_size], model, tokenizer, model.device)
+        latencies.append((time.perf_counter() - request_start) * 1000)
+    results.put((start, time.time(), latencies))
+
+
+def measure(config, model_dir, runtime, texts, batch_size):
+    """
+    Run `config.workers` worker processes over the texts.
+
+    Returns:
+        Dict: Throughput in test cases per second and median and p95 latency per forward pass.
+    """
+    context = multiprocessing.get_context("spawn")  # A fresh interpreter per worker, so thread pools can be sized
+    barrier, results = context.Barrier(config.workers), context.Queue()
+    processes = [
+        context.Process(target=run_worker, args=(config, index, model_dir, runtime, texts[index::config.workers],
+                                                 batch_size, barrier, results))
+        for index in range(config.workers)
+    ]
+    for process in processes:
+        process.start()
+    finished = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    elapsed = max(end for _, end, _ in finished) - min(start for start, _, _ in finished)
+    latencies = np.concatenate([timings for _, _, timings in finished])
+    return {
+        "throughput": len(texts) / elapsed,
+        "median_ms": float(np.median(latencies)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", required=True, help="Directory of the fine-tuned classifier.")
+    parser.add_argument("--runtime", default="torch", choices=list(RUNTIMES))
+    parser.add_argument("--dataset", default=os.path.join(backend_dir, "data", "6000-merged_dataset.json"))
+    parser.add_argument("--core-counts", type=int, nargs="+", help="Core counts to test. Defaults to all available cores.")
+    parser.add_argument("--num-texts", type=int, default=128, help="Test cases classified per setting.")
+    parser.add_argument("--batch-size", type=int, default=1, help="Test cases per forward pass (1 = single requests).")
+    parser.add_argument("--compile", action="store_true", help="Also test torch.compile (slow to start).")
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    texts = [example['input'] for example in load_dataset(args.dataset)][:args.num_texts]
+    all_cores = available_cores()
+    core_counts = [count for count in args.core_counts or [len(all_cores)] if count <= len(all_cores)]
+    if not core_counts:
+        parser.error(f"Only {len(all_cores)} cores are available.")
+
+    results, best = [], {}
+    print(f"{'cores':>5} {'workers':>7} {'threads':>7} {'mode':>14} {'compile':>7} {'cases/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for core_count in core_counts:
+        # The workers inherit this affinity and split it between them
+        os.sched_setaffinity(0, all_cores[:core_count])
+        for workers in worker_counts(core_count):
+            for inference_mode in (True, False):
+                for compile_model_too in ((False, True) if args.compile else (False,)):
+                    config = InferenceConfig(inference_mode=inference_mode, workers=workers,
+                                             intra_op_threads=max(1, core_count // workers),
+                                             compile=compile_model_too, pin_cores=workers > 1)
+                    row = {"cores": core_count, **config._asdict(),
+                           **measure(config, args.model_dir, args.runtime, texts, args.batch_size)}
+                    results.append(row)
+                    print(f"{core_count:>5} {workers:>7} {row['intra_op_threads']:>7} "
+                          f"{'inference_mode' if inference_mode else 'no_grad':>14} {str(compile_model_too):>7} "
+                          f"{row['throughput']:>9.1f} {row['median_ms']:>8.2f} {row['p95_ms']:>8.2f}")
+                    if core_count not in best or row["throughput"] > best[core_count]["throughput"]:
+                        best[core_count] = row
+    os.sched_setaffinity(0, all_cores)
+
+    print("\nBest setting per core count:")
+    for core_count, row in best.items():
+        print(f"  {core_count} cores: INFERENCE_WORKERS={row['workers']} TORCH_INTRA_OP_THREADS={row['intra_op_threads']} "
+              f"INFERENCE_MODE={int(row['inference_mode'])} TORCH_COMPILE={int(row['compile'])} "
+              f"({row['throughput']:.1f} cases/s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"model_dir": args.model_dir, "runtime": args.runtime, "batch_size": args.batch_size,
+                       "results": results, "best": {str(cores): row for cores, row in best.items()}}, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark fix-category inference latency across input-length percentiles.
+
+Compares the legacy fixed 512-token padding against dynamic padding and
+length-bucketed padding, using real test cases from the dataset.
+
+Usage (from the backend directory):
+    python benchmarks/padding_latency.py --model-dir unixcoder-fft/trained_model/fft_unixcoder
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from transformers import RobertaForSequenceClassification, RobertaTokenizerFast
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(backend_dir)
+
+from common.classification.dataset import load_dataset
+from common.classification.prediction import DEFAULT_LENGTH_BUCKETS, predict_fix_category
+
+PERCENTILES = (10, 25, 50, 75, 90, 99, 100)
+
+# Padding strategies to compare; (512,) reproduces the old padding="max_length" behaviour
+MODES = {
+    "max_length": (512,),
+    "dynamic": None,
+    "bucketed": DEFAULT_LENGTH_BUCKETS,
+}
+
+
+def pick_examples_by_percentile(texts, tokenizer):
+    """
+    Return, for every percentile, the token length at that percentile and the
+    example whose length is closest to it.
+    """
+    lengths = np.array([len(ids) for ids in tokenizer(texts, truncation=True, max_length=512)["input_ids"]])
+    picked = []
+    for percentile in PERCENTILES:
+        target = np.percentile(lengths, percentile)
+        position = int(np.argmin(np.abs(lengths - target)))
+        picked.append((percentile, int(lengths[position]), texts[position]))
+    return picked
+
+
+def time_prediction(text, model, tokenizer, device, length_buckets, repeats):
+    # One untimed call so that allocator warm-up is not counted
+    predict_fix_category(text, model, tokenizer, device, length_buckets=length_buckets)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_fix_category(text, model, tokenizer, device, length_buckets=length_buckets)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", required=True, help="Directory of the fine-tuned classifier.")
+    parser.add_argument("--dataset", default=os.path.join(backend_dir, "data", "6000-merged_dataset.json"))
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs per example and mode.")
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    model = RobertaForSequenceClassification.from_pretrained(args.model_dir, num_labels=6).to(device)
+    model.eval()
+    tokenizer = RobertaTokenizerFast.from_pretrained(args.model_dir)
+
+    texts = [example['input'] for example in load_dataset(args.dataset)]
+
+    results = []
+    print(f"{'pctl':>5} {'tokens':>7} " + " ".join(f"{mode + ' ms':>14}" for mode in MODES))
+    for percentile, token_count, text in pick_examples_by_percentile(texts, tokenizer):
+        row = {"percentile": percentile, "tokens": token_count}
+        for mode, length_buckets in MODES.items():
+            row[mode] = time_prediction(text, model, tokenizer, device, length_buckets, args.repeats)
+        results.append(row)
+        print(f"{percentile:>5} {token_count:>7} " + " ".join(f"{row[mode]:>14.2f}" for mode in MODES))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"model_dir": args.model_dir, "repeats": args.repeats, "results": results}, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Compare the int8 and ONNX Runtime classifiers against the fp32 model.
+
+For every runtime, reports accuracy and weighted F1 on the held-out split used
+in training, agreement with the fp32 predictions, single-request latency and
+batched throughput on the CPU. Export the runtimes first with
+`python -m common.classification.runtimes --model-dir <model-dir>`.
+
+Usage (from the backend directory):
+    python benchmarks/runtime_parity.py --model-dir unixcoder-fft/trained_model/fft_unixcoder --seed 10
+    python benchmarks/runtime_parity.py --model-dir unixcoder-peft/trained_model/peft_unixcoder --seed 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+from transformers import RobertaTokenizerFast
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(backend_dir)
+
+from common.classification.dataset import load_dataset
+from common.classification.preprocess import held_out_split
+from common.classification.prediction import category_map, predict_fix_categories
+from common.classification.runtimes import RUNTIMES, load_classifier
+
+label_of = {category: label for label, category in category_map.items()}
+
+
+def predict_labels(texts, model, tokenizer, device, batch_size):
+    labels = []
+    for start in range(0, len(texts), batch_size):
+        categories = predict_fix_categories(texts[start:start + batch_size], model, tokenizer, device)
+        labels.extend(label_of[category] for category in categories)
+    return np.array(labels)
+
+
+def time_single_requests(texts, model, tokenizer, device):
+    predict_fix_categories(texts[:1], model, tokenizer, device)
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        predict_fix_categories([text], model, tokenizer, device)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", required=True, help="Directory of the fine-tuned classifier.")
+    parser.add_argument("--runtime-dir", help="Where the exported runtimes are. Defaults to <model-dir>_runtimes.")
+    parser.add_argument("--dataset", default=os.path.join(backend_dir, "data", "6000-merged_dataset.json"))
+    parser.add_argument("--seed", type=int, default=10, help="Seed of the training split (10 for FFT, 3 for PEFT).")
+    parser.add_argument("--runtimes", nargs="+", default=list(RUNTIMES), choices=list(RUNTIMES))
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size for the throughput run.")
+    parser.add_argument("--latency-samples", type=int, default=100, help="Single requests timed per runtime.")
+    parser.add_argument("--threads", type=int, help="Torch CPU threads (defaults to all cores).")
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # The quantized and ONNX runtimes are CPU only, so compare everything on the CPU
+    device = torch.device("cpu")
+    tokenizer = RobertaTokenizerFast.from_pretrained(args.model_dir)
+    test_split = held_out_split(load_dataset(args.dataset), args.seed)["test"]
+    texts, labels = list(test_split["input"]), np.array(test_split["label"])
+    print(f"{len(texts)} held-out examples")
+
+    results = []
+    reference = None
+    print(f"{'runtime':>10} {'accuracy':>9} {'f1':>7} {'agree':>7} {'p50 ms':>8} {'p95 ms':>8} {'ex/s':>8}")
+    for runtime in args.runtimes:
+        model = load_classifier(args.model_dir, runtime, device, runtime_dir=args.runtime_dir)
+
+        start = time.perf_counter()
+        predictions = predict_labels(texts, model, tokenizer, device, args.batch_size)
+        throughput = len(texts) / (time.perf_counter() - start)
+        if reference is None:
+            # The first runtime (fp32 torch by default) is the reference for agreement
+            reference = predictions
+
+        latencies = time_single_requests(texts[:args.latency_samples], model, tokenizer, device)
+        _, _, f1, _ = precision_recall_fscore_support(labels, predictions, average='weighted', zero_division=0)
+        row = {
+            "runtime": runtime,
+            "accuracy": accuracy_score(labels, predictions),
+            "f1": float(f1),
+            "agreement_with_reference": float(np.mean(predictions == reference)),
+            "p50_latency_ms": float(np.percentile(latencies, 50)),
+            "p95_latency_ms": float(np.percentile(latencies, 95)),
+            "throughput_examples_per_s": throughput,
+        }
+        results.append(row)
+        print(f"{runtime:>10} {row['accuracy']:>9.4f} {row['f1']:>7.4f} {row['agreement_with_reference']:>7.4f} "
+              f"{row['p50_latency_ms']:>8.2f} {row['p95_latency_ms']:>8.2f} {throughput:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"model_dir": args.model_dir, "num_examples": len(texts), "reference": args.runtimes[0],
+                       "batch_size": args.batch_size, "results": results}, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
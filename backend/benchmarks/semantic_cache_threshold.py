@@ -0,0 +1,147 @@
+"""
+Calibrate the cosine similarity threshold of the semantic cache on a dataset.
+
+A threshold should let rewrites of a test case that need the same fix hit the
+cache, while a different test case with another fix must miss it, even when it
+has the same fix category. For a sample of queries from the dataset, the
+benchmark embeds:
+- a rewrite of the query: reformatted whitespace and renamed variables
+  (should hit);
+- the most similar other example with the same fix category but a different
+  fix (should miss).
+
+For each candidate threshold it reports the hit rate of the rewrites and the
+false hit rate of the other examples, and recommends the lowest threshold
+whose false hit rate stays within --max-false-hits. Pass the result to the
+apps as SEMANTIC_CACHE_THRESHOLD.
+
+Usage (from the backend directory):
+    python benchmarks/semantic_cache_threshold.py --output semantic-cache-threshold.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+import numpy as np
+import torch
+from transformers import AutoModel, RobertaTokenizerFast
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(backend_dir)
+
+from common.classification.dataset import load_dataset
+from common.generation.rag_generator import embed_texts
+from common.generation.semantic_cache import DEFAULT_THRESHOLD, normalize
+
+DECLARATION = re.compile(r"\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)")
+STRING_LITERAL = re.compile(r"""('(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"|`(?:\\.|[^`\\])*`)""")
+
+
+def category_of(example):
+    # Training data keeps the category in 'output', the indexed data in 'fix_category'
+    return (example.get('output') or example.get('fix_category') or "").split(":")[0].strip()
+
+
+def fix_of(example):
+    return example.get('fixed_version') or example.get('output') or example.get('fix_category')
+
+
+def rewrite(text, rng):
+    """
+    Rewrite a test case without changing what it does: rename the variables it
+    declares and reformat its whitespace. String literals are left as they are.
+    """
+    renames = {name: f"{name}{rng.choice(['Value', 'Item', '2'])}" for name in sorted(set(DECLARATION.findall(text)))}
+    # Odd parts of the split are the string literals
+    parts = STRING_LITERAL.split(text)
+    for i in range(0, len(parts), 2):
+        for name, new_name in renames.items():
+            parts[i] = re.sub(rf"(?<![\w$.]){re.escape(name)}(?![\w$])", new_name, parts[i])
+        parts[i] = re.sub(r"\s*([{};])\s*", lambda match: f" {match.group(1)}\n  " if rng.random() < 0.5 else match.group(1),
+                          parts[i])
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedding-model", default="microsoft/unixcoder-base", help="The model that embeds queries.")
+    parser.add_argument("--dataset", default=os.path.join(backend_dir, "data", "6000-merged_dataset.json"))
+    parser.add_argument("--queries", type=int, default=500, help="Number of sampled query examples.")
+    parser.add_argument("--max-false-hits", type=float, default=0.01,
+                        help="Largest acceptable share of different fixes returned as hits.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    model = AutoModel.from_pretrained(args.embedding_model).to(device)
+    model.eval()
+    tokenizer = RobertaTokenizerFast.from_pretrained(args.embedding_model)
+
+    examples = load_dataset(args.dataset)
+    texts = [example['input'] for example in examples]
+    categories = [category_of(example) for example in examples]
+    fixes = [fix_of(example) for example in examples]
+
+    rng = random.Random(args.seed)
+    query_rows = rng.sample(range(len(texts)), min(args.queries, len(texts)))
+    rewrites = [rewrite(texts[row], rng) for row in query_rows]
+
+    print(f"Embedding {len(texts)} examples and {len(rewrites)} rewrites with {args.embedding_model}...")
+    embeddings = normalize(embed_texts(texts, model, tokenizer))
+    rewrite_embeddings = normalize(embed_texts(rewrites, model, tokenizer))
+
+    rewrite_similarities = []
+    other_similarities = []
+    for query, row in enumerate(query_rows):
+        rewrite_similarities.append(float(embeddings[row] @ rewrite_embeddings[query]))
+        similarities = embeddings @ embeddings[row]
+        others = [other for other in range(len(texts))
+                  if categories[other] == categories[row] and fixes[other] != fixes[row] and texts[other] != texts[row]]
+        if others:
+            other_similarities.append(float(similarities[others].max()))
+    rewrite_similarities = np.array(rewrite_similarities)
+    other_similarities = np.array(other_similarities)
+
+    thresholds = []
+    for threshold in np.round(np.arange(0.80, 1.0001, 0.005), 3):
+        thresholds.append({
+            "threshold": float(threshold),
+            "rewrite_hit_rate": float(np.mean(rewrite_similarities >= threshold)),
+            "false_hit_rate": float(np.mean(other_similarities >= threshold)) if other_similarities.size else 0.0,
+        })
+    acceptable = [row for row in thresholds if row["false_hit_rate"] <= args.max_false_hits]
+    recommended = acceptable[0] if acceptable else thresholds[-1]
+
+    print(f"\n{'threshold':>9} {'rewrite hits':>12} {'false hits':>10}")
+    for row in thresholds:
+        marker = "  <- recommended" if row is recommended else ""
+        print(f"{row['threshold']:>9.3f} {row['rewrite_hit_rate']:>12.3f} {row['false_hit_rate']:>10.3f}{marker}")
+    print(f"\nRewrites: median similarity {np.median(rewrite_similarities):.4f}, "
+          f"min {rewrite_similarities.min():.4f}")
+    if other_similarities.size:
+        print(f"Nearest different fixes: median similarity {np.median(other_similarities):.4f}, "
+              f"max {other_similarities.max():.4f}")
+    print(f"Recommended SEMANTIC_CACHE_THRESHOLD={recommended['threshold']} (default {DEFAULT_THRESHOLD})")
+
+    if args.output:
+        results = {
+            "embedding_model": args.embedding_model,
+            "dataset": args.dataset,
+            "num_queries": len(query_rows),
+            "max_false_hits": args.max_false_hits,
+            "recommended": recommended,
+            "default_threshold": DEFAULT_THRESHOLD,
+            "thresholds": thresholds,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Compare retrieval with the fine-tuned classifier's encoder against the base
+UniXcoder embeddings used so far.
+
+Both encoders embed the dataset, and held-out examples are used as queries.
+The report gives:
+- how many of the base model's top-k neighbors the shared encoder also
+  returns (recall@k against base);
+- for each encoder, the share of retrieved neighbors with the query's fix
+  category;
+- per-request latency of two forward passes (classify, then embed) against
+  the single pass of predict_with_embeddings.
+
+Usage (from the backend directory):
+    python benchmarks/shared_encoder_recall.py --model-dir unixcoder-fft/trained_model/fft_unixcoder
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+import torch
+from transformers import AutoModel, RobertaForSequenceClassification, RobertaTokenizerFast
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(backend_dir)
+
+from common.classification.dataset import load_dataset
+from common.classification.prediction import predict_fix_category, predict_with_embeddings
+from common.classification.shared_encoder import SharedEncoder
+from common.generation.rag_generator import embed_query, embed_texts
+
+
+def category_of(example):
+    # Training data keeps the category in 'output', the indexed data in 'fix_category'
+    return (example.get('output') or example.get('fix_category') or "").split(":")[0].strip()
+
+
+def search(embeddings, database_rows, query_rows, k):
+    index = faiss.IndexFlatL2(embeddings.shape[1])
+    index.add(embeddings[database_rows])
+    _, ids = index.search(embeddings[query_rows], k)
+    # Map positions in the database back to dataset rows
+    return database_rows[ids]
+
+
+def recall_at_k(found, expected):
+    hits = sum(len(set(row_found) & set(row_expected)) for row_found, row_expected in zip(found, expected))
+    return hits / expected.size
+
+
+def category_precision_at_k(neighbors, query_rows, labels):
+    matches = [labels[neighbor] == labels[query] for query, row in zip(query_rows, neighbors) for neighbor in row]
+    return float(np.mean(matches))
+
+
+def median_ms(fn, texts):
+    fn(texts[0])
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        fn(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", required=True, help="Directory of the fine-tuned classifier.")
+    parser.add_argument("--base-model", default="microsoft/unixcoder-base", help="Embedding model used for the current index.")
+    parser.add_argument("--dataset", default=os.path.join(backend_dir, "data", "6000-merged_dataset.json"))
+    parser.add_argument("--queries", type=int, default=500, help="Number of held-out query examples.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--latency-samples", type=int, default=50, help="Queries timed for the latency comparison.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    classifier = RobertaForSequenceClassification.from_pretrained(args.model_dir, num_labels=6).to(device)
+    classifier.eval()
+    tokenizer = RobertaTokenizerFast.from_pretrained(args.model_dir)
+    base_model = AutoModel.from_pretrained(args.base_model).to(device)
+    base_model.eval()
+    base_tokenizer = RobertaTokenizerFast.from_pretrained(args.base_model)
+
+    examples = load_dataset(args.dataset)
+    texts = [example['input'] for example in examples]
+    labels = [category_of(example) for example in examples]
+
+    print(f"Embedding {len(texts)} examples with {args.base_model}...")
+    base_embeddings = embed_texts(texts, base_model, base_tokenizer)
+    print(f"Embedding {len(texts)} examples with the shared encoder of {args.model_dir}...")
+    shared_embeddings = embed_texts(texts, SharedEncoder(classifier, args.model_dir), tokenizer)
+
+    rng = np.random.default_rng(args.seed)
+    query_rows = rng.choice(len(texts), min(args.queries, len(texts) // 2), replace=False)
+    database_rows = np.setdiff1d(np.arange(len(texts)), query_rows)
+
+    base_neighbors = search(base_embeddings, database_rows, query_rows, args.k)
+    shared_neighbors = search(shared_embeddings, database_rows, query_rows, args.k)
+
+    latency_texts = [texts[row] for row in query_rows[:args.latency_samples]]
+    two_pass_ms = median_ms(lambda text: (predict_fix_category(text, classifier, tokenizer, device),
+                                          embed_query(text, base_model, base_tokenizer)), latency_texts)
+    single_pass_ms = median_ms(lambda text: predict_with_embeddings([text], classifier, tokenizer, device), latency_texts)
+
+    results = {
+        "model_dir": args.model_dir,
+        "base_model": args.base_model,
+        "num_database": len(database_rows),
+        "num_queries": len(query_rows),
+        "k": args.k,
+        f"shared_recall_at_{args.k}_vs_base": recall_at_k(shared_neighbors, base_neighbors),
+        f"base_category_precision_at_{args.k}": category_precision_at_k(base_neighbors, query_rows, labels),
+        f"shared_category_precision_at_{args.k}": category_precision_at_k(shared_neighbors, query_rows, labels),
+        "two_pass_median_ms": two_pass_ms,
+        "single_pass_median_ms": single_pass_ms,
+        "base_model_parameters": sum(parameter.numel() for parameter in base_model.parameters()),
+    }
+
+    for key, value in results.items():
+        print(f"{key:>32}: {value:.4f}" if isinstance(value, float) else f"{key:>32}: {value}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
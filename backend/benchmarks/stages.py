@@ -0,0 +1,258 @@
+"""
+Time every stage of serving a fix request separately, and compare a run with a baseline.
+
+The stages are those a request goes through: tokenizing the test case,
+classifying it, embedding it as a FAISS query, retrieving similar examples,
+building the prompt and generating the fix, plus the whole chain end to end.
+Every stage calls the function the apps call (predict_fix_category,
+embed_query, retrieve_relevant_cases, create_prompt, generate_fix and
+rag_generate_solution), and retrieved examples are read from a payload store
+like the apps' indexed data, so a change to any of them shows up here.
+
+Fixes are generated by the stub Ollama server
+(common.generation.stub_llm_server), so the generation stage measures the
+client and HTTP overhead, plus --token-delay per streamed token, rather than
+a real model.
+
+Runs are reproducible: the queries are a seeded sample of the dataset, the
+index holds the first --index-size examples, the torch thread count is fixed
+and every stage gets an untimed warm-up pass. The JSON report records the
+settings and environment next to the median, p95 and mean of each stage.
+
+Pass --baseline with an earlier report to flag the stages whose median got
+slower by more than --tolerance (and by at least --min-delta-ms, to ignore
+noise on sub-millisecond stages). The exit status is 1 when any stage regressed.
+
+Usage (from the backend directory):
+    python benchmarks/stages.py --model-dir unixcoder-fft/trained_model/fft_unixcoder --output stages-baseline.json
+    python benchmarks/stages.py --model-dir unixcoder-fft/trained_model/fft_unixcoder --baseline stages-baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+from transformers import AutoModel, RobertaForSequenceClassification, RobertaTokenizerFast
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(backend_dir)
+
+from common.classification.dataset import load_dataset
+from common.classification.prediction import predict_fix_category, tokenize_for_inference
+from common.generation.index_factory import create_index
+from common.generation.llm_client import OllamaClient
+from common.generation.payload_store import load_payload_store, write_payload_store
+from common.generation.rag_generator import (add_texts_to_index, create_prompt, embed_query, generate_fix,
+                                             rag_generate_solution, retrieve_relevant_cases)
+from common.generation.stub_llm_server import start_stub_server
+
+STAGES = ("tokenize", "classify", "embed_query", "retrieval", "build_prompt", "llm_generate", "end_to_end")
+
+
+def stage_stats(timings_ms):
+    return {
+        "median_ms": float(np.median(timings_ms)),
+        "p95_ms": float(np.percentile(timings_ms, 95)),
+        "mean_ms": float(np.mean(timings_ms)),
+        "min_ms": float(np.min(timings_ms)),
+        "samples": len(timings_ms),
+    }
+
+
+def time_stage(function, inputs, repeats):
+    """
+    Time `function` on every input `repeats` times, after one untimed pass over
+    all inputs, and return the timings in milliseconds.
+    """
+    for value in inputs:
+        function(value)
+    timings = []
+    for _ in range(repeats):
+        for value in inputs:
+            start = time.perf_counter()
+            function(value)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stages(args):
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    device = torch.device("cpu")
+
+    examples = load_dataset(args.dataset)
+    queries = [example['input'] for example in random.Random(args.seed).sample(examples, min(args.num_queries, len(examples)))]
+    examples = examples[:args.index_size]
+
+    classifier = RobertaForSequenceClassification.from_pretrained(args.model_dir, num_labels=6).to(device)
+    classifier.eval()
+    tokenizer = RobertaTokenizerFast.from_pretrained(args.model_dir)
+    embedding_model = AutoModel.from_pretrained(args.embedding_model).to(device)
+    embedding_model.eval()
+    embedding_tokenizer = RobertaTokenizerFast.from_pretrained(args.embedding_model)
+
+    server = start_stub_server("127.0.0.1", token_delay=args.token_delay)
+    llm_client = OllamaClient("llama3.1", host=server.url)
+
+    # The pipeline functions log every call; their output is kept out of the report
+    with tempfile.TemporaryDirectory() as store_dir, contextlib.redirect_stdout(io.StringIO()):
+        faiss_index = create_index(embedding_model.config.hidden_size, args.index_type, num_vectors=len(examples))
+        add_texts_to_index(faiss_index, [example['input'] for example in examples], embedding_model, embedding_tokenizer)
+        write_payload_store(examples, os.path.join(store_dir, "indexed_data.store"))
+        indexed_data = load_payload_store(os.path.join(store_dir, "indexed_data.store"))
+
+        # The inputs of each stage come from the stages before it, computed once up front
+        embeddings = {text: embed_query(text, embedding_model, embedding_tokenizer) for text in queries}
+        categories = {text: predict_fix_category(text, classifier, tokenizer, device) for text in queries}
+        retrieved = {text: retrieve_relevant_cases(text, embedding_model, embedding_tokenizer, faiss_index, indexed_data,
+                                                   query_embedding=embeddings[text])
+                     for text in queries}
+        prompts = {text: create_prompt(retrieved[text], text, categories[text]) for text in queries}
+
+        def end_to_end(text):
+            category = predict_fix_category(text, classifier, tokenizer, device)
+            return rag_generate_solution(text, category, embedding_model, embedding_tokenizer, faiss_index, indexed_data,
+                                         "llama3.1", llm_client)
+
+        stages = {
+            "tokenize": lambda text: tokenize_for_inference([text], tokenizer, device),
+            "classify": lambda text: predict_fix_category(text, classifier, tokenizer, device),
+            "embed_query": lambda text: embed_query(text, embedding_model, embedding_tokenizer),
+            "retrieval": lambda text: retrieve_relevant_cases(text, embedding_model, embedding_tokenizer, faiss_index,
+                                                              indexed_data, query_embedding=embeddings[text]),
+            "build_prompt": lambda text: create_prompt(retrieved[text], text, categories[text]),
+            "llm_generate": lambda text: generate_fix("llama3.1", prompts[text], llm_client),
+            "end_to_end": end_to_end,
+        }
+        results = {}
+        for stage in args.stages:
+            results[stage] = stage_stats(time_stage(stages[stage], queries, args.repeats))
+
+    llm_client.close()
+    server.shutdown()
+
+    return {
+        "settings": {
+            "model_dir": os.path.abspath(args.model_dir),
+            "embedding_model": args.embedding_model,
+            "dataset": os.path.abspath(args.dataset),
+            "num_queries": len(queries),
+            "index_size": len(examples),
+            "index_type": args.index_type,
+            "repeats": args.repeats,
+            "threads": args.threads,
+            "token_delay": args.token_delay,
+            "seed": args.seed,
+        },
+        "environment": {
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stages": results,
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance=0.1, min_delta_ms=0.5):
+    """
+    Compare the median of every stage with a baseline report.
+
+    A stage regressed when its median is more than `tolerance` (a fraction)
+    slower than the baseline's and by at least `min_delta_ms`.
+
+    Returns:
+        List[Dict]: One row per stage in both reports, with the baseline and
+        current medians, the relative change and whether it regressed.
+    """
+    rows = []
+    for stage, stats in report["stages"].items():
+        if stage not in baseline["stages"]:
+            continue
+        before = baseline["stages"][stage]["median_ms"]
+        after = stats["median_ms"]
+        change = (after - before) / before if before else 0.0
+        rows.append({
+            "stage": stage,
+            "baseline_ms": before,
+            "current_ms": after,
+            "change": change,
+            "regressed": change > tolerance and after - before >= min_delta_ms,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", required=True, help="Directory of the fine-tuned classifier.")
+    parser.add_argument("--embedding-model", default="microsoft/unixcoder-base", help="Model embedding the RAG queries.")
+    parser.add_argument("--dataset", default=os.path.join(backend_dir, "data", "6000-merged_dataset.json"))
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--num-queries", type=int, default=50, help="Test cases sampled from the dataset as requests.")
+    parser.add_argument("--index-size", type=int, default=1000, help="Examples in the FAISS index.")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the queries per stage.")
+    parser.add_argument("--threads", type=int, default=1, help="Torch CPU threads, fixed so runs stay comparable.")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds the stub LLM waits per streamed token.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the query sample.")
+    parser.add_argument("--output", help="Optional path to write the report as JSON.")
+    parser.add_argument("--baseline", help="Earlier report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Slowdown of a stage's median flagged as a regression.")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Smallest slowdown in ms flagged as a regression.")
+    args = parser.parse_args()
+
+    report = run_stages(args)
+
+    print(f"{'stage':<14} {'median ms':>10} {'p95 ms':>10} {'mean ms':>10} {'samples':>8}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<14} {stats['median_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['mean_ms']:>10.2f} {stats['samples']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        changed = [key for key in report["settings"] if report["settings"][key] != baseline["settings"].get(key)]
+        if changed:
+            print(f"Warning: the baseline was run with different settings ({', '.join(changed)}).")
+
+        rows = compare_with_baseline(report, baseline, args.tolerance, args.min_delta_ms)
+        print(f"\nCompared with {args.baseline} (commit {baseline['environment'].get('git_commit')}):")
+        print(f"{'stage':<14} {'baseline ms':>12} {'current ms':>11} {'change':>8}")
+        for row in rows:
+            flag = "  SLOWER" if row["regressed"] else ""
+            print(f"{row['stage']:<14} {row['baseline_ms']:>12.2f} {row['current_ms']:>11.2f} {row['change']:>+8.1%}{flag}")
+
+        regressed = [row["stage"] for row in rows if row["regressed"]]
+        if regressed:
+            print(f"Regressions in: {', '.join(regressed)}")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from common.classification.prediction import predict_fix_categories
+from common.generation.rag_generator import extract_predicted_code, rag_generate_solution
+from common.telemetry import span
+
+# Bulk classification and fix generation for many test cases at once
+
+
+def _generate_result(index, test_case, fix_category, rag):
+    try:
+        generated_fix = rag_generate_solution(test_case, fix_category, rag.embedding_model, rag.embedding_tokenizer,
+                                              rag.faiss_index, rag.indexed_data, rag.llama_model, rag.llm_client)
+    except Exception as e:
+        print(f"Error during fix generation for test case {index}: {e}")
+        return {"index": index, "predictedCategory": fix_category, "error": str(e)}
+
+    return {
+        "index": index,
+        "predictedCategory": fix_category,
+        "generatedFix": generated_fix,
+        "predictedCode": extract_predicted_code(generated_fix),
+    }
+
+
+def iter_batch_predictions(test_cases, model, tokenizer, device, rag=None, batch_size=32, generation_workers=1):
+    """
+    Classify test cases in batches and yield one result per test case as soon as it is ready.
+
+    Results are yielded in completion order, so every result carries the index of
+    its test case in the request. Invalid entries yield an error result instead
+    of failing the whole batch.
+
+    Args:
+        test_cases (List[str]): The test cases to process.
+        model: The fine-tuned sequence classification model.
+        tokenizer: The tokenizer paired with the model.
+        device (torch.device): The device the model runs on.
+        rag (RagResources, optional): Warm RAG resources. When given, a fix is
+            generated for every test case; otherwise only the category is returned.
+        batch_size (int): Number of test cases classified per forward pass.
+        generation_workers (int): Number of fixes generated concurrently.
+
+    Yields:
+        Dict: The result for one test case.
+    """
+    valid = []
+    for index, test_case in enumerate(test_cases):
+        if isinstance(test_case, str) and test_case.strip():
+            valid.append((index, test_case))
+        else:
+            yield {"index": index, "error": "No JavaScript code provided"}
+
+    executor = ThreadPoolExecutor(max_workers=max(1, generation_workers)) if rag is not None else None
+    try:
+        pending = []
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            try:
+                with span("classification"):
+                    categories = predict_fix_categories([test_case for _, test_case in batch], model, tokenizer, device)
+            except Exception as e:
+                print(f"Error during batch classification: {e}")
+                for index, _ in batch:
+                    yield {"index": index, "error": str(e)}
+                continue
+
+            for (index, test_case), fix_category in zip(batch, categories):
+                if executor is None:
+                    yield {"index": index, "predictedCategory": fix_category}
+                else:
+                    # Run in a copy of the request's context, so the generation spans join its trace
+                    pending.append(executor.submit(contextvars.copy_context().run, _generate_result, index, test_case,
+                                                   fix_category, rag))
+
+            # Stream the fixes that finished while this batch was being classified
+            for future in [future for future in pending if future.done()]:
+                pending.remove(future)
+                yield future.result()
+
+        for future in as_completed(pending):
+            yield future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from common.telemetry import CACHE_LOOKUPS
+
+# Two-tier (memory + disk) cache for classification results and generated fixes
+
+
+def normalize_test_case(test_case):
+    """
+    Normalize a test case before hashing so that whitespace-only differences
+    map to the same cache entry.
+    """
+    return " ".join(test_case.split())
+
+
+def fingerprint_paths(paths):
+    """
+    Hash the modification time and size of the given files, recursing into
+    directories, so that any change to a model or index produces a new value.
+
+    Args:
+        paths (Iterable[str]): Files or directories the cached results depend on.
+
+    Returns:
+        str: A hex digest of the current state of the paths.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for file_path in files:
+            try:
+                stat = os.stat(file_path)
+                digest.update(f"{file_path}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+            except FileNotFoundError:
+                digest.update(f"{file_path}:missing;".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Caches classification results and generated fixes per model variant.
+
+    Entries are keyed by a hash of the kind of result, the model variant and
+    the normalized test case. The first tier is an in-memory LRU; the second
+    is a directory of JSON files whose total size is capped, evicting the
+    least recently used files first.
+
+    Each kind of result declares the files it depends on (the model directory,
+    the FAISS index, ...). When their fingerprint changes, the memory tier is
+    dropped and stale disk entries are deleted.
+    """
+
+    def __init__(self, variant, cache_dir, dependencies=None, memory_entries=1024,
+                 max_disk_bytes=256 * 1024 * 1024, check_interval=5.0):
+        """
+        Args:
+            variant (str): The model variant, e.g. 'fft' or 'peft'.
+            cache_dir (str): Directory for the on-disk tier.
+            dependencies (Dict[str, List[str]], optional): For each kind of result,
+                the files or directories that invalidate it when they change.
+            memory_entries (int): Maximum number of entries in the memory tier.
+            max_disk_bytes (int): Maximum total size of the disk tier.
+            check_interval (float): Minimum seconds between dependency checks.
+        """
+        self.variant = variant
+        self.cache_dir = os.path.join(cache_dir, variant)
+        self.dependencies = dependencies or {}
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._fingerprints = {}
+        self._last_check = 0.0
+        self._disk_bytes = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, kind, test_case):
+        payload = f"{kind}\0{self.variant}\0{normalize_test_case(test_case)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _check_dependencies(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        first_check = not self._fingerprints
+        changed = []
+        for kind, paths in self.dependencies.items():
+            fingerprint = fingerprint_paths(paths)
+            if self._fingerprints.get(kind) != fingerprint:
+                if kind in self._fingerprints:
+                    changed.append(kind)
+                self._fingerprints[kind] = fingerprint
+
+        if changed:
+            print(f"Cache dependencies changed for {', '.join(changed)}, invalidating cached results...")
+            self._memory.clear()
+            self._purge_stale_disk_entries()
+        elif first_check and self.dependencies:
+            # Drop entries left behind by a previous model or index
+            self._purge_stale_disk_entries()
+
+    def _iter_disk_entries(self):
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def _purge_stale_disk_entries(self):
+        for path in self._iter_disk_entries():
+            try:
+                with open(path, 'r') as f:
+                    entry = json.load(f)
+                if entry.get("fingerprint") != self._fingerprints.get(entry.get("kind")):
+                    os.remove(path)
+            except (OSError, ValueError):
+                continue
+        self._disk_bytes = None
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _count(self, kind, outcome):
+        self._stats[outcome] += 1
+        CACHE_LOOKUPS.labels("result", kind, outcome).inc()
+
+    def get(self, kind, test_case):
+        """
+        Look up a cached result.
+
+        Returns:
+            The cached value, or None on a miss.
+        """
+        key = self.make_key(kind, test_case)
+        with self._lock:
+            self._check_dependencies()
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count(kind, "memory_hits")
+                return self._memory[key]
+
+            path = self._entry_path(key)
+            try:
+                with open(path, 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._count(kind, "misses")
+                return None
+
+            if entry.get("fingerprint") != self._fingerprints.get(kind):
+                self._count(kind, "misses")
+                return None
+
+            # Touch the file so that disk eviction is least-recently-used
+            os.utime(path, None)
+            self._remember(key, entry["value"])
+            self._count(kind, "disk_hits")
+            return entry["value"]
+
+    def set(self, kind, test_case, value):
+        """
+        Store a result in both tiers. The value must be JSON serializable.
+        """
+        key = self.make_key(kind, test_case)
+        with self._lock:
+            self._check_dependencies()
+            self._remember(key, value)
+
+            path = self._entry_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps({"kind": kind, "fingerprint": self._fingerprints.get(kind), "value": value})
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data)
+            self._evict_disk_entries()
+
+    def get_or_compute(self, kind, test_case, compute, cacheable=None):
+        """
+        Return the cached result, or compute, store and return it.
+
+        Args:
+            kind (str): The kind of result, e.g. 'category' or 'fix'.
+            test_case (str): The test case the result belongs to.
+            compute (Callable[[], Any]): Produces the result on a miss.
+            cacheable (Callable[[Any], bool], optional): Decides whether a computed
+                result should be stored, e.g. to skip failed generations.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether it came from the cache.
+        """
+        value = self.get(kind, test_case)
+        if value is not None:
+            return value, True
+
+        value = compute()
+        if cacheable is None or cacheable(value):
+            self.set(kind, test_case, value)
+        return value, False
+
+    def _evict_disk_entries(self):
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(os.path.getsize(path) for path in self._iter_disk_entries())
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+
+        entries = []
+        for path in self._iter_disk_entries():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                continue
+
+        # Evict down to 90% of the budget so that eviction does not run on every write
+        target = self.max_disk_bytes * 0.9
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                continue
+        self._disk_bytes = total
+
+    def stats(self):
+        """
+        Return hit and miss counters and the size of both tiers.
+        """
+        with self._lock:
+            return dict(self._stats, memory_entries=len(self._memory), disk_bytes=self._disk_bytes)
@@ -0,0 +1,181 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from common.classification.prediction import predict_fix_categories, predict_with_embeddings
+from common.telemetry import BATCH_SIZE, QUEUE_DEPTH
+
+
+class MicroBatcher:
+    """
+    Collects concurrent classification requests into padded micro-batches.
+
+    Callers submit single test cases from any thread. A background worker takes
+    the first waiting request, keeps collecting for up to `max_wait_ms` or until
+    `max_batch_size` requests are queued, runs one forward pass through
+    `predict_fix_categories` and resolves each caller's future with its own
+    category. Callers that also need a retrieval embedding get it from the same
+    pass, through `predict_with_embeddings`.
+    """
+
+    def __init__(self, model, tokenizer, device, max_batch_size=16, max_wait_ms=5, length_buckets=None, name="classifier"):
+        """
+        Args:
+            model: The fine-tuned sequence classification model.
+            tokenizer: The tokenizer paired with the model.
+            device (torch.device): The device the model runs on.
+            max_batch_size (int): Maximum number of requests per forward pass.
+            max_wait_ms (float): How long to wait for more requests after the first one.
+            length_buckets (Sequence[int], optional): Padding lengths passed to the predictor.
+            name (str): Label of the batcher's queue-depth and batch-size metrics.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.length_buckets = length_buckets
+        self.name = name
+        self._queue_depth = QUEUE_DEPTH.labels(f"classification:{name}")
+        self._batch_size = BATCH_SIZE.labels(name)
+
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self._requests = 0
+        self._batches = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = Counter()
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                # Threads do not survive a fork, so a forked child starts its own worker and queue. Requests
+                # inherited from the parent belong to callers in the parent, so the child's depth starts at zero
+                self._queue = queue.Queue()
+                self._queue_depth.set(0)
+                self._worker = None
+                self._worker_pid = os.getpid()
+            if self._worker is None or not self._worker.is_alive():
+                # A replacement worker takes over the queue, so requests already waiting in it are still answered
+                self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, input_text, with_embedding=False):
+        """
+        Queue a test case for classification.
+
+        Args:
+            input_text (str): The test case to classify.
+            with_embedding (bool): Also return the CLS embedding of the test case.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the predicted fix category, or
+            with `with_embedding` to a (category, embedding) tuple where the
+            embedding has shape (1, hidden_size).
+        """
+        if self._worker_pid != os.getpid() or self._worker is None or not self._worker.is_alive():
+            self._ensure_worker()
+
+        future = Future()
+        self._queue_depth.inc()
+        self._queue.put((input_text, future, with_embedding))
+
+        with self._metrics_lock:
+            self._requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return future
+
+    def predict(self, input_text, timeout=None):
+        """
+        Classify a test case through the batcher and wait for the result.
+
+        Returns:
+            str: The predicted fix category.
+        """
+        return self.submit(input_text).result(timeout=timeout)
+
+    def predict_with_embedding(self, input_text, timeout=None):
+        """
+        Classify a test case and compute its retrieval embedding in one pass.
+
+        Returns:
+            Tuple[str, np.ndarray]: The predicted fix category and the embedding.
+        """
+        return self.submit(input_text, with_embedding=True).result(timeout=timeout)
+
+    def _collect_batch(self, requests):
+        batch = [requests.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        requests = self._queue
+        while True:
+            batch = self._collect_batch(requests)
+            self._queue_depth.dec(len(batch))
+            # Requests cancelled while they waited are dropped; resolving their futures would raise and stop the worker
+            batch = [request for request in batch if request[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self._batch_size.observe(len(batch))
+            texts = [input_text for input_text, _, _ in batch]
+
+            try:
+                # Hidden states are only kept when someone in the batch needs an embedding
+                if any(with_embedding for _, _, with_embedding in batch):
+                    categories, embeddings = predict_with_embeddings(texts, self.model, self.tokenizer, self.device,
+                                                                     length_buckets=self.length_buckets)
+                else:
+                    categories = predict_fix_categories(texts, self.model, self.tokenizer, self.device,
+                                                        length_buckets=self.length_buckets)
+            except Exception as e:
+                print(f"Error during batched prediction: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for position, ((_, future, with_embedding), category) in enumerate(zip(batch, categories)):
+                    if with_embedding:
+                        future.set_result((category, embeddings[position:position + 1]))
+                    else:
+                        future.set_result(category)
+
+            with self._metrics_lock:
+                self._batches += 1
+                self._batch_sizes[len(batch)] += 1
+
+    def metrics(self):
+        """
+        Return a snapshot of the batcher's queue and batch-size metrics.
+
+        Returns:
+            Dict: Current and peak queue depth, request and batch counts, mean
+            batch size and a histogram of batch sizes.
+        """
+        with self._metrics_lock:
+            batched_requests = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._requests,
+                "batches": self._batches,
+                "mean_batch_size": batched_requests / self._batches if self._batches else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+            }
@@ -1,6 +1,174 @@
+import glob
 import json
+import os
+
+# Reading the fix examples, streamed from JSON and JSONL files or directories of shards
+
+# Characters read from a JSON file at a time
+CHUNK_SIZE = 1 << 20
+
+# Characters that can continue a JSON number
+NUMBER_CHARACTERS = "0123456789+-.eE"
+
+
+class JsonStream:
+    """
+    Decodes the values of a JSON document one at a time, reading the file in
+    chunks, so that only the value being decoded has to fit in memory.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def read_more(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        # Skip whitespace and return the next character, or '' at the end of the file
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Malformed dataset file: expected one of {characters!r}, found {character or 'the end'!r}")
+        self.position += 1
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+                continue
+            # A number may continue in the next chunk, even past a prefix that already
+            # decodes ("1e" + "5"), so it is only accepted once something follows it
+            if not self.buffer[end:].lstrip(NUMBER_CHARACTERS) and not self.eof and self.read_more():
+                continue
+            self.position = end
+            return value
+
+    def array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_json_examples(f, chunk_size=CHUNK_SIZE):
+    # Either {"examples": [...], ...} or a bare list of examples
+    stream = JsonStream(f, chunk_size)
+    if stream.peek() == "[":
+        yield from stream.array()
+        return
+
+    stream.expect("{")
+    found = False
+    while stream.peek() != "}":
+        key = stream.value()
+        stream.expect(":")
+        if key == "examples":
+            found = True
+            yield from stream.array()
+        else:
+            stream.value()
+        if stream.expect(",}") == "}":
+            break
+    if not found:
+        raise ValueError(f"No 'examples' list in {getattr(f, 'name', 'the dataset file')}")
+
+
+def iter_jsonl_examples(f):
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Malformed example on line {line_number} of {getattr(f, 'name', 'the dataset file')}: {e}")
+
+
+def dataset_files(path):
+    """
+    Return the files of a dataset in order: a single JSON or JSONL file, every
+    .json and .jsonl shard in a directory, or the files matching a glob pattern.
+    """
+    if os.path.isdir(path):
+        # Hidden files are skipped, such as the ._ metadata files macOS adds to archives
+        files = [os.path.join(path, name) for name in os.listdir(path)
+                 if name.endswith((".json", ".jsonl")) and not name.startswith(".")]
+    elif glob.has_magic(path):
+        files = glob.glob(path)
+    else:
+        files = [path]
+    if not files:
+        raise FileNotFoundError(f"No dataset files found at {path}")
+    return sorted(files)
+
+
+def iter_examples(path, shard_index=0, num_shards=1, chunk_size=CHUNK_SIZE):
+    """
+    Stream the examples of a dataset without loading whole files into memory.
+
+    Args:
+        path (str): A JSON file ({"examples": [...]} or a list), a JSONL file with
+            one example per line, a directory of such shards or a glob pattern.
+        shard_index (int): Which of the `num_shards` interleaved parts to yield.
+        num_shards (int): Number of parts the examples are split into, e.g. one
+            per worker process; example i belongs to part i % num_shards.
+        chunk_size (int): Characters read from a JSON file at a time.
+
+    Yields:
+        Dict: The examples, in file order.
+    """
+    position = 0
+    for file_path in dataset_files(path):
+        with open(file_path, 'r') as f:
+            examples = iter_jsonl_examples(f) if file_path.endswith(".jsonl") else iter_json_examples(f, chunk_size)
+            for example in examples:
+                if position % num_shards == shard_index:
+                    yield example
+                position += 1
+
+
+class DatasetStream:
+    """
+    A dataset that is read from disk again on every iteration instead of being
+    held in memory, for code that needs several passes over the examples, such
+    as building the RAG index of a dataset larger than RAM.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return iter_examples(self.path, chunk_size=self.chunk_size)
+
 
 def load_dataset(file_path):
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-    return data['examples']
\ No newline at end of file
+    # All examples as a list; see iter_examples for the supported formats
+    return list(iter_examples(file_path))
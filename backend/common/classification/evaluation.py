@@ -0,0 +1,193 @@
+"""
+Evaluate a saved classifier offline on any labeled dataset.
+
+Runs batched inference over a JSON or JSONL file (or a directory of shards)
+whose examples carry their fix category in 'output' or 'fix_category', and
+writes a JSON report: accuracy, weighted and macro F1, per-class scores, the
+confusion matrix, throughput and p50/p95/p99 latency. Compare reports with
+common/classification/model_perf/compare_eval.py.
+
+Accuracy and throughput come from batched inference with --batch-size. The
+latency percentiles are those of single requests: the first
+--latency-samples examples are classified again one at a time. The wall
+times of the batched forward passes are reported separately as
+batch_latency_ms.
+
+Usage (from the backend directory):
+    python -m common.classification.evaluation --model-dir unixcoder-fft/trained_model/fft_unixcoder \\
+        --dataset data/6000-merged_dataset.json --held-out-seed 10 --output eval/fft.json
+    python -m common.classification.evaluation --model-dir unixcoder-peft/trained_model/peft_unixcoder \\
+        --dataset data/validation-datasets/ --runtime int8 --output eval/peft-int8-validation.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support
+from transformers import RobertaTokenizerFast
+
+from common.classification.prediction import category_map, predict_fix_categories
+from common.classification.preprocess import held_out_split, labeled_dataset
+from common.classification.runtimes import RUNTIMES, load_classifier
+
+label_of = {category: label for label, category in category_map.items()}
+
+
+def classification_report(labels, predictions):
+    """
+    Return accuracy, weighted and macro averages, per-class scores and the
+    confusion matrix (rows are the true categories, columns the predicted ones).
+    """
+    label_ids = sorted(category_map)
+    precision, recall, f1, _ = precision_recall_fscore_support(labels, predictions, average='weighted', zero_division=0)
+    # Averaged over the categories that occur, so a single-category validation set is not dragged down by the others
+    _, _, macro_f1, _ = precision_recall_fscore_support(labels, predictions, average='macro', zero_division=0)
+    class_precision, class_recall, class_f1, support = precision_recall_fscore_support(
+        labels, predictions, labels=label_ids, zero_division=0)
+
+    return {
+        'accuracy': accuracy_score(labels, predictions),
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'macro_f1': macro_f1,
+        'per_class': {
+            category_map[label]: {'precision': class_precision[i], 'recall': class_recall[i], 'f1': class_f1[i],
+                                  'support': int(support[i])}
+            for i, label in enumerate(label_ids)
+        },
+        'confusion_matrix': {
+            'categories': [category_map[label] for label in label_ids],
+            'matrix': confusion_matrix(labels, predictions, labels=label_ids).tolist(),
+        },
+    }
+
+
+def latency_summary(latencies_ms):
+    return {
+        'p50': float(np.percentile(latencies_ms, 50)),
+        'p95': float(np.percentile(latencies_ms, 95)),
+        'p99': float(np.percentile(latencies_ms, 99)),
+        'mean': float(np.mean(latencies_ms)),
+        'max': float(np.max(latencies_ms)),
+    }
+
+
+def evaluate_classifier(texts, labels, model, tokenizer, device, batch_size=32, max_length=512, latency_samples=200):
+    """
+    Classify the texts in batches and score the predictions, then time single
+    requests on the first `latency_samples` texts.
+
+    Args:
+        texts (List[str]): The test cases.
+        labels (List[int]): Their true labels.
+        model: The classifier, any runtime from load_classifier.
+        tokenizer: The tokenizer paired with the model.
+        device (torch.device): The device the model runs on.
+        batch_size (int): Test cases per forward pass.
+        max_length (int): Maximum number of tokens per test case.
+        latency_samples (int): Texts classified one at a time for the latency percentiles.
+
+    Returns:
+        Dict: The classification report, throughput, single-request latency
+        percentiles and the latency percentiles of the batches.
+    """
+    # The first forward pass pays for lazy initialization, so it is not timed
+    predict_fix_categories(texts[:batch_size], model, tokenizer, device, max_length)
+
+    predictions = []
+    batch_latencies_ms = []
+    start_time = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        batch_start = time.perf_counter()
+        categories = predict_fix_categories(batch, model, tokenizer, device, max_length)
+        batch_latencies_ms.append((time.perf_counter() - batch_start) * 1000)
+        predictions.extend(label_of[category] for category in categories)
+    total_seconds = time.perf_counter() - start_time
+
+    # With batches of one the batched pass already timed single requests
+    latency_samples = max(1, latency_samples)
+    if batch_size == 1:
+        latencies_ms = batch_latencies_ms[:latency_samples]
+    else:
+        latencies_ms = []
+        for text in texts[:latency_samples]:
+            request_start = time.perf_counter()
+            predict_fix_categories([text], model, tokenizer, device, max_length)
+            latencies_ms.append((time.perf_counter() - request_start) * 1000)
+
+    report = classification_report(labels, predictions)
+    report['throughput'] = {
+        'examples_per_second': len(texts) / total_seconds,
+        'total_seconds': total_seconds,
+    }
+    report['latency_ms'] = latency_summary(latencies_ms)
+    report['batch_latency_ms'] = latency_summary(batch_latencies_ms)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", required=True, help="Directory of the fine-tuned classifier.")
+    parser.add_argument("--dataset", required=True, help="Labeled JSON or JSONL file, directory of shards or glob pattern.")
+    parser.add_argument("--held-out-seed", type=int,
+                        help="Only evaluate the held-out split of training with this seed (10 for FFT, 3 for PEFT).")
+    parser.add_argument("--runtime", default="torch", choices=list(RUNTIMES),
+                        help="Classifier runtime; int8 and ONNX runtimes must be exported first.")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--latency-samples", type=int, default=200,
+                        help="Examples classified one at a time for the single-request latency percentiles.")
+    parser.add_argument("--limit", type=int, help="Only evaluate the first N examples.")
+    parser.add_argument("--output", help="Where to write the JSON report.")
+    args = parser.parse_args()
+
+    device = torch.device("cpu") if args.runtime != "torch" else \
+        torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    dataset = labeled_dataset(args.dataset)
+    if args.held_out_seed is not None:
+        dataset = held_out_split(dataset, args.held_out_seed)["test"]
+    if args.limit:
+        dataset = dataset.select(range(min(args.limit, len(dataset))))
+    texts, labels = list(dataset["input"]), list(dataset["label"])
+    print(f"Evaluating {args.model_dir} ({args.runtime}) on {len(texts)} examples...")
+
+    model = load_classifier(args.model_dir, runtime=args.runtime, device=device)
+    tokenizer = RobertaTokenizerFast.from_pretrained(args.model_dir)
+    report = evaluate_classifier(texts, labels, model, tokenizer, device, args.batch_size, args.max_length,
+                                 args.latency_samples)
+
+    results = {
+        'model_dir': os.path.abspath(args.model_dir),
+        'runtime': args.runtime,
+        'dataset': os.path.abspath(args.dataset),
+        'held_out_seed': args.held_out_seed,
+        'num_examples': len(texts),
+        'batch_size': args.batch_size,
+        'max_length': args.max_length,
+        'latency_samples': min(max(1, args.latency_samples), len(texts)),
+        'device': device.type,
+        'torch_threads': torch.get_num_threads(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **report,
+    }
+
+    latency = report['latency_ms']
+    print(f"Accuracy {report['accuracy']:.4f}, weighted F1 {report['f1']:.4f}, macro F1 {report['macro_f1']:.4f}")
+    print(f"{report['throughput']['examples_per_second']:.1f} examples/s in batches of {args.batch_size}, "
+          f"batch p50 {report['batch_latency_ms']['p50']:.1f} ms")
+    print(f"Single-request latency p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
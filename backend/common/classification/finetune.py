@@ -0,0 +1,350 @@
+import copy
+import glob
+import inspect
+import json
+import os
+import random
+import shutil
+
+import torch
+from transformers import RobertaForSequenceClassification, RobertaTokenizerFast, Trainer, TrainingArguments
+from transformers.trainer_utils import get_last_checkpoint
+
+from common.classification.metrics import compute_metrics
+from common.classification.preprocess import held_out_split, labeled_dataset
+from common.classification.tokenization import tokenize_dataset
+from common.classification.training import (PeakMemoryCallback, data_collator, padding_for, training_arguments,
+                                             training_settings_from_env)
+
+# Config-driven fine-tuning of the UniXcoder classifier, fully (FFT) or with LoRA adapters
+
+TRAINING_METHODS = ("fft", "lora")
+
+# Settings of the original training scripts; a config file only lists what it changes
+DEFAULT_CONFIG = {
+    "method": "fft",
+    "base_model": "microsoft/unixcoder-base",
+    "dataset": "../data/6000-merged_dataset.json",
+    "output_dir": "results",
+    "logging_dir": "logs",
+    "model_dir": None,
+    "result_logs": "result_logs.json",
+    # None leaves it to tokenize_dataset: TOKENIZED_CACHE_DIR, or data/tokenized_cache
+    "tokenized_cache_dir": None,
+    "seed": 10,
+    "test_size": 0.2,
+    "max_length": 512,
+    "learning_rate": 1e-5,
+    "epochs": 10,
+    "batch_size": 8,
+    "weight_decay": 0.01,
+    "gradient_accumulation_steps": 1,
+    "training_mode": "standard",
+    "bf16": "auto",
+    "lora_r": 16,
+    "lora_alpha": 64,
+    "lora_dropout": 0.05,
+    "save_total_limit": 2,
+    "num_labels": 6,
+    # true: continue from the latest checkpoint in output_dir if it was trained with the same settings;
+    # false: start over; or a checkpoint path
+    "resume": True,
+}
+
+# Settings that do not change what is trained, so a run can be resumed with different values
+RESUME_EXEMPT_KEYS = ("output_dir", "logging_dir", "model_dir", "result_logs", "tokenized_cache_dir",
+                      "save_total_limit", "resume")
+
+# Written to output_dir, records the settings its checkpoints were trained with
+RUN_SETTINGS_FILE = "run_settings.json"
+
+# Config keys holding paths, resolved relative to the config file
+PATH_KEYS = ("dataset", "output_dir", "logging_dir", "model_dir", "result_logs", "tokenized_cache_dir")
+
+
+def parse_value(text):
+    """
+    Parse a command-line override value as JSON (numbers, booleans, null, lists),
+    falling back to the plain string.
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def load_config(path, overrides=None):
+    """
+    Load a training config, filling in the defaults and resolving its paths
+    relative to the config file.
+
+    Args:
+        path (str): The JSON config file.
+        overrides (Dict, optional): Values that take precedence over the file.
+
+    Returns:
+        Dict: The complete config.
+    """
+    with open(path, 'r') as f:
+        values = json.load(f)
+    values.update(overrides or {})
+    return resolve_config(values, os.path.dirname(os.path.abspath(path)))
+
+
+def resolve_config(values, base_dir):
+    """
+    Fill in the defaults, check the config and make its paths absolute.
+
+    Args:
+        values (Dict): The settings that differ from DEFAULT_CONFIG.
+        base_dir (str): Directory relative paths are resolved against.
+
+    Returns:
+        Dict: The complete config.
+    """
+    unknown = set(values) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown training settings: {', '.join(sorted(unknown))}")
+
+    config = {**DEFAULT_CONFIG, **values}
+    if config["method"] not in TRAINING_METHODS:
+        raise ValueError(f"Unknown training method '{config['method']}', expected one of {', '.join(TRAINING_METHODS)}")
+    for key in PATH_KEYS:
+        if config[key] is not None:
+            config[key] = os.path.normpath(os.path.join(base_dir, config[key]))
+    if isinstance(config["resume"], str):
+        config["resume"] = os.path.normpath(os.path.join(base_dir, config["resume"]))
+    return config
+
+
+def create_model(config):
+    """
+    Load the base model with a fresh classification head, wrapped with LoRA
+    adapters for the 'lora' method.
+    """
+    model = RobertaForSequenceClassification.from_pretrained(config["base_model"], num_labels=config["num_labels"])
+    if config["method"] == "lora":
+        from peft import LoraConfig, TaskType, get_peft_model
+
+        peft_config = LoraConfig(
+            task_type=TaskType.SEQ_CLS,
+            inference_mode=False,
+            r=config["lora_r"],
+            lora_alpha=config["lora_alpha"],
+            lora_dropout=config["lora_dropout"],
+        )
+        model = get_peft_model(model, peft_config)
+    return model
+
+
+def throughput_summary(training_logs):
+    """
+    Return the throughput and memory figures of the final training log entry.
+    """
+    keys = ("train_runtime", "train_samples_per_second", "train_steps_per_second",
+            "train_peak_rss_mb", "train_peak_device_memory_mb")
+    for entry in reversed(training_logs):
+        if "train_runtime" in entry:
+            return {key: entry[key] for key in keys if key in entry}
+    return {}
+
+
+def run_settings(config, training_settings):
+    """
+    Return the settings that decide what a run trains: the config without the
+    RESUME_EXEMPT_KEYS, and the training settings after environment overrides.
+    """
+    settings = {
+        "config": {key: value for key, value in config.items() if key not in RESUME_EXEMPT_KEYS},
+        "training_settings": training_settings._asdict(),
+    }
+    # Round-tripped so that it compares equal to the copy read back from disk
+    return json.loads(json.dumps(settings))
+
+
+def read_run_settings(output_dir):
+    try:
+        with open(os.path.join(output_dir, RUN_SETTINGS_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def resume_checkpoint(config, settings=None):
+    """
+    Return the checkpoint a training run continues from, or None to start over.
+
+    Checkpoints are saved at the end of every epoch with the optimizer,
+    learning rate scheduler and RNG states, so a run resumed after a crash
+    continues exactly where the last completed epoch left off. The latest
+    checkpoint in output_dir is only used when it was trained with the same
+    settings (see run_settings); otherwise, e.g. after the config was changed
+    to retrain, the run starts over.
+
+    Args:
+        config (Dict): The complete config.
+        settings (Dict, optional): The run_settings of this run, compared with
+            the ones the checkpoints were saved with.
+
+    Raises:
+        ValueError: If `resume` names a checkpoint trained with other settings.
+    """
+    if config["resume"] is False:
+        return None
+    if isinstance(config["resume"], str):
+        recorded = read_run_settings(os.path.dirname(config["resume"].rstrip(os.sep)))
+        if settings is not None and recorded is not None and recorded != settings:
+            raise ValueError(f"The checkpoint {config['resume']} was trained with different settings; "
+                             "set resume to false to start over")
+        return config["resume"]
+    if not os.path.isdir(config["output_dir"]):
+        return None
+
+    checkpoint = get_last_checkpoint(config["output_dir"])
+    if checkpoint and settings is not None and read_run_settings(config["output_dir"]) != settings:
+        print(f"Warning: the checkpoints in {config['output_dir']} were trained with different settings, "
+              "starting over instead of resuming.")
+        return None
+    return checkpoint
+
+
+def start_run(config, settings, checkpoint):
+    """
+    Record the settings of a run in its output_dir. A run that starts over
+    first deletes the checkpoints of the previous one, which would otherwise
+    be mixed with its own and picked up when it is resumed.
+    """
+    output_dir = config["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+    if checkpoint is None:
+        stale = glob.glob(os.path.join(output_dir, "checkpoint-*"))
+        if stale:
+            print(f"Removing {len(stale)} checkpoints of an earlier run from {output_dir}...")
+            for path in stale:
+                shutil.rmtree(path, ignore_errors=True)
+
+    path = os.path.join(output_dir, RUN_SETTINGS_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(settings, f, indent=4)
+    os.replace(f"{path}.tmp", path)
+
+
+def save_model(model, tokenizer, model_dir):
+    """
+    Save the trained model and tokenizer under a temporary name first, so a run
+    killed while saving never leaves a partial model that the scripts would
+    later load as complete.
+    """
+    temp_dir = f"{model_dir.rstrip(os.sep)}.{os.getpid()}.tmp"
+    model.save_pretrained(temp_dir)
+    tokenizer.save_pretrained(temp_dir)
+    shutil.rmtree(model_dir, ignore_errors=True)
+    os.replace(temp_dir, model_dir)
+
+
+def train_model(config, device=None, callbacks=None):
+    """
+    Fine-tune the classifier described by a config.
+
+    The split reproduces the original training scripts: NumPy's global
+    generator is seeded with `seed` before train_test_split, and so are
+    PyTorch's and Python's generators before the model is created. Unless
+    `resume` is false, training continues from the latest checkpoint in
+    `output_dir` if it was trained with the same settings (see resume_checkpoint).
+
+    Args:
+        config (Dict): A complete config from load_config or resolve_config.
+        device (torch.device, optional): Defaults to MPS when available, else the CPU.
+        callbacks (List[TrainerCallback], optional): Extra Trainer callbacks.
+
+    Returns:
+        Tuple[model, tokenizer, Dict]: The trained model, its tokenizer and the
+        results written to `result_logs`: training logs, evaluation results,
+        throughput and the config.
+    """
+    device = device or torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    torch.manual_seed(config["seed"])
+    random.seed(config["seed"])
+
+    # Streamed into memory-mapped Arrow files, so the dataset does not have to fit in memory
+    dataset = held_out_split(labeled_dataset(config["dataset"]), config["seed"], config["test_size"])
+
+    tokenizer = RobertaTokenizerFast.from_pretrained(config["base_model"])
+    model = create_model(config)
+    model.to(device)
+
+    # TRAINING_MODE, TRAIN_BATCH_SIZE, GRAD_ACCUMULATION_STEPS and TRAIN_BF16 still override the config
+    training_settings = training_settings_from_env(device, config["batch_size"], config["training_mode"],
+                                                   config["gradient_accumulation_steps"], config["bf16"])
+    print(f"Training {config['method']} model with {training_settings}")
+
+    tokenized_datasets = tokenize_dataset(dataset, tokenizer, max_length=config["max_length"],
+                                          cache_dir=config["tokenized_cache_dir"],
+                                          padding=padding_for(training_settings))
+
+    # Newer releases of transformers dropped logging_dir, leaving the location to the report integrations
+    if "logging_dir" in TrainingArguments.__dataclass_fields__:
+        logging_options = {"logging_dir": config["logging_dir"]}
+    else:
+        logging_options = {}
+
+    training_args = TrainingArguments(
+        output_dir=config["output_dir"],
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        learning_rate=config["learning_rate"],
+        num_train_epochs=config["epochs"],
+        weight_decay=config["weight_decay"],
+        logging_steps=10,
+        save_steps=500,
+        save_total_limit=config["save_total_limit"],
+        load_best_model_at_end=True,
+        metric_for_best_model="f1",
+        **logging_options,
+        **training_arguments(training_settings, device)
+    )
+
+    # Newer releases of transformers renamed Trainer's tokenizer argument to processing_class
+    tokenizer_argument = "processing_class" if "processing_class" in inspect.signature(Trainer.__init__).parameters else "tokenizer"
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=tokenized_datasets["train"],
+        eval_dataset=tokenized_datasets["test"],
+        compute_metrics=compute_metrics,
+        data_collator=data_collator(training_settings, tokenizer),
+        callbacks=[PeakMemoryCallback(device)] + list(callbacks or []),
+        **{tokenizer_argument: tokenizer}
+    )
+
+    settings = run_settings(config, training_settings)
+    checkpoint = resume_checkpoint(config, settings)
+    start_run(config, settings, checkpoint)
+    if checkpoint:
+        print(f"Resuming training from {checkpoint}...")
+    else:
+        print("Training the model...")
+    trainer.train(resume_from_checkpoint=checkpoint)
+
+    training_logs = trainer.state.log_history
+    print(f"Training Log: {training_logs}")
+
+    eval_results = trainer.evaluate()
+    print(f"Evalution Results: {eval_results}")
+
+    results = {
+        'training_logs': training_logs,
+        'eval_results': eval_results,
+        'throughput': throughput_summary(training_logs),
+        'training_settings': training_settings._asdict(),
+        'config': copy.deepcopy(config),
+    }
+    if config["result_logs"]:
+        with open(config["result_logs"], 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if config["model_dir"]:
+        print("Saving the fine-tuned model...")
+        save_model(model, tokenizer, config["model_dir"])
+
+    return model, tokenizer, results
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+# Compares the reports of common.classification.evaluation across runs, e.g. FFT vs PEFT or torch vs int8
+
+
+def load_eval_reports(paths):
+    reports = []
+    for path in paths:
+        with open(path, 'r') as f:
+            report = json.load(f)
+        report['name'] = os.path.splitext(os.path.basename(path))[0]
+        reports.append(report)
+    return reports
+
+
+def print_eval_comparison(reports):
+    # The first report is the baseline the others are compared against
+    baseline = reports[0]
+    print(f"{'run':<24} {'examples':>8} {'accuracy':>9} {'f1':>7} {'macro f1':>9} {'ex/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for report in reports:
+        latency = report['latency_ms']
+        print(f"{report['name']:<24} {report['num_examples']:>8} {report['accuracy']:>9.4f} {report['f1']:>7.4f} "
+              f"{report['macro_f1']:>9.4f} {report['throughput']['examples_per_second']:>8.1f} "
+              f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f}")
+        if report is not baseline:
+            print(f"{'  vs ' + baseline['name']:<24} {'':>8} {report['accuracy'] - baseline['accuracy']:>+9.4f} "
+                  f"{report['f1'] - baseline['f1']:>+7.4f} {report['macro_f1'] - baseline['macro_f1']:>+9.4f} "
+                  f"{report['throughput']['examples_per_second'] / baseline['throughput']['examples_per_second']:>7.2f}x "
+                  f"{latency['p50'] / baseline['latency_ms']['p50']:>7.2f}x {latency['p95'] / baseline['latency_ms']['p95']:>7.2f}x "
+                  f"{latency['p99'] / baseline['latency_ms']['p99']:>7.2f}x")
+
+    print("\nPer-class F1:")
+    categories = list(baseline['per_class'])
+    print(f"{'run':<24} " + " ".join(f"{category[:15]:>15}" for category in categories))
+    for report in reports:
+        print(f"{report['name']:<24} " + " ".join(f"{report['per_class'][category]['f1']:>15.4f}" for category in categories))
+
+
+def plot_eval_comparison(reports):
+    # Imported here so the printed comparison works without matplotlib
+    import matplotlib.pyplot as plt
+
+    names = [report['name'] for report in reports]
+    index = np.arange(len(reports))
+    bar_width = 0.35
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+
+    bars_accuracy = ax1.bar(index, [report['accuracy'] * 100 for report in reports], bar_width, color='b', label='Accuracy')
+    bars_f1 = ax1.bar(index + bar_width, [report['f1'] * 100 for report in reports], bar_width, color='g', label='F1-Score')
+    for bar in list(bars_accuracy) + list(bars_f1):
+        ax1.text(bar.get_x() + bar.get_width() / 2, bar.get_height() / 2, f"{bar.get_height():.2f}%", ha='center', va='center', color='white', fontsize=10)
+    ax1.set_ylabel('Percentage [%]')
+    ax1.set_title('Evaluation Metrics')
+    ax1.set_xticks(index + bar_width / 2)
+    ax1.set_xticklabels(names, rotation=15)
+    ax1.legend()
+
+    percentiles = ['p50', 'p95', 'p99']
+    bar_width = 0.8 / len(percentiles)
+    for position, (percentile, color) in enumerate(zip(percentiles, ['b', 'g', 'r'])):
+        ax2.bar(index + position * bar_width, [report['latency_ms'][percentile] for report in reports], bar_width, color=color, label=percentile)
+    ax2.set_ylabel('Single-request latency (ms)')
+    ax2.set_title('Inference Latency')
+    ax2.set_xticks(index + bar_width)
+    ax2.set_xticklabels(names, rotation=15)
+    ax2.legend()
+
+    plt.tight_layout()
+
+    os.makedirs('./plots', exist_ok=True)
+    plt.savefig('./plots/eval_comparison.png')
+
+    plt.show()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare evaluation reports; the first one is the baseline.")
+    parser.add_argument("reports", nargs="+", help="JSON reports written by common.classification.evaluation.")
+    parser.add_argument("--no-plot", action="store_true", help="Only print the comparison.")
+    args = parser.parse_args()
+
+    reports = load_eval_reports(args.reports)
+    print_eval_comparison(reports)
+    if not args.no_plot:
+        plot_eval_comparison(reports)
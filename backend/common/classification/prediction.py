@@ -1,18 +1,109 @@
+import bisect
+import numpy as np
 import torch
 
-def predict_fix_category(input_text, model, tokenizer, device):
-    inputs = tokenizer(input_text, return_tensors="pt", max_length=512, padding="max_length", truncation=True).to(device)
-    outputs = model(**inputs)
-    predicted_category = torch.argmax(outputs.logits, dim=1).item()
-
-    # Convert numerical label back to category name
-    category_map = {
-        0: "Add Mock",
-        1: "Add/Adjust Wait",
-        2: "Widen Assertion",
-        3: "Handle Timeout",
-        4: "Isolate State",
-        5: "Manage Resource"
-    }
-    
-    return category_map[predicted_category]
\ No newline at end of file
+from common.inference_config import inference_context
+
+# Convert numerical label back to category name
+category_map = {
+    0: "Add Mock",
+    1: "Add/Adjust Wait",
+    2: "Widen Assertion",
+    3: "Handle Timeout",
+    4: "Isolate State",
+    5: "Manage Resource"
+}
+
+# Optional padding lengths used when bucketing is enabled
+DEFAULT_LENGTH_BUCKETS = (64, 128, 256, 512)
+
+
+def pad_length_for(token_count, length_buckets, max_length=512):
+    """
+    Return the length a batch should be padded to when bucketing is enabled:
+    the smallest bucket that fits the longest input, capped at max_length.
+    """
+    position = bisect.bisect_left(length_buckets, token_count)
+    if position == len(length_buckets):
+        return max_length
+    return min(length_buckets[position], max_length)
+
+
+def tokenize_for_inference(input_texts, tokenizer, device, max_length=512, length_buckets=None):
+    """
+    Tokenize inputs for inference with dynamic padding.
+
+    Without buckets a batch is padded to its longest input. With buckets it is
+    padded up to the next bucket size, which keeps the number of distinct input
+    shapes small.
+    """
+    if length_buckets:
+        lengths = [len(ids) for ids in tokenizer(input_texts, truncation=True, max_length=max_length)["input_ids"]]
+        pad_to = pad_length_for(max(lengths), length_buckets, max_length)
+        inputs = tokenizer(input_texts, return_tensors="pt", max_length=pad_to, padding="max_length", truncation=True)
+    else:
+        inputs = tokenizer(input_texts, return_tensors="pt", max_length=max_length, padding="longest", truncation=True)
+    return inputs.to(device)
+
+
+def predict_fix_categories(input_texts, model, tokenizer, device, max_length=512, length_buckets=None):
+    """
+    Predict the fix category for a batch of test cases in one forward pass.
+
+    Args:
+        input_texts (List[str]): The test cases to classify.
+        model: The fine-tuned sequence classification model, or an int8 or ONNX
+            Runtime classifier from `common.classification.runtimes.load_classifier`.
+        tokenizer: The tokenizer paired with the model.
+        device (torch.device): The device the model runs on.
+        max_length (int): Maximum number of tokens per test case.
+        length_buckets (Sequence[int], optional): Padding lengths to round up to.
+
+    Returns:
+        List[str]: The predicted fix category for each test case.
+    """
+    if not input_texts:
+        return []
+
+    inputs = tokenize_for_inference(input_texts, tokenizer, device, max_length, length_buckets)
+    with inference_context():
+        outputs = model(**inputs)
+    predicted_categories = torch.argmax(outputs.logits, dim=1).tolist()
+
+    return [category_map[predicted_category] for predicted_category in predicted_categories]
+
+
+def predict_with_embeddings(input_texts, model, tokenizer, device, max_length=512, length_buckets=None):
+    """
+    Predict fix categories and compute retrieval embeddings in one forward pass.
+
+    The embedding is the CLS vector of the classifier's last encoder layer, the
+    same pooling the base model embeddings use, so it can query a FAISS index
+    built with SharedEncoder over the same fine-tuned model.
+
+    Args:
+        input_texts (List[str]): The test cases to classify.
+        model: The fine-tuned sequence classification model.
+        tokenizer: The tokenizer paired with the model.
+        device (torch.device): The device the model runs on.
+        max_length (int): Maximum number of tokens per test case.
+        length_buckets (Sequence[int], optional): Padding lengths to round up to.
+
+    Returns:
+        Tuple[List[str], np.ndarray]: The predicted fix category for each test
+        case and a float32 array of shape (len(input_texts), hidden_size).
+    """
+    if not input_texts:
+        return [], np.empty((0, model.config.hidden_size), dtype="float32")
+
+    inputs = tokenize_for_inference(input_texts, tokenizer, device, max_length, length_buckets)
+    with inference_context():
+        outputs = model(**inputs, output_hidden_states=True)
+    predicted_categories = torch.argmax(outputs.logits, dim=1).tolist()
+    embeddings = outputs.hidden_states[-1][:, 0, :].float().cpu().numpy()  # CLS token embedding
+
+    return [category_map[predicted_category] for predicted_category in predicted_categories], embeddings
+
+
+def predict_fix_category(input_text, model, tokenizer, device, max_length=512, length_buckets=None):
+    return predict_fix_categories([input_text], model, tokenizer, device, max_length, length_buckets)[0]
@@ -1,17 +1,132 @@
-from datasets import Dataset
+import json
+import os
+
+import numpy as np
+from datasets import Dataset, Features, Value
+from datasets.exceptions import DatasetGenerationError
+
+from common.classification.dataset import dataset_files, iter_examples
+
+CATEGORY_MAP = {
+    "Add Mock": 0,
+    "Add/Adjust Wait": 1,
+    "Widen Assertion": 2,
+    "Handle Timeout": 3,
+    "Isolate State": 4,
+    "Manage Resource": 5
+}
+
+LABELED_FEATURES = Features({'input': Value('string'), 'label': Value('int64')})
+
+
+def label_example(example):
+    """
+    Map an example's fix category ("<category>: <description>") to its label.
+    The training data holds it under 'output', the validation datasets under
+    'fix_category'.
+
+    Raises:
+        ValueError: If the example has no input text or an unknown fix category.
+    """
+    if not isinstance(example.get('input'), str) or not example['input'].strip():
+        raise ValueError("the example has no input test case")
+    fix = example.get('output', example.get('fix_category'))
+    if not isinstance(fix, str):
+        raise ValueError("the example has no fix category")
+    category = fix.split(":")[0].strip()
+    if category not in CATEGORY_MAP:
+        raise ValueError(f"unknown fix category '{category}'")
+    return {'input': example['input'], 'label': CATEGORY_MAP[category]}
+
+
+def label_examples(examples, skip_invalid=False):
+    """
+    Label a stream of examples, validating each one as it passes.
+
+    Args:
+        examples (Iterable[Dict]): Raw examples with 'input' and 'output' (or 'fix_category').
+        skip_invalid (bool): Leave out invalid examples instead of raising.
+
+    Yields:
+        Dict: The 'input' and 'label' of every valid example.
+    """
+    skipped = 0
+    for position, example in enumerate(examples):
+        try:
+            yield label_example(example)
+        except ValueError as e:
+            if not skip_invalid:
+                raise ValueError(f"Invalid example {position}: {e}")
+            skipped += 1
+    if skipped:
+        print(f"Skipped {skipped} invalid examples.")
+
 
 def preprocess_data(data):
-    category_map = {
-        "Add Mock": 0,
-        "Add/Adjust Wait": 1,
-        "Widen Assertion": 2,
-        "Handle Timeout": 3,
-        "Isolate State": 4,
-        "Manage Resource": 5
-    }
-    
-    inputs = [item['input'] for item in data]
-    
-    outputs = [category_map[item['output'].split(":")[0].strip()] for item in data]
-
-    return Dataset.from_dict({'input': inputs, 'label': outputs})
+    labeled = list(label_examples(data))
+
+    return Dataset.from_dict({'input': [example['input'] for example in labeled],
+                              'label': [example['label'] for example in labeled]})
+
+
+def generate_labeled_examples(path, shard_index, num_shards, skip_invalid, files_signature):
+    # files_signature only changes the cache fingerprint when the files change
+    yield from label_examples(iter_examples(path, shard_index, num_shards), skip_invalid)
+
+
+def labeled_dataset(path, cache_dir=None, skip_invalid=False, shard_index=0, num_shards=1, writer_batch_size=1000):
+    """
+    Stream a dataset's examples through labeling and validation straight into
+    an Arrow dataset on disk.
+
+    Unlike load_dataset and preprocess_data, this never holds the whole dataset
+    in memory: examples are written in batches of `writer_batch_size` and the
+    result is memory-mapped, so datasets larger than RAM can be trained on. The
+    Arrow files are reused until the dataset files change.
+
+    Args:
+        path (str): A JSON or JSONL file, a directory of shards or a glob pattern (see iter_examples).
+        cache_dir (str, optional): Where the Arrow files are written. Defaults to the datasets cache.
+        skip_invalid (bool): Leave out invalid examples instead of raising.
+        shard_index (int): Which of the `num_shards` interleaved parts to keep.
+        num_shards (int): Number of parts the examples are split into.
+        writer_batch_size (int): Examples buffered in memory before each write.
+
+    Returns:
+        Dataset: The memory-mapped 'input' and 'label' columns.
+    """
+    files_signature = json.dumps([(os.path.abspath(file_path), os.path.getsize(file_path), os.path.getmtime(file_path))
+                                  for file_path in dataset_files(path)])
+    try:
+        return Dataset.from_generator(
+            generate_labeled_examples,
+            features=LABELED_FEATURES,
+            cache_dir=cache_dir,
+            writer_batch_size=writer_batch_size,
+            gen_kwargs={"path": path, "shard_index": shard_index, "num_shards": num_shards,
+                        "skip_invalid": skip_invalid, "files_signature": files_signature},
+        )
+    except DatasetGenerationError as e:
+        # Report the invalid example rather than the generic generation error
+        if isinstance(e.__cause__, ValueError):
+            raise e.__cause__
+        raise
+
+
+def held_out_split(data, seed, test_size=0.2):
+    """
+    Reproduce the train/test split of the training scripts, which seed NumPy's
+    global generator and then call train_test_split without a seed.
+
+    Args:
+        data (List[Dict] or Dataset): The raw dataset examples, or the labeled
+            dataset from labeled_dataset; both split identically.
+        seed (int): The seed the training script used (10 for FFT, 3 for PEFT).
+        test_size (float): Fraction of examples held out.
+
+    Returns:
+        DatasetDict: The 'train' and 'test' splits with 'input' and 'label' columns.
+    """
+    np.random.seed(seed)
+    dataset = data if isinstance(data, Dataset) else preprocess_data(data)
+    return dataset.train_test_split(test_size=test_size)
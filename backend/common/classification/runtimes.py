@@ -0,0 +1,241 @@
+import argparse
+import os
+
+import numpy as np
+import torch
+from transformers import RobertaConfig, RobertaForSequenceClassification, RobertaTokenizerFast
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+from common.inference_config import active_inference_config
+
+# CPU inference runtimes for the fine-tuned classifiers
+
+# torch: the fp32 model, int8: dynamically quantized PyTorch model,
+# onnx / onnx-int8: ONNX Runtime session over the fp32 / int8 ONNX export
+RUNTIMES = ("torch", "int8", "onnx", "onnx-int8")
+
+INT8_WEIGHTS = "model_int8.pt"
+ONNX_MODEL = "model.onnx"
+ONNX_INT8_MODEL = "model.int8.onnx"
+
+
+def runtime_dir_for(model_dir):
+    """
+    Return the directory the exported runtimes of a model are stored in. It sits
+    next to the model rather than inside it, so exporting does not change the
+    fingerprint of the model directory used by the caches and index manifests.
+    """
+    return os.path.normpath(model_dir) + "_runtimes"
+
+
+def merge_lora_layers(model):
+    """
+    Fold LoRA adapters into the weights they adapt, so that a PEFT classifier
+    exports and quantizes like a fully fine-tuned one. Models without adapters
+    are returned unchanged.
+    """
+    try:
+        from peft.tuners.lora import LoraLayer
+        from peft.utils import ModulesToSaveWrapper
+    except ImportError:
+        return model
+
+    for name, module in list(model.named_modules()):
+        if isinstance(module, LoraLayer):
+            module.merge()
+            merged = module.get_base_layer()
+        elif isinstance(module, ModulesToSaveWrapper):
+            # The classification head is trained as a full copy; keep only that copy
+            merged = module.unload_and_optionally_merge_module(merge=True, safe_merge=False, adapter_names=None)
+        else:
+            continue
+        parent_name, _, child_name = name.rpartition(".")
+        setattr(model.get_submodule(parent_name), child_name, merged)
+    return model
+
+
+def quantize_int8(model):
+    """
+    Dynamically quantize the Linear layers of a model to int8. Weights are
+    stored as int8 and activations are quantized on the fly, which speeds up
+    CPU inference without calibration data.
+    """
+    return torch.ao.quantization.quantize_dynamic(model.cpu().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_int8(model, output_dir):
+    """
+    Save a dynamically quantized copy of a classifier.
+
+    Args:
+        model: The fp32 classifier (LoRA adapters already merged).
+        output_dir (str): Directory to write the config and quantized weights to.
+
+    Returns:
+        str: The path of the quantized weights.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    model.config.save_pretrained(output_dir)
+    path = os.path.join(output_dir, INT8_WEIGHTS)
+    torch.save(quantize_int8(model).state_dict(), path)
+    print(f"Saved int8 model to {path}.")
+    return path
+
+
+def export_onnx(model, tokenizer, output_dir, quantize=True, opset=17):
+    """
+    Export a classifier to ONNX with dynamic batch and sequence dimensions, and
+    optionally an int8 copy quantized with ONNX Runtime.
+
+    The graph returns the logits and the last hidden state, so the ONNX
+    runtimes can also serve the shared-encoder retrieval embeddings.
+
+    Args:
+        model: The fp32 classifier (LoRA adapters already merged).
+        tokenizer: The tokenizer paired with the model.
+        output_dir (str): Directory to write the ONNX files to.
+        quantize (bool): Also write a dynamically quantized int8 ONNX model.
+        opset (int): ONNX opset version.
+
+    Returns:
+        List[str]: The paths of the exported models.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, ONNX_MODEL)
+    inputs = tokenizer(["test('export', async () => {});"], return_tensors="pt")
+
+    class LogitsAndHiddenState(torch.nn.Module):
+        def __init__(self, classifier):
+            super().__init__()
+            self.classifier = classifier
+
+        def forward(self, input_ids, attention_mask):
+            outputs = self.classifier(input_ids=input_ids, attention_mask=attention_mask, output_hidden_states=True)
+            return outputs.logits, outputs.hidden_states[-1]
+
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"}, "last_hidden_state": {0: "batch", 1: "sequence"}}
+    torch.onnx.export(LogitsAndHiddenState(model.cpu().eval()), (inputs["input_ids"], inputs["attention_mask"]), path,
+                      input_names=["input_ids", "attention_mask"], output_names=["logits", "last_hidden_state"],
+                      dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+    print(f"Saved ONNX model to {path}.")
+    paths = [path]
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(output_dir, ONNX_INT8_MODEL)
+        quantize_dynamic(path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Saved int8 ONNX model to {int8_path}.")
+        paths.append(int8_path)
+
+    return paths
+
+
+class OnnxClassifier:
+    """
+    Runs an exported classifier with ONNX Runtime behind the interface of the
+    PyTorch model, so `predict_fix_categories`, `predict_with_embeddings` and
+    `SharedEncoder` work with it unchanged.
+    """
+
+    def __init__(self, path, config, num_threads=None):
+        """
+        Args:
+            path (str): The ONNX model file.
+            config: The model config (used for hidden_size and labels).
+            num_threads (int, optional): Intra-op threads; ONNX Runtime picks by default.
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.config = config
+        self.device = torch.device("cpu")
+        self._input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+    def parameters(self):
+        # Lets callers that look up the model's device treat it like a CPU torch model
+        yield torch.empty(0)
+
+    def __call__(self, output_hidden_states=False, **inputs):
+        feed = {name: inputs[name].cpu().numpy().astype(np.int64) for name in self._input_names}
+        output_names = ["logits", "last_hidden_state"] if output_hidden_states else ["logits"]
+        outputs = self.session.run(output_names, feed)
+        hidden_states = (torch.from_numpy(outputs[1]),) if output_hidden_states else None
+        return SequenceClassifierOutput(logits=torch.from_numpy(outputs[0]), hidden_states=hidden_states)
+
+
+def load_classifier(model_dir, runtime="torch", device=None, runtime_dir=None, num_labels=6):
+    """
+    Load a fine-tuned classifier for inference with the given runtime.
+
+    Args:
+        model_dir (str): Directory of the fine-tuned (full or PEFT) model.
+        runtime (str): One of 'torch', 'int8', 'onnx' or 'onnx-int8'.
+        device (torch.device, optional): Device for the 'torch' runtime; the
+            other runtimes always run on the CPU.
+        runtime_dir (str, optional): Where the exported runtimes are stored.
+            Defaults to runtime_dir_for(model_dir).
+        num_labels (int): Number of fix categories.
+
+    Returns:
+        The classifier, callable like a RobertaForSequenceClassification.
+    """
+    if runtime not in RUNTIMES:
+        raise ValueError(f"Unknown classifier runtime '{runtime}', expected one of {', '.join(RUNTIMES)}")
+
+    runtime_dir = runtime_dir or runtime_dir_for(model_dir)
+    print(f"Loading the {runtime} classifier for {model_dir}...")
+
+    if runtime == "torch":
+        model = RobertaForSequenceClassification.from_pretrained(model_dir, num_labels=num_labels)
+        return model.to(device or torch.device("cpu")).eval()
+
+    if runtime == "int8":
+        weights = os.path.join(runtime_dir, INT8_WEIGHTS)
+        if not os.path.exists(weights):
+            # Dynamic quantization needs no calibration, so it can be done at load time
+            print(f"{weights} not found, quantizing the fp32 model instead.")
+            model = merge_lora_layers(RobertaForSequenceClassification.from_pretrained(model_dir, num_labels=num_labels))
+            return quantize_int8(model)
+        model = quantize_int8(RobertaForSequenceClassification(RobertaConfig.from_pretrained(runtime_dir)))
+        model.load_state_dict(torch.load(weights))
+        return model.eval()
+
+    path = os.path.join(runtime_dir, ONNX_INT8_MODEL if runtime == "onnx-int8" else ONNX_MODEL)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found. Export it with "
+                                f"`python -m common.classification.runtimes --model-dir {model_dir}`.")
+    return OnnxClassifier(path, RobertaConfig.from_pretrained(runtime_dir), active_inference_config().intra_op_threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the int8 and ONNX runtimes of a fine-tuned classifier.")
+    parser.add_argument("--model-dir", required=True, help="Directory of the fine-tuned (full or PEFT) classifier.")
+    parser.add_argument("--output-dir", help="Where to write the runtimes. Defaults to <model-dir>_runtimes.")
+    parser.add_argument("--skip-onnx", action="store_true", help="Only export the int8 PyTorch model.")
+    parser.add_argument("--num-labels", type=int, default=6)
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or runtime_dir_for(args.model_dir)
+    tokenizer = RobertaTokenizerFast.from_pretrained(args.model_dir)
+    model = RobertaForSequenceClassification.from_pretrained(args.model_dir, num_labels=args.num_labels)
+    model = merge_lora_layers(model).eval()
+
+    export_int8(model, output_dir)
+    if not args.skip_onnx:
+        export_onnx(model, tokenizer, output_dir)
+    print(f"Runtimes written to {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
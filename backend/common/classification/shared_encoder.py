@@ -0,0 +1,46 @@
+import copy
+
+from transformers.modeling_outputs import BaseModelOutput
+
+from common.inference_config import inference_context
+
+# Retrieval embeddings from the fine-tuned classifier's encoder
+
+
+class SharedEncoder:
+    """
+    Presents a fine-tuned sequence classification model as an embedding model.
+
+    Calling it returns the classifier's last encoder layer as
+    `last_hidden_state`, so `embed_texts`, `embed_query` and `build_faiss_index`
+    can use it in place of the base UniXcoder `AutoModel`. The classifier's
+    weights are shared, so there is no second copy of the encoder in memory,
+    and queries can be embedded by the same forward pass that predicts their
+    category (see `predict_with_embeddings`).
+    """
+
+    def __init__(self, classifier, name_or_path):
+        """
+        Args:
+            classifier: The fine-tuned sequence classification model (full or PEFT).
+            name_or_path (str): Where the classifier was loaded from. It identifies
+                the embeddings in the index manifest, so an index is rebuilt when
+                the classifier is retrained.
+        """
+        self.classifier = classifier
+        # PEFT models report the base model's config, so record the fine-tuned path explicitly
+        self.config = copy.copy(classifier.config)
+        self.config._name_or_path = name_or_path
+
+    @property
+    def device(self):
+        return next(self.classifier.parameters()).device
+
+    def eval(self):
+        self.classifier.eval()
+        return self
+
+    def __call__(self, **inputs):
+        with inference_context():
+            outputs = self.classifier(**inputs, output_hidden_states=True)
+        return BaseModelOutput(last_hidden_state=outputs.hidden_states[-1])
@@ -0,0 +1,266 @@
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import traceback
+from multiprocessing.connection import wait
+
+import numpy as np
+import torch
+from transformers import TrainerCallback
+
+from common.classification.finetune import load_config, train_model
+from common.inference_config import available_cores, cores_for_worker
+
+# Hyperparameter sweeps: concurrent trials on a CPU core budget, median pruning and a leaderboard
+
+DEFAULT_PRUNING = {"min_epochs": 1, "min_trials": 2, "percentile": 50}
+
+TRIAL_FILE = "trial.json"
+PROGRESS_FILE = "progress.json"
+
+
+def write_json(path, data):
+    # Written under a temporary name first, since other trials read these files while they are written
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(temp_path, path)
+
+
+def read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def load_sweep(path):
+    """
+    Load a sweep file and resolve its paths relative to it.
+
+    A sweep names a base training config, shared overrides, a grid of values to
+    try and the scheduling settings:
+
+        {
+            "base": "fft.json",
+            "overrides": {"epochs": 5},
+            "grid": {"learning_rate": [1e-5, 3e-5], "batch_size": [8, 16]},
+            "num_trials": null,
+            "output_dir": "../sweeps/fft",
+            "core_budget": null,
+            "cores_per_trial": 2,
+            "pruning": {"min_epochs": 1, "min_trials": 2, "percentile": 50}
+        }
+
+    `num_trials` samples that many grid points at random instead of trying them
+    all, `core_budget` defaults to every available core, and pruning can be
+    turned off with "pruning": null.
+
+    Returns:
+        Dict: The sweep settings.
+    """
+    with open(path, 'r') as f:
+        sweep = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    sweep["base"] = os.path.join(base_dir, sweep["base"])
+    sweep["output_dir"] = os.path.normpath(os.path.join(base_dir, sweep.get("output_dir", "sweep")))
+    sweep.setdefault("overrides", {})
+    sweep.setdefault("grid", {})
+    sweep.setdefault("cores_per_trial", 1)
+    sweep["core_budget"] = sweep.get("core_budget") or len(available_cores())
+    if "pruning" not in sweep:
+        sweep["pruning"] = DEFAULT_PRUNING
+    elif sweep["pruning"] is not None:
+        sweep["pruning"] = {**DEFAULT_PRUNING, **sweep["pruning"]}
+    return sweep
+
+
+def expand_trials(sweep):
+    """
+    Return the trials of a sweep as (trial_id, params) pairs: every combination
+    of the grid values, or a seeded random sample of `num_trials` of them.
+    """
+    keys = sorted(sweep["grid"])
+    combinations = [dict(zip(keys, values)) for values in itertools.product(*(sweep["grid"][key] for key in keys))]
+    if sweep.get("num_trials") and sweep["num_trials"] < len(combinations):
+        combinations = random.Random(sweep.get("seed", 0)).sample(combinations, sweep["num_trials"])
+    return [(f"trial_{number:03d}", params) for number, params in enumerate(combinations)]
+
+
+def trial_config(sweep, trial_id, params):
+    """
+    Return the training config of a trial, writing its checkpoints and logs to
+    its own directory. Models are only kept with "save_models": true.
+    """
+    trial_dir = os.path.join(sweep["output_dir"], trial_id)
+    config = load_config(sweep["base"], {**sweep["overrides"], **params})
+    config.update(
+        output_dir=os.path.join(trial_dir, "checkpoints"),
+        logging_dir=os.path.join(trial_dir, "logs"),
+        result_logs=os.path.join(trial_dir, "result_logs.json"),
+        model_dir=os.path.join(trial_dir, "model") if sweep.get("save_models") else None,
+        save_total_limit=1,
+    )
+    return config
+
+
+class MedianPruningCallback(TrainerCallback):
+    """
+    Stops a trial whose eval F1 after an epoch falls below the given percentile
+    (the median by default) of the other trials' F1 after the same epoch.
+
+    Trials share their progress through a file in each trial directory, so
+    trials running concurrently and finished ones are compared alike. Pruning
+    starts after `min_epochs` and needs reports from at least `min_trials`
+    other trials.
+    """
+
+    def __init__(self, sweep_dir, trial_id, min_epochs=1, min_trials=2, percentile=50):
+        self.sweep_dir = sweep_dir
+        self.trial_id = trial_id
+        self.min_epochs = min_epochs
+        self.min_trials = min_trials
+        self.percentile = percentile
+        # A trial resumed from a checkpoint keeps the scores of its earlier epochs
+        self.progress = read_json(os.path.join(sweep_dir, trial_id, PROGRESS_FILE)) or {"f1_by_epoch": {}, "pruned": False}
+
+    def other_scores(self, epoch):
+        scores = []
+        for trial_id in os.listdir(self.sweep_dir):
+            # The sweep directory also holds leaderboard.json next to the trial directories
+            if trial_id == self.trial_id or not os.path.isdir(os.path.join(self.sweep_dir, trial_id)):
+                continue
+            progress = read_json(os.path.join(self.sweep_dir, trial_id, PROGRESS_FILE))
+            if progress and str(epoch) in progress["f1_by_epoch"]:
+                scores.append(progress["f1_by_epoch"][str(epoch)])
+        return scores
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        if not metrics or "eval_f1" not in metrics:
+            return
+        epoch = int(round(state.epoch))
+        f1 = metrics["eval_f1"]
+        self.progress["f1_by_epoch"][str(epoch)] = f1
+
+        others = self.other_scores(epoch)
+        if epoch >= self.min_epochs and len(others) >= self.min_trials:
+            threshold = float(np.percentile(others, self.percentile))
+            if f1 < threshold:
+                print(f"Pruning {self.trial_id}: eval F1 {f1:.4f} after epoch {epoch} is below {threshold:.4f}.")
+                self.progress.update(pruned=True, pruned_at_epoch=epoch, threshold=threshold)
+                control.should_training_stop = True
+
+        write_json(os.path.join(self.sweep_dir, self.trial_id, PROGRESS_FILE), self.progress)
+
+
+def run_trial(config, trial_id, params, slot, slots, sweep_dir, pruning):
+    """
+    Train one trial in a worker process, pinned to its share of the core budget,
+    and record its outcome in trial.json.
+    """
+    trial_dir = os.path.join(sweep_dir, trial_id)
+    # Keep each trial's output apart instead of interleaving it with the others
+    log_file = open(os.path.join(trial_dir, "train.log"), 'a', buffering=1)
+    sys.stdout = sys.stderr = log_file
+
+    cores = cores_for_worker(slot, slots)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+    callbacks = [MedianPruningCallback(sweep_dir, trial_id, **pruning)] if pruning else []
+    outcome = {"trial": trial_id, "params": params, "cores": cores}
+    try:
+        _, _, results = train_model(config, device=torch.device("cpu"), callbacks=callbacks)
+        progress = callbacks[0].progress if callbacks else {}
+        epochs = [entry["epoch"] for entry in results["training_logs"] if "epoch" in entry]
+        outcome.update(
+            status="pruned" if progress.get("pruned") else "completed",
+            eval_f1=results["eval_results"].get("eval_f1"),
+            eval_accuracy=results["eval_results"].get("eval_accuracy"),
+            epochs_run=max(epochs) if epochs else 0,
+            f1_by_epoch=progress.get("f1_by_epoch", {}),
+            **results["throughput"],
+        )
+    except Exception as e:
+        traceback.print_exc()
+        outcome.update(status="failed", error=str(e))
+    write_json(os.path.join(trial_dir, TRIAL_FILE), outcome)
+
+
+def run_sweep(sweep):
+    """
+    Run every trial of a sweep, `core_budget // cores_per_trial` at a time, and
+    write the leaderboard. Trials that already finished in an earlier run of the
+    same sweep are not run again.
+
+    Returns:
+        List[Dict]: The leaderboard rows, best first.
+    """
+    sweep_dir = sweep["output_dir"]
+    os.makedirs(sweep_dir, exist_ok=True)
+    slots = max(1, sweep["core_budget"] // sweep["cores_per_trial"])
+
+    pending = []
+    for trial_id, params in expand_trials(sweep):
+        finished = read_json(os.path.join(sweep_dir, trial_id, TRIAL_FILE))
+        if finished and finished["status"] in ("completed", "pruned"):
+            print(f"{trial_id} already {finished['status']}, skipping it.")
+            continue
+        pending.append((trial_id, params))
+    print(f"Running {len(pending)} trials, {slots} at a time with {sweep['cores_per_trial']} cores each.")
+
+    # Spawned workers start with fresh thread pools that can be sized and pinned
+    context = multiprocessing.get_context("spawn")
+    running = {}
+    while pending or running:
+        free_slots = [slot for slot in range(slots) if slot not in running.values()]
+        while pending and free_slots:
+            trial_id, params = pending.pop(0)
+            slot = free_slots.pop(0)
+            os.makedirs(os.path.join(sweep_dir, trial_id), exist_ok=True)
+            process = context.Process(target=run_trial, name=trial_id, args=(
+                trial_config(sweep, trial_id, params), trial_id, params, slot, slots, sweep_dir, sweep["pruning"]))
+            process.start()
+            running[process] = slot
+            print(f"Started {trial_id} {params} on slot {slot}.")
+
+        for sentinel in wait([process.sentinel for process in running]):
+            process = next(process for process in running if process.sentinel == sentinel)
+            process.join()
+            del running[process]
+            outcome = read_json(os.path.join(sweep_dir, process.name, TRIAL_FILE)) or {"status": "failed"}
+            print(f"Finished {process.name}: {outcome['status']}, eval F1 {outcome.get('eval_f1')}.")
+
+    return write_leaderboard(sweep, [trial_id for trial_id, _ in expand_trials(sweep)])
+
+
+def write_leaderboard(sweep, trial_ids):
+    """
+    Rank the trials by eval F1 (failed trials last), write leaderboard.json to
+    the sweep directory and print it with the training throughput of each trial.
+
+    Returns:
+        List[Dict]: The leaderboard rows, best first.
+    """
+    rows = []
+    for trial_id in trial_ids:
+        outcome = read_json(os.path.join(sweep["output_dir"], trial_id, TRIAL_FILE))
+        rows.append(outcome or {"trial": trial_id, "status": "failed", "error": "No result recorded"})
+    rows.sort(key=lambda row: (row["status"] == "failed", -(row.get("eval_f1") or 0)))
+
+    write_json(os.path.join(sweep["output_dir"], "leaderboard.json"), rows)
+
+    print(f"\n{'rank':>4} {'trial':<10} {'status':<9} {'eval F1':>8} {'epochs':>6} {'samples/s':>9} {'steps/s':>8} "
+          f"{'peak MB':>8}  params")
+    for rank, row in enumerate(rows, 1):
+        print(f"{rank:>4} {row['trial']:<10} {row['status']:<9} {row.get('eval_f1') or 0:>8.4f} "
+              f"{row.get('epochs_run') or 0:>6.1f} {row.get('train_samples_per_second') or 0:>9.2f} "
+              f"{row.get('train_steps_per_second') or 0:>8.3f} {row.get('train_peak_rss_mb') or 0:>8.0f}  "
+              f"{json.dumps(row.get('params', {}))}")
+    print(f"Leaderboard written to {os.path.join(sweep['output_dir'], 'leaderboard.json')}")
+    return rows
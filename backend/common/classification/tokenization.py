@@ -1,6 +1,106 @@
-def tokenize_data(data, tokenizer):
-     inputs = tokenizer(data["input"], max_length=512, padding="max_length", truncation=True)
+import functools
+import hashlib
+import json
+import os
+import shutil
 
-     inputs["labels"] = data["label"]
+import multiprocess
+from datasets import load_from_disk
 
-     return inputs
\ No newline at end of file
+# Tokenization of the training data, with an on-disk cache shared by training runs
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                 "data", "tokenized_cache")
+
+
+def tokenize_data(data, tokenizer, max_length=512, padding="max_length"):
+    # Unpadded examples get a length column, which the Trainer uses to group examples of similar length
+    inputs = tokenizer(data["input"], max_length=max_length, padding=padding, truncation=True, return_length=not padding)
+
+    inputs["labels"] = data["label"]
+
+    return inputs
+
+
+def default_num_proc():
+    """
+    Return how many processes tokenize by default: one per CPU where workers
+    are forked. Spawned workers (the default on macOS and Windows) would re-run
+    the training scripts, which are not guarded by `if __name__ == '__main__'`.
+    """
+    if multiprocess.get_start_method() != "fork":
+        return 1
+    return os.cpu_count() or 1
+
+
+def tokenized_cache_key(dataset, tokenizer, max_length=512, padding="max_length"):
+    """
+    Key a tokenized dataset by the contents of its splits, the tokenizer, max_length and padding.
+
+    Args:
+        dataset (DatasetDict): The splits with 'input' and 'label' columns.
+        tokenizer: A fast tokenizer; its full serialized vocabulary and settings are hashed.
+        max_length (int): Maximum number of tokens per example.
+        padding (str or bool): 'max_length', or False to leave padding to the data collator.
+
+    Returns:
+        str: A hex digest that changes whenever any of them changes.
+    """
+    digest = hashlib.sha256()
+    for split in sorted(dataset):
+        digest.update(split.encode("utf-8"))
+        # Hashed a batch at a time, since a memory-mapped dataset may not fit in memory
+        for batch in dataset[split].select_columns(["input", "label"]).iter(batch_size=1000):
+            digest.update(json.dumps(batch).encode("utf-8"))
+    digest.update(tokenizer.backend_tokenizer.to_str().encode("utf-8"))
+    digest.update(f"{type(tokenizer).__name__}:{max_length}:{padding}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def tokenize_dataset(dataset, tokenizer, max_length=512, cache_dir=None, num_proc=None, padding="max_length"):
+    """
+    Tokenize the train/test splits, reusing an earlier run's result when possible.
+
+    The tokenized splits are saved under `cache_dir`, keyed by tokenized_cache_key,
+    so later training runs and hyperparameter trials on the same split load them
+    from disk instead of tokenizing again. Without a cached copy the examples are
+    tokenized in parallel across `num_proc` processes.
+
+    Args:
+        dataset (DatasetDict): The splits with 'input' and 'label' columns.
+        tokenizer: The tokenizer paired with the model.
+        max_length (int): Maximum number of tokens per example.
+        cache_dir (str, optional): Where tokenized datasets are cached. Defaults to
+            TOKENIZED_CACHE_DIR from the environment, then to data/tokenized_cache
+            in the backend directory. Setting TOKENIZED_CACHE_DIR to an empty
+            string turns caching off.
+        num_proc (int, optional): Processes used for tokenizing. Defaults to default_num_proc().
+        padding (str or bool): 'max_length', or False to leave padding to the data collator.
+
+    Returns:
+        DatasetDict: The tokenized splits.
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get("TOKENIZED_CACHE_DIR", DEFAULT_CACHE_DIR)
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, tokenized_cache_key(dataset, tokenizer, max_length, padding))
+        if os.path.exists(cache_path):
+            print(f"Loading the tokenized dataset from {cache_path}...")
+            return load_from_disk(cache_path)
+
+    num_proc = num_proc or default_num_proc()
+    num_proc = num_proc if num_proc > 1 else None
+    print(f"Tokenizing the dataset{f' with {num_proc} processes' if num_proc else ''}...")
+    tokenized = dataset.map(functools.partial(tokenize_data, tokenizer=tokenizer, max_length=max_length, padding=padding),
+                            batched=True, num_proc=num_proc)
+
+    if cache_path:
+        # Save under a temporary name first, so a crashed run never leaves a partial cache entry behind
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        tokenized.save_to_disk(temp_path)
+        shutil.rmtree(cache_path, ignore_errors=True)
+        os.replace(temp_path, cache_path)
+        print(f"Tokenized dataset saved to {cache_path}.")
+        tokenized = load_from_disk(cache_path)
+    return tokenized
@@ -0,0 +1,153 @@
+import os
+import resource
+import sys
+from collections import namedtuple
+
+import torch
+from transformers import DataCollatorWithPadding, TrainerCallback, TrainingArguments
+
+# Training modes for the fine-tuning scripts
+
+# standard: every example padded to max_length, as the models were originally trained.
+# throughput: dynamic padding per batch, length-grouped batches, gradient accumulation and bf16 autocast.
+TRAINING_MODES = ("standard", "throughput")
+
+TrainingSettings = namedtuple(
+    "TrainingSettings",
+    ["mode", "batch_size", "gradient_accumulation_steps", "bf16"],
+    defaults=("standard", 8, 1, False),
+)
+
+
+def cpu_supports_bf16():
+    """
+    Whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX), without
+    which bf16 autocast is emulated and slower than fp32.
+    """
+    checks = (getattr(torch.cpu, "_is_avx512_bf16_supported", None), getattr(torch.cpu, "_is_amx_tile_supported", None))
+    return any(check() for check in checks if check is not None)
+
+
+def training_settings_from_env(device, batch_size=8, mode="standard", gradient_accumulation_steps=1, bf16="auto"):
+    """
+    Read the training mode from the environment, which takes precedence over
+    the given settings:
+
+        TRAINING_MODE               standard or throughput.
+        TRAIN_BATCH_SIZE            Examples per forward pass.
+        GRAD_ACCUMULATION_STEPS     Forward passes per optimizer step.
+        TRAIN_BF16                  auto, 1 or 0. With auto, the throughput mode uses bf16
+                                    autocast when training on a CPU that supports it.
+
+    Args:
+        device (torch.device): The device the model trains on.
+        batch_size (int): Default batch size.
+        mode (str): Default training mode.
+        gradient_accumulation_steps (int): Default number of accumulated forward passes.
+        bf16 (str or bool): Default bf16 setting.
+
+    Returns:
+        TrainingSettings: The settings.
+    """
+    mode = os.environ.get("TRAINING_MODE", mode)
+    if mode not in TRAINING_MODES:
+        raise ValueError(f"Unknown training mode '{mode}', expected one of {', '.join(TRAINING_MODES)}")
+
+    bf16 = os.environ.get("TRAIN_BF16", bf16)
+    if bf16 == "auto":
+        bf16 = mode == "throughput" and device.type == "cpu" and cpu_supports_bf16()
+    else:
+        bf16 = bf16 in (True, "1")
+
+    return TrainingSettings(
+        mode=mode,
+        batch_size=int(os.environ.get("TRAIN_BATCH_SIZE", batch_size)),
+        gradient_accumulation_steps=int(os.environ.get("GRAD_ACCUMULATION_STEPS", gradient_accumulation_steps)),
+        bf16=bf16,
+    )
+
+
+def padding_for(settings):
+    """
+    Return how tokenize_data pads: to max_length in the standard mode, not at
+    all in the throughput mode, where the collator pads each batch instead.
+    """
+    return "max_length" if settings.mode == "standard" else False
+
+
+def training_arguments(settings, device):
+    """
+    Return the TrainingArguments options of a training mode, to pass next to the
+    script's own options.
+
+    Args:
+        settings (TrainingSettings): The training mode.
+        device (torch.device): The device the model trains on.
+
+    Returns:
+        Dict: Batch size, gradient accumulation, length grouping and precision options.
+    """
+    arguments = {
+        "per_device_train_batch_size": settings.batch_size,
+        "per_device_eval_batch_size": settings.batch_size,
+        "gradient_accumulation_steps": settings.gradient_accumulation_steps,
+    }
+    if settings.mode == "throughput":
+        # Batches of similar lengths need little padding; older versions of transformers name this group_by_length
+        if "train_sampling_strategy" in TrainingArguments.__dataclass_fields__:
+            arguments["train_sampling_strategy"] = "group_by_length"
+        else:
+            arguments["group_by_length"] = True
+    if settings.bf16:
+        arguments["bf16"] = True
+        # bf16 autocast on the CPU has to be asked for explicitly
+        arguments["use_cpu"] = device.type == "cpu"
+    return arguments
+
+
+def data_collator(settings, tokenizer):
+    """
+    Return the Trainer's data collator: None (the default) for examples already
+    padded to max_length, or dynamic padding to the longest example in the batch.
+    """
+    if settings.mode == "standard":
+        return None
+    return DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class PeakMemoryCallback(TrainerCallback):
+    """
+    Records the peak memory of a training run in the final training log entry,
+    next to train_runtime and train_steps_per_second: the process's peak
+    resident memory and, on CUDA or MPS, the peak memory allocated on the device.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.peak_device_bytes = 0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        if self.device.type == "cuda":
+            torch.cuda.reset_peak_memory_stats(self.device)
+
+    def on_step_end(self, args, state, control, **kwargs):
+        # MPS only reports the current allocation, so it is sampled after every step
+        if self.device.type == "mps":
+            self.peak_device_bytes = max(self.peak_device_bytes, torch.mps.driver_allocated_memory())
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self.device.type == "cuda":
+            self.peak_device_bytes = torch.cuda.max_memory_allocated(self.device)
+
+        for entry in reversed(state.log_history):
+            if "train_runtime" in entry:
+                entry["train_peak_rss_mb"] = round(peak_rss_mb(), 1)
+                if self.peak_device_bytes:
+                    entry["train_peak_device_memory_mb"] = round(self.peak_device_bytes / (1024 * 1024), 1)
+                break
@@ -0,0 +1,125 @@
+import math
+import os
+
+import faiss
+import numpy as np
+
+# Factory for the FAISS index types used for retrieval
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+
+def suggest_nlist(num_vectors):
+    """
+    Return a number of IVF lists suited to the collection size (about 4 * sqrt(n)),
+    keeping at least 39 training points per list as FAISS recommends.
+    """
+    if num_vectors <= 0:
+        return 1
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39 or 1))
+
+
+def index_factory_string(index_type, num_vectors=None, nlist=None, pq_m=64, pq_bits=8, hnsw_m=32):
+    """
+    Build the faiss.index_factory description for an index type.
+
+    Args:
+        index_type (str): One of 'flat', 'ivf', 'hnsw' or 'ivfpq'.
+        num_vectors (int, optional): Expected collection size, used to pick nlist.
+        nlist (int, optional): Number of IVF lists. Defaults to suggest_nlist(num_vectors).
+        pq_m (int): Number of PQ sub-quantizers; must divide the embedding size.
+        pq_bits (int): Bits per PQ code.
+        hnsw_m (int): Number of HNSW neighbors per node.
+
+    Returns:
+        str: The index factory description, e.g. 'IVF316,Flat'.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+
+    nlist = nlist or suggest_nlist(num_vectors or 0)
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    return f"IVF{nlist},PQ{pq_m}x{pq_bits}"
+
+
+def create_index(dimension, index_type="flat", num_vectors=None, **index_params):
+    """
+    Create an empty FAISS index using L2 distance.
+
+    Args:
+        dimension (int): Size of the embeddings.
+        index_type (str): One of 'flat', 'ivf', 'hnsw' or 'ivfpq'.
+        num_vectors (int, optional): Expected collection size, used to pick nlist.
+        **index_params: Extra options for index_factory_string (nlist, pq_m, pq_bits, hnsw_m).
+
+    Returns:
+        faiss.Index: The new index. IVF types must be trained before vectors are added.
+    """
+    description = index_factory_string(index_type, num_vectors=num_vectors, **index_params)
+    print(f"Creating FAISS index '{description}'...")
+    return faiss.index_factory(dimension, description, faiss.METRIC_L2)
+
+
+def train_index(index, embeddings, sample_size=100000, seed=0):
+    """
+    Train an index on a random sample of embeddings if it needs training.
+
+    Args:
+        index (faiss.Index): The index to train.
+        embeddings (np.ndarray): Candidate training vectors.
+        sample_size (int): Maximum number of vectors used for training.
+        seed (int): Seed for drawing the sample.
+    """
+    if index.is_trained:
+        return
+
+    if len(embeddings) > sample_size:
+        rows = np.random.default_rng(seed).choice(len(embeddings), sample_size, replace=False)
+        embeddings = embeddings[np.sort(rows)]
+
+    print(f"Training FAISS index on {len(embeddings)} vectors...")
+    index.train(np.ascontiguousarray(embeddings, dtype="float32"))
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """
+    Apply search-time parameters. Parameters that do not apply to the index
+    type are ignored, so the same settings can be used for any index.
+
+    Args:
+        index (faiss.Index): The index to configure.
+        nprobe (int, optional): Number of IVF lists visited per query.
+        ef_search (int, optional): Size of the HNSW candidate list per query.
+    """
+    parameters = faiss.ParameterSpace()
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        parameters.set_index_parameter(index, "nprobe", int(nprobe))
+    if ef_search is not None and hasattr(faiss.downcast_index(index), "hnsw"):
+        parameters.set_index_parameter(index, "efSearch", int(ef_search))
+
+
+def index_settings_from_env():
+    """
+    Read the index type and search parameters from the environment
+    (FAISS_INDEX_TYPE, FAISS_NLIST, FAISS_NPROBE, FAISS_EF_SEARCH).
+
+    Returns:
+        Tuple[str, Dict, Dict]: The index type, build options and search options.
+    """
+    index_type = os.environ.get("FAISS_INDEX_TYPE", "flat")
+    index_params = {}
+    if os.environ.get("FAISS_NLIST"):
+        index_params["nlist"] = int(os.environ["FAISS_NLIST"])
+
+    search_params = {}
+    if os.environ.get("FAISS_NPROBE"):
+        search_params["nprobe"] = int(os.environ["FAISS_NPROBE"])
+    if os.environ.get("FAISS_EF_SEARCH"):
+        search_params["ef_search"] = int(os.environ["FAISS_EF_SEARCH"])
+    return index_type, index_params, search_params
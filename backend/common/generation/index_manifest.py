@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+from collections import Counter
+
+from common.cache import fingerprint_paths
+
+# Manifest tracking which dataset examples a FAISS index was built from
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path_for(index_file):
+    return f"{index_file}.manifest.json"
+
+
+def content_hash(example):
+    """
+    Hash a dataset example, so that an edited example is treated as a new one.
+    """
+    return hashlib.sha256(json.dumps(example, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def embedding_model_identity(model, max_length=512):
+    """
+    Describe the embedding model, so that vectors produced by a different model
+    (or a retrained local checkpoint) are never mixed into an existing index.
+
+    Args:
+        model: The pre-trained model used for embeddings.
+        max_length (int): Maximum number of tokens per embedded example.
+
+    Returns:
+        Dict: The model name or path, its architecture, the truncation length
+        and, for local checkpoints, a fingerprint of the weight files.
+    """
+    config = model.config
+    name_or_path = getattr(config, "_name_or_path", "") or ""
+    return {
+        "name_or_path": name_or_path,
+        "model_type": config.model_type,
+        "hidden_size": config.hidden_size,
+        "num_hidden_layers": config.num_hidden_layers,
+        "vocab_size": config.vocab_size,
+        "max_length": max_length,
+        "weights": fingerprint_paths([name_or_path]) if os.path.isdir(name_or_path) else None,
+    }
+
+
+def load_manifest(index_file):
+    """
+    Load the manifest stored next to an index.
+
+    Returns:
+        Dict: The manifest, or None if it is missing, unreadable or from another version.
+    """
+    try:
+        with open(manifest_path_for(index_file), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(index_file, model_identity, index_type, index_params, hashes):
+    """
+    Write the manifest for an index.
+
+    Args:
+        index_file (str): The path of the FAISS index the manifest belongs to.
+        model_identity (Dict): The result of embedding_model_identity.
+        index_type (str): The FAISS index type.
+        index_params (Dict): The build options of the index.
+        hashes (List[str]): The content hash of every indexed example, in index order.
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "embedding_model": model_identity,
+        "index_type": index_type,
+        "index_params": index_params,
+        "hashes": hashes,
+    }
+    path = manifest_path_for(index_file)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, path)
+
+
+def plan_index_update(indexed_hashes, dataset):
+    """
+    Work out how to bring an index up to date with the dataset.
+
+    Duplicate examples are matched one to one, so an index row is kept only
+    while the dataset still has an unmatched copy of that example.
+
+    Args:
+        indexed_hashes (List[str]): The content hashes of the indexed examples, in index order.
+        dataset (Iterable[Dict]): The current dataset, iterated twice, e.g. a list or a DatasetStream.
+
+    Returns:
+        Tuple[List[int], List[Dict]]: The index positions to remove and the
+        dataset examples to embed and append.
+    """
+    dataset_hashes = [content_hash(example) for example in dataset]
+    available = Counter(dataset_hashes)
+
+    removed = []
+    for position, indexed_hash in enumerate(indexed_hashes):
+        if available[indexed_hash] > 0:
+            available[indexed_hash] -= 1
+        else:
+            removed.append(position)
+
+    added = []
+    for example, example_hash in zip(dataset, dataset_hashes):
+        if available[example_hash] > 0:
+            available[example_hash] -= 1
+            added.append(example)
+
+    return removed, added
@@ -0,0 +1,103 @@
+import json
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# HTTP client for a local Ollama-compatible server
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+
+
+def resolve_ollama_host(host=None):
+    """
+    Resolve the server URL from the argument or the OLLAMA_HOST environment
+    variable, which Ollama allows to be given without a scheme.
+    """
+    host = host or os.environ.get("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST
+    if not host.startswith(("http://", "https://")):
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+
+class OllamaClient:
+    """
+    Talks to Ollama's /api/generate endpoint over a pooled, keep-alive HTTP
+    session, so repeated generations reuse connections and the model stays
+    loaded in the server instead of starting a new `ollama run` per request.
+    """
+
+    def __init__(self, model_name, host=None, timeout=300, pool_size=8, options=None):
+        """
+        Args:
+            model_name (str): The model to generate with (e.g. 'llama3.1').
+            host (str, optional): The server URL. Defaults to OLLAMA_HOST or localhost:11434.
+            timeout (float): Read timeout in seconds for a generation.
+            pool_size (int): Maximum number of pooled connections.
+            options (Dict, optional): Sampling options forwarded to the server.
+        """
+        self.model_name = model_name
+        self.host = resolve_ollama_host(host)
+        self.timeout = timeout
+        self.options = options or {}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, prompt, stream):
+        payload = {"model": self.model_name, "prompt": prompt, "stream": stream}
+        if self.options:
+            payload["options"] = self.options
+        return payload
+
+    def generate(self, prompt):
+        """
+        Generate the full completion for a prompt.
+
+        Returns:
+            str: The generated text.
+        """
+        response = self.session.post(f"{self.host}/api/generate", json=self._payload(prompt, False),
+                                     timeout=(5, self.timeout))
+        response.raise_for_status()
+        body = response.json()
+        if "error" in body:
+            raise RuntimeError(f"Ollama server error: {body['error']}")
+        return body.get("response", "")
+
+    def stream(self, prompt):
+        """
+        Stream the completion for a prompt token by token.
+
+        Yields:
+            str: The next chunk of generated text.
+        """
+        with self.session.post(f"{self.host}/api/generate", json=self._payload(prompt, True),
+                               timeout=(5, self.timeout), stream=True) as response:
+            response.raise_for_status()
+            done = False
+            # Read to the end of the body even after the last chunk, since a connection
+            # closed with unread data is dropped from the pool instead of reused
+            for line in response.iter_lines():
+                if not line or done:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(f"Ollama server error: {chunk['error']}")
+                if chunk.get("response"):
+                    yield chunk["response"]
+                done = chunk.get("done", False)
+
+    def is_available(self):
+        """
+        Return True if the server answers on its model listing endpoint.
+        """
+        try:
+            return self.session.get(f"{self.host}/api/tags", timeout=2).ok
+        except requests.RequestException:
+            return False
+
+    def close(self):
+        self.session.close()
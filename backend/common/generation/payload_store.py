@@ -0,0 +1,156 @@
+import argparse
+import array
+import json
+import mmap
+import os
+import pickle
+import shutil
+import struct
+
+import numpy as np
+
+# Memory-mapped store for the examples returned by retrieval
+
+MAGIC = b"RAGPAYL1"
+# Magic bytes followed by the number of records
+HEADER = struct.Struct("<8sQ")
+
+
+def write_payload_store(examples, file_path):
+    """
+    Write examples to a payload store file.
+
+    The file holds a header, an offset table of n + 1 int64 values and the
+    examples as concatenated UTF-8 JSON records, so record i can be read from
+    the bytes between offsets i and i + 1 without parsing anything else. The
+    file is written next to the target and renamed into place, so processes
+    that still map the old file keep reading a consistent copy.
+
+    Args:
+        examples (Iterable[Dict]): The examples, in index order.
+        file_path (str): The path of the store file.
+    """
+    print(f"Saving indexed dataset to {file_path}...")
+    temp_path = f"{file_path}.{os.getpid()}.tmp"
+
+    # The records are streamed to a spool file first, since the offset table that precedes them needs their sizes
+    records_path = f"{temp_path}.records"
+    offsets = array.array("q", [0])
+    with open(records_path, 'wb') as records:
+        for example in examples:
+            record = json.dumps(example, ensure_ascii=False).encode("utf-8")
+            records.write(record)
+            offsets.append(offsets[-1] + len(record))
+
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(offsets) - 1))
+        f.write(np.asarray(offsets, dtype="<i8").tobytes())
+        with open(records_path, 'rb') as records:
+            shutil.copyfileobj(records, f, 1 << 20)
+    os.remove(records_path)
+    os.replace(temp_path, file_path)
+    print("Indexed dataset saved.")
+
+
+class PayloadStore:
+    """
+    Read-only, memory-mapped view of a payload store file.
+
+    Opening a store only maps the file, so startup time does not depend on the
+    number of examples. Records are decoded when they are accessed by row id,
+    and the operating system shares the mapped pages between every process
+    that opens the same file, including forked Flask or gunicorn workers.
+
+    Supports len(), indexing by row id and iteration, like the list of
+    examples it replaces.
+    """
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): The path of a file written by write_payload_store.
+        """
+        self.file_path = file_path
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{file_path} is not a payload store")
+            # The mapping stays valid after the file is closed (or replaced on disk)
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{file_path} is not a payload store")
+
+        self._count = count
+        self._offsets = np.frombuffer(self._buffer, dtype="<i8", count=count + 1, offset=HEADER.size)
+        self._data_start = HEADER.size + self._offsets.nbytes
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self._count))]
+
+        row = int(row)
+        if row < 0:
+            row += self._count
+        if not 0 <= row < self._count:
+            raise IndexError(f"Row {row} is out of range for a store of {self._count} examples")
+
+        start = self._data_start + int(self._offsets[row])
+        end = self._data_start + int(self._offsets[row + 1])
+        return json.loads(self._buffer[start:end].decode("utf-8"))
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield self[row]
+
+
+def load_payload_store(file_path):
+    """
+    Open a payload store for lazy reads.
+
+    Args:
+        file_path (str): The path of the store file.
+
+    Returns:
+        PayloadStore: The memory-mapped store.
+    """
+    print(f"Loading indexed dataset from {file_path}...")
+    store = PayloadStore(file_path)
+    print(f"Indexed dataset loaded ({len(store)} examples, memory-mapped).")
+    return store
+
+
+def convert_pickle_to_store(pickle_file, file_path):
+    """
+    One-time conversion of a pickled list of examples to a payload store.
+
+    Args:
+        pickle_file (str): The path of the pickled indexed dataset.
+        file_path (str): The path of the store file to write.
+
+    Returns:
+        int: The number of converted examples.
+    """
+    print(f"Converting {pickle_file} to a payload store...")
+    with open(pickle_file, 'rb') as f:
+        examples = pickle.load(f)
+    write_payload_store(examples, file_path)
+    return len(examples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a pickled indexed dataset to a memory-mapped payload store.")
+    parser.add_argument("pickle_file", help="The pickled indexed dataset, e.g. indexed_data.pkl.")
+    parser.add_argument("store_file", nargs="?", help="The store to write. Defaults to the pickle path with a .store suffix.")
+    args = parser.parse_args()
+
+    store_file = args.store_file or os.path.splitext(args.pickle_file)[0] + ".store"
+    count = convert_pickle_to_store(args.pickle_file, store_file)
+    print(f"Converted {count} examples to {store_file}")
+
+
+if __name__ == '__main__':
+    main()
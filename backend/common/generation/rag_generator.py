@@ -1,9 +1,21 @@
+import contextlib
+import itertools
 import torch
 import faiss
 import subprocess
 import os
 import pickle
+import time
+import multiprocessing
+import numpy as np
+import re
+import requests
 from transformers import AutoTokenizer, AutoModel
+from common.generation.index_factory import create_index, set_search_params, train_index
+from common.generation.index_manifest import content_hash, embedding_model_identity, load_manifest, plan_index_update, save_manifest
+from common.generation.payload_store import convert_pickle_to_store, load_payload_store, write_payload_store
+from common.inference_config import inference_context
+from common.telemetry import ERRORS, span
 
 # RAG Generator utility functions
 
@@ -16,7 +28,10 @@ def save_faiss_index(index, file_path):
         file_path (str): The path where the index should be saved.
     """
     print(f"Saving FAISS index to {file_path}...")
-    faiss.write_index(index, file_path)
+    # Written next to the target and renamed into place, so a reader never sees a partly written index
+    temp_path = f"{file_path}.{os.getpid()}.tmp"
+    faiss.write_index(index, temp_path)
+    os.replace(temp_path, file_path)
     print("FAISS index saved.")
 
 def load_faiss_index(file_path):
@@ -38,13 +53,20 @@ def save_indexed_data(data, file_path):
     """
     Save indexed data (dataset) to disk.
 
+    Data is written to a memory-mapped payload store, unless the path ends in
+    '.pkl', in which case the whole list is pickled as before.
+
     Args:
-        data (List[Dict]): The indexed dataset.
+        data (Iterable[Dict]): The indexed dataset.
         file_path (str): The path where the indexed data should be saved.
     """
+    if not file_path.endswith(".pkl"):
+        write_payload_store(data, file_path)
+        return
+
     print(f"Saving indexed dataset to {file_path}...")
     with open(file_path, 'wb') as f:
-        pickle.dump(data, f)
+        pickle.dump(list(data), f)
     print("Indexed dataset saved.")
 
 def load_indexed_data(file_path):
@@ -55,57 +77,335 @@ def load_indexed_data(file_path):
         file_path (str): The path to the indexed dataset file.
 
     Returns:
-        List[Dict]: The loaded indexed dataset.
+        PayloadStore: The memory-mapped indexed dataset, read lazily by row id.
+        Pickled ('.pkl') datasets are loaded fully into a list.
     """
+    if not file_path.endswith(".pkl"):
+        return load_payload_store(file_path)
+
     print(f"Loading indexed dataset from {file_path}...")
     with open(file_path, 'rb') as f:
         data = pickle.load(f)
     print("Indexed dataset loaded.")
     return data
 
-def build_faiss_index(dataset, model, tokenizer, index_file="faiss_index.bin", data_file="indexed_data.pkl"):
+def embed_texts(texts, model, tokenizer, batch_size=32, max_length=512):
+    """
+    Generate CLS embeddings for a list of texts in length-bucketed batches.
+
+    The texts are sorted by token length so that every batch only pads to its own
+    longest member, then the embeddings are written back in the original order.
+
+    Args:
+        texts (List[str]): The texts to embed.
+        model: The pre-trained model for generating embeddings.
+        tokenizer: The tokenizer paired with the model.
+        batch_size (int): Number of texts per forward pass.
+        max_length (int): Maximum number of tokens per text.
+
+    Returns:
+        np.ndarray: A float32 array of shape (len(texts), hidden_size).
+    """
+    embeddings = np.empty((len(texts), model.config.hidden_size), dtype="float32")
+    if not texts:
+        return embeddings
+
+    # Bucket by length so that similar-sized inputs share a batch
+    lengths = [len(ids) for ids in tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]]
+    order = np.argsort(lengths, kind="stable")
+
+    for start in range(0, len(texts), batch_size):
+        batch_ids = order[start:start + batch_size]
+        inputs = tokenizer([texts[i] for i in batch_ids], return_tensors="pt", padding=True, truncation=True, max_length=max_length).to(model.device)
+        with inference_context():
+            embeddings[batch_ids] = model(**inputs).last_hidden_state[:, 0, :].cpu().numpy()  # CLS token embedding
+
+    return embeddings
+
+
+# Embedding model and settings for the worker processes, set by _init_embedding_worker
+_worker_state = {}
+
+
+def _init_embedding_worker(model, tokenizer, batch_size, max_length, num_threads):
+    torch.set_num_threads(num_threads)
+    _worker_state.update(model=model, tokenizer=tokenizer, batch_size=batch_size, max_length=max_length)
+
+
+def _embed_shard(texts):
+    """
+    Embed one shard of texts in a worker process and return it as a serialized
+    partial IndexFlatL2, ready to be merged by the parent process.
+    """
+    embeddings = embed_texts(texts, _worker_state["model"], _worker_state["tokenizer"],
+                             batch_size=_worker_state["batch_size"], max_length=_worker_state["max_length"])
+    partial_index = faiss.IndexFlatL2(embeddings.shape[1])
+    partial_index.add(embeddings)
+    return faiss.serialize_index(partial_index)
+
+
+def partial_index_vectors(partial_index):
+    """
+    Return the vectors stored in a partial IndexFlatL2, in insertion order.
+
+    Args:
+        partial_index (faiss.IndexFlatL2): The shard to read.
+
+    Returns:
+        np.ndarray: A float32 array of shape (ntotal, dimension).
+    """
+    if partial_index.ntotal == 0:
+        return np.empty((0, partial_index.d), dtype="float32")
+    return partial_index.reconstruct_n(0, partial_index.ntotal)
+
+
+def add_texts_to_index(index, texts, model, tokenizer, batch_size=32, max_length=512, shard_size=1024,
+                       num_workers=1, train_sample_size=100000):
+    """
+    Embed texts and append them to a FAISS index, streaming in shards.
+
+    Each shard is embedded in length-bucketed batches and added to the index in
+    bulk. With `num_workers` > 1 the shards are embedded by a pool of CPU worker
+    processes and their partial indexes are merged in order. An index that still
+    needs training is trained on the first `train_sample_size` embeddings before
+    the rest are streamed in.
+
+    Args:
+        index (faiss.Index): The index to add to.
+        texts (Iterable[str]): The texts to embed, in the order they should be added.
+            A generator is consumed one shard at a time.
+        model: The pre-trained model for generating embeddings.
+        tokenizer: The tokenizer paired with the model.
+        batch_size (int): Number of examples per forward pass.
+        max_length (int): Maximum number of tokens per example.
+        shard_size (int): Number of examples embedded and added to the index at a time.
+        num_workers (int): Number of worker processes used for embedding. When
+            greater than 1 the caller must be guarded by `if __name__ == '__main__'`.
+        train_sample_size (int): Number of embeddings used to train IVF indexes.
+    """
+    texts_iter = iter(texts)
+    shards = iter(lambda: list(itertools.islice(texts_iter, shard_size)), [])
+    total = f"/{len(texts)}" if hasattr(texts, "__len__") else ""
+
+    start_time = time.perf_counter()
+    embedded = 0
+    # Embeddings held back until there are enough to train the index
+    pending = []
+
+    def flush_pending():
+        if pending:
+            sample = np.concatenate(pending)
+            train_index(index, sample, sample_size=train_sample_size)
+            index.add(sample)
+            pending.clear()
+
+    def add_embeddings(embeddings):
+        nonlocal embedded
+        if index.is_trained:
+            index.add(embeddings)
+        else:
+            pending.append(embeddings)
+            if sum(len(chunk) for chunk in pending) >= train_sample_size:
+                flush_pending()
+
+        embedded += len(embeddings)
+        elapsed = time.perf_counter() - start_time
+        print(f"Embedded {embedded}{total} examples ({embedded / max(elapsed, 1e-9):.1f} examples/s)")
+
+    if num_workers > 1:
+        num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        with multiprocessing.Pool(num_workers, initializer=_init_embedding_worker,
+                                  initargs=(model, tokenizer, batch_size, max_length, num_threads)) as pool:
+            # imap would read every shard up front, so the shards are handed out a few per worker at a time
+            while True:
+                window = list(itertools.islice(shards, num_workers * 2))
+                if not window:
+                    break
+                # imap keeps the shards in dataset order, so the merged index matches a sequential build
+                for serialized in pool.imap(_embed_shard, window):
+                    add_embeddings(partial_index_vectors(faiss.deserialize_index(serialized)))
+    else:
+        for shard in shards:
+            add_embeddings(embed_texts(shard, model, tokenizer, batch_size=batch_size, max_length=max_length))
+
+    flush_pending()
+
+
+def update_faiss_index(index, indexed_data, indexed_hashes, dataset, model, tokenizer, index_type="flat", **embedding_options):
+    """
+    Bring an existing index up to date with the dataset: examples that are no
+    longer in the dataset are removed and new ones are embedded and appended.
+
+    Args:
+        index (faiss.Index): The loaded FAISS index.
+        indexed_data (Sequence[Dict]): The indexed examples, in index order.
+        indexed_hashes (List[str]): Their content hashes, from the manifest.
+        dataset (Iterable[Dict]): The current dataset, iterated twice (a list or a DatasetStream).
+        model: The pre-trained model for generating embeddings.
+        tokenizer: The tokenizer paired with the model.
+        index_type (str): The FAISS index type.
+        **embedding_options: Options passed to add_texts_to_index.
+
+    Returns:
+        Tuple[Iterable[Dict], List[str], bool]: The updated indexed data, streamed
+        from the old data for saving, and hashes,
+        and whether anything changed. Returns None if removals are needed on an
+        index type that cannot renumber its rows, in which case it must be rebuilt.
+    """
+    removed, added = plan_index_update(indexed_hashes, dataset)
+    if not removed and not added:
+        return indexed_data, indexed_hashes, False
+
+    if removed:
+        # Only the flat index compacts its ids after removal, keeping rows aligned with indexed_data
+        if index_type != "flat":
+            return None
+        print(f"Removing {len(removed)} deleted examples from the FAISS index...")
+        index.remove_ids(np.array(removed, dtype="int64"))
+        removed_positions = set(removed)
+        indexed_data = (example for position, example in enumerate(indexed_data) if position not in removed_positions)
+        indexed_hashes = [value for position, value in enumerate(indexed_hashes) if position not in removed_positions]
+
+    if added:
+        print(f"Adding {len(added)} new examples to the FAISS index...")
+        add_texts_to_index(index, [example['input'] for example in added], model, tokenizer, **embedding_options)
+        indexed_data = itertools.chain(indexed_data, added)
+        indexed_hashes = indexed_hashes + [content_hash(example) for example in added]
+
+    return indexed_data, indexed_hashes, True
+
+
+@contextlib.contextmanager
+def index_lock(index_file):
+    """
+    Hold an exclusive lock on an index while it is synced, so that processes
+    sharing the index files, such as gunicorn workers that all notice the same
+    dataset change, update them one at a time. The others then find the index
+    up to date and only load it.
     """
-    Build or load a FAISS index for efficient retrieval of similar examples.
+    try:
+        import fcntl
+    except ImportError:
+        # No advisory file locks on Windows, where the apps only run single-process
+        yield
+        return
+
+    with open(f"{index_file}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def build_faiss_index(dataset, model, tokenizer, index_file="faiss_index.bin", data_file="indexed_data.store",
+                      batch_size=32, max_length=512, shard_size=1024, num_workers=1,
+                      index_type="flat", index_params=None, train_sample_size=100000, search_params=None):
+    """
+    Build, load or incrementally update a FAISS index for efficient retrieval of similar examples.
+
+    A manifest next to the index records the embedding model and the content
+    hash of every indexed example. When an index is loaded it is synced with
+    the dataset: only new examples are embedded and deleted ones are removed.
+    The index is rebuilt from scratch when the embedding model or index type
+    changes (or, for non-flat indexes, when examples were deleted).
+
+    The indexed examples are kept in a memory-mapped payload store, so worker
+    processes share them instead of each unpickling its own copy. An existing
+    pickle with the same base name ('indexed_data.pkl') is converted once.
+
+    A new index is built by streaming the dataset through add_texts_to_index,
+    so a flat index holds the same vectors (up to floating point noise from
+    padding), in the same order, as embedding the examples one at a time.
+
+    The dataset is read in several passes (hashing, embedding, saving) and
+    never held in memory as a whole, so a DatasetStream over a dataset larger
+    than RAM can be indexed.
 
     Args:
-        dataset (List[Dict]): The dataset with input examples.
+        dataset (Iterable[Dict]): The dataset with input examples: a list, or a
+            DatasetStream that reads it from disk on every pass.
         model: The pre-trained model for generating embeddings.
         tokenizer: The tokenizer paired with the model.
         index_file (str): The path where the FAISS index will be saved/loaded.
         data_file (str): The path where the indexed dataset will be saved/loaded.
+            Paths ending in '.pkl' keep using a pickled list.
+        batch_size (int): Number of examples per forward pass.
+        max_length (int): Maximum number of tokens per example.
+        shard_size (int): Number of examples embedded and added to the index at a time.
+        num_workers (int): Number of worker processes used for embedding. When
+            greater than 1 the caller must be guarded by `if __name__ == '__main__'`.
+        index_type (str): One of 'flat', 'ivf', 'hnsw' or 'ivfpq'.
+        index_params (Dict, optional): Build options for the index type (nlist, pq_m, pq_bits, hnsw_m).
+        train_sample_size (int): Number of embeddings used to train IVF indexes.
+        search_params (Dict, optional): Search-time options (nprobe, ef_search).
 
     Returns:
-        faiss.IndexFlatL2: The FAISS index.
-        indexed_data (List[Dict]): The original dataset, ordered as in the FAISS index.
+        faiss.Index: The FAISS index.
+        indexed_data (Sequence[Dict]): The original dataset, ordered as in the FAISS index.
     """
+    with index_lock(index_file):
+        return _sync_faiss_index(dataset, model, tokenizer, index_file, data_file, batch_size, max_length, shard_size,
+                                 num_workers, index_type, index_params, train_sample_size, search_params)
+
+
+def _sync_faiss_index(dataset, model, tokenizer, index_file, data_file, batch_size, max_length, shard_size,
+                      num_workers, index_type, index_params, train_sample_size, search_params):
+    index_params = index_params or {}
+    model_identity = embedding_model_identity(model, max_length)
+    embedding_options = dict(batch_size=batch_size, max_length=max_length, shard_size=shard_size,
+                             num_workers=num_workers, train_sample_size=train_sample_size)
+
+    # Convert the indexed dataset from the old pickle format once
+    legacy_data_file = os.path.splitext(data_file)[0] + ".pkl"
+    if not data_file.endswith(".pkl") and not os.path.exists(data_file) and os.path.exists(legacy_data_file):
+        convert_pickle_to_store(legacy_data_file, data_file)
+
     # Check if the FAISS index and dataset already exist
     if os.path.exists(index_file) and os.path.exists(data_file):
+        manifest = load_manifest(index_file)
         index = load_faiss_index(index_file)
         indexed_data = load_indexed_data(data_file)
-        print("Loaded existing FAISS index and dataset.")
-        return index, indexed_data
+
+        if manifest is None:
+            # Indexes built before manifests existed are assumed to match the current model
+            print("No index manifest found, adopting the existing FAISS index.")
+            manifest = {"embedding_model": model_identity, "index_type": index_type, "index_params": index_params,
+                        "hashes": [content_hash(example) for example in indexed_data]}
+            save_manifest(index_file, model_identity, index_type, index_params, manifest["hashes"])
+
+        if (manifest["embedding_model"] == model_identity and manifest["index_type"] == index_type
+                and manifest["index_params"] == index_params and len(manifest["hashes"]) == index.ntotal):
+            update = update_faiss_index(index, indexed_data, manifest["hashes"], dataset, model, tokenizer,
+                                        index_type=index_type, **embedding_options)
+            if update is not None:
+                indexed_data, indexed_hashes, changed = update
+                if changed:
+                    save_faiss_index(index, index_file)
+                    save_indexed_data(indexed_data, data_file)
+                    save_manifest(index_file, model_identity, index_type, index_params, indexed_hashes)
+                    indexed_data = load_indexed_data(data_file)
+                set_search_params(index, **(search_params or {}))
+                print("Loaded existing FAISS index and dataset.")
+                return index, indexed_data
+            print(f"Deleted examples cannot be removed from a '{index_type}' index, rebuilding...")
+        else:
+            print("The FAISS index is out of date with the embedding model or index settings, rebuilding...")
 
     # Otherwise, build a new FAISS index
     print("Building FAISS index...")
-    index = faiss.IndexFlatL2(768)  # Assuming model embeddings are 768-dimensional
-    indexed_data = []
-
-    for example in dataset:
-        input_text = example['input']
-        # Tokenize and create embeddings
-        inputs = tokenizer(input_text, return_tensors="pt", padding=True, truncation=True, max_length=512)
-        with torch.no_grad():
-            embeddings = model(**inputs).last_hidden_state[:, 0, :].cpu().numpy()  # CLS token embedding
-        index.add(embeddings)
-        indexed_data.append(example)
-
-    print(f"FAISS index built with {len(indexed_data)} examples.")
+    indexed_hashes = [content_hash(example) for example in dataset]
+    index = create_index(model.config.hidden_size, index_type, num_vectors=len(indexed_hashes), **index_params)
+    add_texts_to_index(index, (example['input'] for example in dataset), model, tokenizer, **embedding_options)
+    set_search_params(index, **(search_params or {}))
+    print(f"FAISS index built with {len(indexed_hashes)} examples.")
     
     # Save the FAISS index and indexed dataset to disk for future use
     save_faiss_index(index, index_file)
-    save_indexed_data(indexed_data, data_file)
+    save_indexed_data(dataset, data_file)
+    save_manifest(index_file, model_identity, index_type, index_params, indexed_hashes)
 
-    return index, indexed_data
+    return index, load_indexed_data(data_file)
 
 
 def setup_llama():
@@ -120,7 +420,25 @@ def setup_llama():
     return model_name
 
 
-def retrieve_relevant_cases(test_case, model, tokenizer, faiss_index, indexed_data, k=5):
+def embed_query(test_case, model, tokenizer):
+    """
+    Generate the CLS embedding used to query the FAISS index for a test case.
+
+    Args:
+        test_case (str): The input test case.
+        model: The pre-trained model for generating embeddings.
+        tokenizer: The tokenizer paired with the model.
+
+    Returns:
+        np.ndarray: A float32 array of shape (1, hidden_size).
+    """
+    with span("embedding"):
+        inputs = tokenizer(test_case, return_tensors="pt", padding=True, truncation=True, max_length=512).to(model.device)
+        with inference_context():
+            return model(**inputs).last_hidden_state[:, 0, :].cpu().numpy()
+
+
+def retrieve_relevant_cases(test_case, model, tokenizer, faiss_index, indexed_data, k=5, query_embedding=None):
     """
     Retrieve the top k relevant examples from the FAISS index based on the test case.
 
@@ -129,8 +447,9 @@ def retrieve_relevant_cases(test_case, model, tokenizer, faiss_index, indexed_da
         model: The pre-trained model for generating embeddings.
         tokenizer: The tokenizer paired with the model.
         faiss_index (faiss.IndexFlatL2): The FAISS index containing dataset embeddings.
-        indexed_data (List[Dict]): The original dataset entries.
+        indexed_data (Sequence[Dict]): The original dataset entries, indexable by row id.
         k (int): Number of relevant examples to retrieve.
+        query_embedding (np.ndarray, optional): A precomputed embedding of the test case.
 
     Returns:
         List[Dict]: The top k retrieved examples from the dataset.
@@ -138,15 +457,16 @@ def retrieve_relevant_cases(test_case, model, tokenizer, faiss_index, indexed_da
     print("Retrieving relevant cases...")
     
     # Get the embedding for the test case
-    inputs = tokenizer(test_case, return_tensors="pt", padding=True, truncation=True, max_length=512)
-    with torch.no_grad():
-        query_embedding = model(**inputs).last_hidden_state[:, 0, :].cpu().numpy()
+    if query_embedding is None:
+        query_embedding = embed_query(test_case, model, tokenizer)
 
     # Search FAISS index for nearest neighbors
-    distances, indices = faiss_index.search(query_embedding, k)
+    with span("retrieval"):
+        distances, indices = faiss_index.search(query_embedding, k)
 
-    # Retrieve the corresponding examples from the indexed data
-    retrieved_examples = [indexed_data[i] for i in indices[0]]
+    # Retrieve the corresponding examples from the indexed data, skipping the -1 ids
+    # approximate indexes return when they find fewer than k neighbors
+    retrieved_examples = [indexed_data[i] for i in indices[0] if i >= 0]
     
     print(f"Retrieved {len(retrieved_examples)} relevant cases.")
     return retrieved_examples
@@ -156,7 +476,8 @@ def create_prompt(retrieved_examples, test_case, fix_category):
     """
     Create a concise prompt for Ollama to focus only on generating the necessary fix without unnecessary details.
     """
-    prompt = f"""You are an expert code repair assistant specializing in fixing flaky async/await tests. 
+    with span("prompt"):
+        prompt = f"""You are an expert code repair assistant specializing in fixing flaky async/await tests. 
     Please apply the {fix_category} method to resolve the issue in the provided test case: {test_case}. 
     Make the fixed version of the flaky test similar to the fixed version of {retrieved_examples} but not very smilar please. 
     Follow this format in your response: 
@@ -172,9 +493,41 @@ def create_prompt(retrieved_examples, test_case, fix_category):
     return prompt
 
 
-def generate_fix(model_name, prompt):
+def generate_fix(model_name, prompt, llm_client=None):
+    """
+    Generate a fix using the Ollama model.
+
+    When an HTTP client is given the fix is generated through the Ollama server,
+    falling back to the Ollama CLI if the server cannot be reached or answers
+    with an HTTP error (e.g. 404 when the model has not been pulled into it).
+
+    Args:
+        model_name (str): The name of the model to run.
+        prompt (str): The input prompt for the model.
+        llm_client (OllamaClient, optional): Pooled HTTP client for the Ollama server.
+
+    Returns:
+        str: The generated output from the model.
     """
-    Generate a fix using the Ollama model by passing the prompt via stdin.
+    with span("generation"):
+        if llm_client is not None:
+            try:
+                print("Generating fix with the Ollama server...")
+                return llm_client.generate(prompt).strip()
+            except (requests.ConnectionError, requests.HTTPError) as e:
+                ERRORS.labels("llm_server").inc()
+                print(f"Ollama server request failed, falling back to the CLI: {e}")
+            except Exception as e:
+                ERRORS.labels("generation").inc()
+                print(f"Error during fix generation: {e}")
+                return f"Failed to generate fix: {str(e)}"
+
+        return generate_fix_cli(model_name, prompt)
+
+
+def generate_fix_cli(model_name, prompt):
+    """
+    Generate a fix using the Ollama CLI by passing the prompt via stdin.
 
     Args:
         model_name (str): The name of the model to run.
@@ -201,11 +554,47 @@ def generate_fix(model_name, prompt):
         return result.stdout.strip()
 
     except Exception as e:
+        ERRORS.labels("generation").inc()
         print(f"Error during fix generation: {e}")
         return f"Failed to generate fix: {str(e)}"
 
 
-def rag_generate_solution(test_case, fix_category, model, tokenizer, faiss_index, indexed_data, llama_model):
+def stream_fix(model_name, prompt, llm_client=None):
+    """
+    Stream a fix from the Ollama server as it is generated.
+
+    Without a client, or if the server cannot be reached or answers with an
+    HTTP error before the first token, the fix is generated through the CLI and
+    yielded as a single chunk.
+
+    Args:
+        model_name (str): The name of the model to run.
+        prompt (str): The input prompt for the model.
+        llm_client (OllamaClient, optional): Pooled HTTP client for the Ollama server.
+
+    Yields:
+        str: The next chunk of the generated fix.
+    """
+    # The span includes the time the caller spends sending each chunk on
+    with span("generation"):
+        if llm_client is not None:
+            started = False
+            try:
+                print("Streaming fix from the Ollama server...")
+                for token in llm_client.stream(prompt):
+                    started = True
+                    yield token
+                return
+            except (requests.ConnectionError, requests.HTTPError) as e:
+                if started:
+                    raise
+                ERRORS.labels("llm_server").inc()
+                print(f"Ollama server request failed, falling back to the CLI: {e}")
+
+        yield generate_fix_cli(model_name, prompt)
+
+
+def rag_generate_solution(test_case, fix_category, model, tokenizer, faiss_index, indexed_data, llama_model, llm_client=None, query_embedding=None):
     """
     Run the full RAG pipeline to generate a fix for the test case.
     
@@ -214,8 +603,10 @@ def rag_generate_solution(test_case, fix_category, model, tokenizer, faiss_index
         model: The pre-trained model for generating embeddings.
         tokenizer: The tokenizer paired with the model.
         faiss_index (faiss.IndexFlatL2): The FAISS index containing dataset embeddings.
-        indexed_data (List[Dict]): The original dataset entries.
+        indexed_data (Sequence[Dict]): The original dataset entries.
         llama_model: The name of the LLaMA model (used by the Ollama CLI).
+        llm_client (OllamaClient, optional): Pooled HTTP client for the Ollama server.
+        query_embedding (np.ndarray, optional): A precomputed embedding of the test case.
 
     Returns:
         str: The generated fix for the input test case.
@@ -223,7 +614,7 @@ def rag_generate_solution(test_case, fix_category, model, tokenizer, faiss_index
     print(f"Generating fix for the test case: {test_case}")
 
     # Step 1: Retrieve relevant cases
-    retrieved_examples = retrieve_relevant_cases(test_case, model, tokenizer, faiss_index, indexed_data)
+    retrieved_examples = retrieve_relevant_cases(test_case, model, tokenizer, faiss_index, indexed_data, query_embedding=query_embedding)
 
     if not retrieved_examples:
         print("No relevant examples retrieved. Aborting fix generation.")
@@ -234,9 +625,67 @@ def rag_generate_solution(test_case, fix_category, model, tokenizer, faiss_index
     
     # Step 3: Generate the fix using LLaMA
     try:
-        generated_fix = generate_fix(llama_model, prompt)
+        generated_fix = generate_fix(llama_model, prompt, llm_client)
     except Exception as e:
         print(f"Error during fix generation: {e}")
         return f"Failed to generate fix: {str(e)}"
     
-    return generated_fix
\ No newline at end of file
+    return generated_fix
+
+def rag_stream_solution(test_case, fix_category, model, tokenizer, faiss_index, indexed_data, llama_model, llm_client=None, query_embedding=None):
+    """
+    Run the RAG pipeline and stream the generated fix token by token.
+
+    Args:
+        test_case (str): The input test case to fix.
+        fix_category (str): The predicted fix category.
+        model: The pre-trained model for generating embeddings.
+        tokenizer: The tokenizer paired with the model.
+        faiss_index (faiss.IndexFlatL2): The FAISS index containing dataset embeddings.
+        indexed_data (Sequence[Dict]): The original dataset entries.
+        llama_model: The name of the LLaMA model (used by the Ollama CLI).
+        llm_client (OllamaClient, optional): Pooled HTTP client for the Ollama server.
+        query_embedding (np.ndarray, optional): A precomputed embedding of the test case.
+
+    Yields:
+        str: The next chunk of the generated fix.
+    """
+    print(f"Streaming fix for the test case: {test_case}")
+
+    retrieved_examples = retrieve_relevant_cases(test_case, model, tokenizer, faiss_index, indexed_data, query_embedding=query_embedding)
+
+    if not retrieved_examples:
+        print("No relevant examples retrieved. Aborting fix generation.")
+        yield "No fix could be generated due to lack of relevant examples."
+        return
+
+    prompt = create_prompt(retrieved_examples, test_case, fix_category)
+
+    yield from stream_fix(llama_model, prompt, llm_client)
+
+
+def is_failed_fix(generated_fix):
+    """
+    Return True if the RAG pipeline reported a failure instead of a fix.
+    """
+    return generated_fix.startswith(("Failed to generate fix", "No fix could be generated"))
+
+
+def extract_predicted_code(generated_fix):
+    """
+    Extract the fixed test case from the first fenced code block of a generated fix.
+
+    Args:
+        generated_fix (str): The raw output of the LLM.
+
+    Returns:
+        str: The code inside the first code block, or an empty string if there is none.
+    """
+    predicted_code = re.findall(r"```(.*?)```", generated_fix, re.DOTALL)
+
+    if predicted_code:
+        predicted_code = predicted_code[0].strip()  # Take the first block and strip whitespace
+    else:
+        predicted_code = ""  # Handle case where no code block is found
+
+    return predicted_code.replace('javascript', '')
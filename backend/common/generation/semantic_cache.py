@@ -0,0 +1,171 @@
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from common.generation.rag_generator import embed_query, is_failed_fix, rag_generate_solution
+from common.telemetry import CACHE_LOOKUPS, span
+
+# Semantic cache of generated fixes, keyed by query embeddings
+
+# Minimum cosine similarity for a hit; benchmarks/semantic_cache_threshold.py calibrates it on a dataset
+DEFAULT_THRESHOLD = 0.97
+
+
+def normalize(embeddings):
+    # Unit-length copies, so inner products are cosine similarities whatever the scale of the encoder's output
+    vectors = np.array(embeddings, dtype="float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class SemanticCache:
+    """
+    Reuses generated fixes for near-duplicate test cases.
+
+    Every answered query is stored with its normalized embedding in a FAISS
+    inner product index. A new query whose most similar previously answered
+    query (with the same fix category) has a cosine similarity of at least
+    `threshold` gets that stored fix back, so the LLM call can be skipped.
+    Entries expire after `ttl_seconds`, and `clear()` drops them all when the
+    model or index they were generated with is reloaded.
+    """
+
+    def __init__(self, dimension=768, threshold=DEFAULT_THRESHOLD, ttl_seconds=3600, max_entries=10000, candidates=8):
+        """
+        Args:
+            dimension (int): Size of the query embeddings.
+            threshold (float): Minimum cosine similarity for a hit.
+            ttl_seconds (float): How long a stored fix can be reused.
+            max_entries (int): Maximum number of stored fixes; the oldest are evicted first.
+            candidates (int): Number of nearest neighbors checked for a matching category.
+        """
+        self.dimension = dimension
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.candidates = candidates
+
+        self._lock = threading.Lock()
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self._entries = {}
+        self._next_id = 0
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _remove(self, ids):
+        if ids:
+            self._index.remove_ids(np.array(ids, dtype="int64"))
+            for entry_id in ids:
+                del self._entries[entry_id]
+
+    def _prune(self):
+        now = time.time()
+        self._remove([entry_id for entry_id, entry in self._entries.items()
+                      if now - entry["created_at"] > self.ttl_seconds])
+
+        # Entries are inserted in time order, so the first ids are the oldest
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            self._remove(sorted(self._entries)[:overflow])
+
+    def _count(self, outcome):
+        self._stats[outcome] += 1
+        CACHE_LOOKUPS.labels("semantic", "fix", outcome).inc()
+
+    def lookup(self, query_embedding, fix_category=None):
+        """
+        Find a stored fix for a query embedding.
+
+        Args:
+            query_embedding (np.ndarray): Array of shape (1, dimension).
+            fix_category (str, optional): Only entries with this category can match.
+
+        Returns:
+            Tuple[Dict, float]: The matching entry (None on a miss) and the cosine
+            similarity of the nearest candidate (None if the cache is empty).
+        """
+        with self._lock:
+            self._prune()
+            if self._index.ntotal == 0:
+                self._count("misses")
+                return None, None
+
+            similarities, ids = self._index.search(normalize(query_embedding), min(self.candidates, self._index.ntotal))
+            nearest = float(similarities[0][0])
+
+            for similarity, entry_id in zip(similarities[0], ids[0]):
+                if entry_id < 0 or similarity < self.threshold:
+                    break
+                entry = self._entries[int(entry_id)]
+                if fix_category is None or entry["fix_category"] == fix_category:
+                    self._count("hits")
+                    return dict(entry), float(similarity)
+
+            self._count("misses")
+            return None, nearest
+
+    def add(self, query_embedding, fix, fix_category, test_case=None):
+        """
+        Store a generated fix for a query embedding.
+        """
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(normalize(query_embedding), np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = {
+                "fix": fix,
+                "fix_category": fix_category,
+                "test_case": test_case,
+                "created_at": time.time(),
+            }
+            self._prune()
+
+    def clear(self):
+        """
+        Drop every stored fix, e.g. after the model or RAG index is reloaded.
+        """
+        with self._lock:
+            self._index.reset()
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return hit and miss counters and the number of stored fixes.
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), threshold=self.threshold, ttl_seconds=self.ttl_seconds)
+
+
+def generate_with_semantic_cache(test_case, fix_category, rag, semantic_cache, query_embedding=None):
+    """
+    Generate a fix through the RAG pipeline, reusing the fix of a near-duplicate
+    query from the semantic cache when there is one.
+
+    Args:
+        test_case (str): The input test case to fix.
+        fix_category (str): The predicted fix category.
+        rag (RagResources): Warm RAG resources.
+        semantic_cache (SemanticCache): Cache of previously generated fixes.
+        query_embedding (np.ndarray, optional): A precomputed embedding of the test case.
+
+    Returns:
+        Tuple[str, Dict]: The generated fix and the cache outcome, with whether it
+        was a hit and the cosine similarity of the nearest stored query.
+    """
+    if query_embedding is None:
+        query_embedding = embed_query(test_case, rag.embedding_model, rag.embedding_tokenizer)
+    with span("semantic_cache"):
+        entry, similarity = semantic_cache.lookup(query_embedding, fix_category)
+
+    if entry is not None:
+        print(f"Semantic cache hit at similarity {similarity:.4f}.")
+        return entry["fix"], {"hit": True, "similarity": similarity}
+
+    generated_fix = rag_generate_solution(test_case, fix_category, rag.embedding_model, rag.embedding_tokenizer,
+                                          rag.faiss_index, rag.indexed_data, rag.llama_model, rag.llm_client,
+                                          query_embedding=query_embedding)
+    if not is_failed_fix(generated_fix):
+        semantic_cache.add(query_embedding, generated_fix, fix_category, test_case)
+
+    return generated_fix, {"hit": False, "similarity": similarity}
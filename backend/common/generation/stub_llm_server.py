@@ -0,0 +1,145 @@
+"""
+A minimal stand-in for an Ollama server, for exercising the HTTP generation
+path without a real model.
+
+It implements /api/generate (streamed NDJSON or a single JSON body) and
+/api/tags, and answers every prompt with a canned fix split into tokens.
+Like Ollama, it answers 404 for a model other than the one it serves.
+
+Usage (from the backend directory):
+    python -m common.generation.stub_llm_server --port 11435
+    OLLAMA_HOST=http://127.0.0.1:11435 python unixcoder-fft/fft-rag.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_RESPONSE = """``` <javascript>
+test('stub fix', async () => {
+  const result = await waitFor(() => fetchData());
+  expect(result).toBeDefined();
+});
+```
+
+***Explanation:*** The stub server returned a canned fix. It exists only for exercising the generation path."""
+
+
+def tokenize_response(text):
+    # Split into word and whitespace chunks so that joining them restores the text exactly
+    return re.findall(r"\s+|[^\s]+", text)
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Like Ollama's Go server; otherwise Nagle's algorithm holds back the body written after the headers
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # One handler per TCP connection, so this counts the connections clients opened
+        super().setup()
+        self.server.connections_accepted += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": self.server.model_name}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests_served += 1
+        response_text = self.server.response_text
+
+        if request.get("model") != self.server.model_name:
+            self._send_json(404, {"error": f"model '{request.get('model')}' not found, try pulling it first"})
+            return
+
+        if not request.get("stream", True):
+            time.sleep(self.server.token_delay * len(tokenize_response(response_text)))
+            self._send_json(200, {"model": request.get("model"), "response": response_text, "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokenize_response(response_text):
+            time.sleep(self.server.token_delay)
+            self._write_chunk({"model": request.get("model"), "response": token, "done": False})
+        self._write_chunk({"model": request.get("model"), "response": "", "done": True})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, body):
+        data = (json.dumps(body) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(host="127.0.0.1", port=0, response_text=STUB_RESPONSE, token_delay=0.0, model_name="llama3.1"):
+    """
+    Start the stub server on a background thread.
+
+    Args:
+        host (str): The interface to bind to.
+        port (int): The port to bind to, 0 picks a free one.
+        response_text (str): The text returned for every prompt.
+        token_delay (float): Seconds to sleep before each streamed token.
+        model_name (str): The model it serves and reports in /api/tags.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its URL is in `server.url`,
+        and `server.requests_served` and `server.connections_accepted` count
+        the generation requests and TCP connections; call `server.shutdown()`
+        to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), StubLLMHandler)
+    server.daemon_threads = True
+    server.response_text = response_text
+    server.token_delay = token_delay
+    server.model_name = model_name
+    server.requests_served = 0
+    server.connections_accepted = 0
+    server.url = f"http://{host}:{server.server_address[1]}"
+
+    threading.Thread(target=server.serve_forever, name="stub-llm-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens.")
+    parser.add_argument("--model", default="llama3.1", help="The model name to serve.")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.host, args.port, token_delay=args.token_delay, model_name=args.model)
+    print(f"Stub LLM server listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
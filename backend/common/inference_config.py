@@ -0,0 +1,168 @@
+import os
+from collections import namedtuple
+
+import torch
+
+# Process-wide runtime settings for CPU inference
+
+InferenceConfig = namedtuple(
+    "InferenceConfig",
+    ["inference_mode", "workers", "intra_op_threads", "inter_op_threads", "compile", "compile_mode", "pin_cores"],
+    defaults=(True, 1, None, 1, False, "default", False),
+)
+
+# Short texts of different lengths, run at startup so that torch.compile traces dynamic shapes before the first request
+WARM_UP_TEXTS = (
+    "test('warm up', async () => {});",
+    "test('warm up', async () => { const result = await fetchData(); expect(result).toBeDefined(); });",
+    "it('warms up', async () => {\n" + "  await new Promise((resolve) => setTimeout(resolve, 10));\n" * 12 + "});",
+)
+
+# The settings in effect, set by configure_inference
+_active_config = InferenceConfig()
+
+
+def available_cores():
+    """
+    Return the CPU cores this process may run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# The cores at startup, before any pinning; forked workers inherit this list and split it between them
+_startup_cores = available_cores()
+
+
+def inference_config_from_env():
+    """
+    Read the inference settings from the environment:
+
+        INFERENCE_MODE          1 to run under torch.inference_mode (default), 0 for torch.no_grad.
+        INFERENCE_WORKERS       Number of serving processes sharing the machine (default: 1).
+        TORCH_INTRA_OP_THREADS  Threads per operator (default: the cores divided among the workers).
+        TORCH_INTER_OP_THREADS  Threads running independent operators (default: 1).
+        TORCH_COMPILE           1 to compile the models with torch.compile at startup.
+        TORCH_COMPILE_MODE      torch.compile mode (default, reduce-overhead or max-autotune).
+        PIN_CORES               1 to pin each worker to its own cores (default: 1 with several workers).
+
+    Returns:
+        InferenceConfig: The settings.
+    """
+    workers = max(1, int(os.environ.get("INFERENCE_WORKERS", 1)))
+    intra_op_threads = os.environ.get("TORCH_INTRA_OP_THREADS")
+    return InferenceConfig(
+        inference_mode=os.environ.get("INFERENCE_MODE", "1") == "1",
+        workers=workers,
+        intra_op_threads=int(intra_op_threads) if intra_op_threads else None,
+        inter_op_threads=int(os.environ.get("TORCH_INTER_OP_THREADS", 1)),
+        compile=os.environ.get("TORCH_COMPILE", "0") == "1",
+        compile_mode=os.environ.get("TORCH_COMPILE_MODE", "default"),
+        pin_cores=os.environ.get("PIN_CORES", "1" if workers > 1 else "0") == "1",
+    )
+
+
+def cores_for_worker(worker_index, workers, cores=None):
+    """
+    Split the cores evenly between the workers and return the slice for one of them.
+
+    Args:
+        worker_index (int): The worker, from 0 to workers - 1.
+        workers (int): Number of workers sharing the cores.
+        cores (List[int], optional): The cores to split. Defaults to the cores
+            available when the process started.
+
+    Returns:
+        List[int]: The worker's cores; at least one, shared if there are more workers than cores.
+    """
+    cores = cores if cores is not None else _startup_cores
+    per_worker = max(1, len(cores) // workers)
+    start = (worker_index * per_worker) % len(cores)
+    return cores[start:start + per_worker]
+
+
+def configure_inference(config, worker_index=0):
+    """
+    Apply inference settings to the current process.
+
+    Sets the intra-op and inter-op thread counts, pins the process to its share
+    of the cores when `pin_cores` is set, and makes `inference_context()` use
+    the configured autograd mode. Call it once per process at startup, and in
+    every forked worker with its own `worker_index`.
+
+    Args:
+        config (InferenceConfig): The settings to apply.
+        worker_index (int): Which of the `config.workers` workers this process is.
+
+    Returns:
+        InferenceConfig: The settings with the thread count resolved.
+    """
+    global _active_config
+
+    cores = cores_for_worker(worker_index, config.workers)
+    if config.pin_cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    intra_op_threads = config.intra_op_threads or len(cores)
+    torch.set_num_threads(intra_op_threads)
+    try:
+        torch.set_num_interop_threads(config.inter_op_threads)
+    except RuntimeError:
+        # The inter-op pool can only be sized before its first use, e.g. not again in a forked worker
+        pass
+
+    _active_config = config._replace(intra_op_threads=intra_op_threads)
+    pinned = f", pinned to cores {cores}" if config.pin_cores else ""
+    print(f"Inference settings: {intra_op_threads} intra-op / {torch.get_num_interop_threads()} inter-op threads, "
+          f"{'inference_mode' if config.inference_mode else 'no_grad'}"
+          f"{', torch.compile' if config.compile else ''}{pinned}.")
+    return _active_config
+
+
+def active_inference_config():
+    return _active_config
+
+
+def inference_context():
+    """
+    Return the autograd context for a forward pass: torch.inference_mode by
+    default, torch.no_grad when inference mode is turned off.
+    """
+    if _active_config.inference_mode:
+        return torch.inference_mode()
+    return torch.no_grad()
+
+
+def compile_model(model, config=None):
+    """
+    Compile a PyTorch model with torch.compile if the settings ask for it.
+
+    Other models (ONNX Runtime classifiers, SharedEncoder and adapter views) are
+    returned unchanged. The compiled module forwards attribute access to the
+    original, so `config` and `device` keep working.
+
+    Args:
+        model: The model to compile.
+        config (InferenceConfig, optional): Defaults to the active settings.
+
+    Returns:
+        The compiled model, or `model` itself.
+    """
+    config = config or _active_config
+    if not config.compile or not isinstance(model, torch.nn.Module):
+        return model
+    print(f"Compiling {type(model).__name__} with torch.compile (mode={config.compile_mode})...")
+    return torch.compile(model, mode=config.compile_mode)
+
+
+def warm_up_model(model, tokenizer, texts=WARM_UP_TEXTS, **forward_options):
+    """
+    Run a forward pass for each warm-up text, so that lazy initialisation and
+    torch.compile tracing happen at startup instead of on the first requests.
+    """
+    device = getattr(model, "device", torch.device("cpu"))
+    for text in texts:
+        inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512).to(device)
+        with inference_context():
+            model(**inputs, **forward_options)
@@ -0,0 +1,280 @@
+import json
+import os
+import string
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from common.generation.rag_generator import extract_predicted_code, is_failed_fix, rag_generate_solution
+from common.generation.semantic_cache import generate_with_semantic_cache
+from common.telemetry import ERRORS, QUEUE_DEPTH, current_request_id, traced
+
+# Asynchronous job queue for long-running fix generation
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class CallbackNotAllowed(ValueError):
+    """Raised when a job is submitted with a callback URL outside the allowed hosts."""
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on a bounded worker pool and keeps their status and
+    results for polling.
+
+    Each job moves through 'queued', 'running' and then 'done' or 'failed'.
+    Finished jobs are kept for `retention_seconds` and then expire. If a job
+    was submitted with a callback URL, its final status is POSTed there.
+    Callbacks are off unless `callback_hosts` lists the hosts they may go to,
+    since the URL comes from the client and would otherwise let anyone make the
+    server POST to internal addresses.
+
+    With a `state_dir` shared by several processes, such as the gunicorn
+    workers of serve.py, every job's status is also written there, so a job can
+    be polled through any of them and not only the one running it.
+
+    A job is logged under the request id of the request that submitted it, with
+    the spans recorded while it ran.
+    """
+
+    def __init__(self, max_workers=2, max_pending=100, retention_seconds=3600, callback_hosts=None, state_dir=None):
+        """
+        Args:
+            max_workers (int): Maximum number of jobs running concurrently.
+            max_pending (int): Maximum number of queued and running jobs.
+            retention_seconds (float): How long finished jobs stay available.
+            callback_hosts (Iterable[str], optional): Host names (optionally with
+                ':port') callback URLs may point to. No callbacks are allowed without them.
+            state_dir (str, optional): Directory the job statuses are shared through.
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.callback_hosts = {host.lower() for host in callback_hosts or ()}
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._executor = None
+        self._executor_pid = None
+        self._queue_depth = QUEUE_DEPTH.labels("fix_jobs")
+        self._state_pruned_at = 0.0
+
+    def _get_executor(self):
+        # Worker threads do not survive a fork, so every process gets its own pool
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fix-job")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _prune_expired(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and now - job["finished_at"] > self.retention_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        # Shared statuses are last written when their job finishes; scanning for them once a minute is enough
+        if self.state_dir and now - self._state_pruned_at > 60:
+            self._state_pruned_at = now
+            for name in os.listdir(self.state_dir):
+                path = os.path.join(self.state_dir, name)
+                try:
+                    if name.endswith(".json") and now - os.path.getmtime(path) > self.retention_seconds:
+                        os.remove(path)
+                except OSError:
+                    continue
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _publish(self, job):
+        # Written under a temporary name first, since other processes read these files while they are written
+        if not self.state_dir:
+            return
+        path = self._state_path(job["id"])
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(self._snapshot(job), f)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not share the status of job {job['id']}: {e}")
+
+    def _read_shared(self, job_id):
+        # Job ids are hex, anything else could point outside the state directory
+        if not self.state_dir or not job_id or any(c not in string.hexdigits for c in job_id):
+            return None
+        try:
+            with open(self._state_path(job_id), 'r') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if job["finished_at"] is not None and time.time() - job["finished_at"] > self.retention_seconds:
+            return None
+        return job
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+
+    def check_callback_url(self, callback_url):
+        """
+        Raises:
+            CallbackNotAllowed: Unless the URL is http(s) and its host is allowed.
+        """
+        parts = urlsplit(callback_url)
+        host = (parts.hostname or "").lower()
+        netloc = f"{host}:{parts.port}" if parts.port else host
+        if parts.scheme not in ("http", "https") or not host or \
+                (host not in self.callback_hosts and netloc not in self.callback_hosts):
+            raise CallbackNotAllowed(f"Callbacks to {callback_url!r} are not allowed; "
+                                     "allowed hosts are set with JOB_CALLBACK_HOSTS")
+
+    def submit(self, fn, *args, callback_url=None, metadata=None, **kwargs):
+        """
+        Queue `fn(*args, **kwargs)` to run on the worker pool.
+
+        Args:
+            fn (Callable): The job to run. Its return value becomes the job result.
+            callback_url (str, optional): URL the finished job is POSTed to.
+            metadata (Dict, optional): Extra fields reported with the job status.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            CallbackNotAllowed: If the callback URL is not allowed.
+            JobQueueFull: If `max_pending` jobs are already queued or running.
+        """
+        if callback_url:
+            self.check_callback_url(callback_url)
+
+        with self._lock:
+            self._prune_expired()
+            if self._pending_count() >= self.max_pending:
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "metadata": metadata or {},
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "callback_url": callback_url,
+            }
+            self._publish(self._jobs[job_id])
+            self._queue_depth.inc()
+            self._get_executor().submit(self._run, job_id, current_request_id(), fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, request_id, fn, args, kwargs):
+        with self._lock:
+            self._jobs[job_id].update(status="running", started_at=time.time())
+            self._publish(self._jobs[job_id])
+        self._queue_depth.dec()
+
+        try:
+            with traced("job", request_id, job_id=job_id):
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            ERRORS.labels("job").inc()
+            print(f"Job {job_id} failed: {e}")
+            update = {"status": "failed", "error": str(e)}
+        else:
+            update = {"status": "done", "result": result}
+
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(finished_at=time.time(), **update)
+            self._publish(job)
+            callback_url = job["callback_url"]
+            snapshot = self._snapshot(job)
+
+        if callback_url:
+            self._send_callback(callback_url, snapshot)
+
+    def _send_callback(self, callback_url, snapshot):
+        try:
+            # Redirects are not followed, they could lead anywhere
+            requests.post(callback_url, json=snapshot, timeout=10, allow_redirects=False)
+        except requests.RequestException as e:
+            print(f"Callback to {callback_url} for job {snapshot['id']} failed: {e}")
+
+    @staticmethod
+    def _snapshot(job):
+        snapshot = {key: value for key, value in job.items() if key != "callback_url"}
+        snapshot["metadata"] = dict(job["metadata"])
+        return snapshot
+
+    def get(self, job_id):
+        """
+        Return the status of a job, or None if it is unknown or has expired.
+        Jobs of other processes are found through the shared state directory.
+
+        Returns:
+            Dict: The job id, status, metadata, result or error, and timestamps.
+        """
+        with self._lock:
+            self._prune_expired()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._snapshot(job)
+        return self._read_shared(job_id)
+
+    def stats(self):
+        """
+        Return the number of retained jobs of this process in each status.
+        """
+        with self._lock:
+            self._prune_expired()
+            counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            counts["max_workers"] = self.max_workers
+            counts["max_pending"] = self.max_pending
+            return counts
+
+
+def generate_fix_job(test_case, fix_category, rag, cache=None, semantic_cache=None, query_embedding=None):
+    """
+    Job body for asynchronous fix generation through the RAG pipeline.
+    Near-duplicate queries are answered from the semantic cache when one is
+    given, and successful fixes are stored in the result cache. A precomputed
+    query embedding skips embedding the test case again.
+
+    Returns:
+        Dict: The generated fix, the code extracted from it and, with a semantic
+        cache, whether it was a hit.
+
+    Raises:
+        RuntimeError: If no fix could be generated, so the job is marked failed.
+    """
+    result = {}
+    if semantic_cache is not None:
+        generated_fix, result["semanticCache"] = generate_with_semantic_cache(test_case, fix_category, rag, semantic_cache,
+                                                                                query_embedding=query_embedding)
+    else:
+        generated_fix = rag_generate_solution(test_case, fix_category, rag.embedding_model, rag.embedding_tokenizer,
+                                              rag.faiss_index, rag.indexed_data, rag.llama_model, rag.llm_client,
+                                              query_embedding=query_embedding)
+    # The pipeline reports failures as a message instead of raising
+    if is_failed_fix(generated_fix):
+        raise RuntimeError(generated_fix)
+    if cache is not None:
+        cache.set("fix", test_case, generated_fix)
+
+    result.update(generatedFix=generated_fix, predictedCode=extract_predicted_code(generated_fix))
+    return result
@@ -0,0 +1,186 @@
+import os
+import threading
+from collections import namedtuple
+
+from transformers import AutoModel, RobertaTokenizerFast
+
+from common.classification.dataset import DatasetStream
+from common.generation.llm_client import OllamaClient
+from common.generation.rag_generator import build_faiss_index, setup_llama
+from common.inference_config import compile_model, warm_up_model
+
+# Shared registry for the RAG resources used by the Flask apps
+
+RagResources = namedtuple(
+    "RagResources",
+    ["dataset", "embedding_model", "embedding_tokenizer", "faiss_index", "indexed_data", "llama_model", "llm_client"],
+)
+
+
+class ResourceRegistry:
+    """
+    Builds the RAG resources once and keeps them warm between requests.
+
+    The dataset, the UniXcoder embedding model, the FAISS index and the indexed
+    data are loaded on first use and reused afterwards. Every access checks the
+    on-disk artifacts and reloads the dataset and index if any of them changed,
+    so a rebuilt index is picked up without restarting the app.
+
+    Access is guarded by a lock, and callers receive an immutable snapshot, so
+    a reload never swaps resources out from under a request that is in flight.
+    Callbacks added with `add_reload_listener` run after every reload, e.g. to
+    drop fixes cached from the old index.
+    """
+
+    def __init__(self, dataset_path, index_file="faiss_index.bin", data_file="indexed_data.store",
+                 embedding_model_name="microsoft/unixcoder-base", llm_backend=None,
+                 index_type="flat", index_params=None, search_params=None, embedding_loader=None):
+        """
+        Args:
+            dataset_path (str): Path to the JSON dataset used to build the index.
+            index_file (str): The path where the FAISS index is saved/loaded.
+            data_file (str): The path where the indexed dataset is saved/loaded.
+            embedding_model_name (str): The pre-trained model used for embeddings.
+            llm_backend (str, optional): 'http' to generate through a pooled client for
+                the Ollama server (the default, taken from LLM_BACKEND), or 'cli' to
+                always run `ollama run`.
+            index_type (str): FAISS index type used when the index is built
+                ('flat', 'ivf', 'hnsw' or 'ivfpq').
+            index_params (Dict, optional): Build options for the index type.
+            search_params (Dict, optional): Search-time options (nprobe, ef_search).
+            embedding_loader (Callable, optional): Returns the (model, tokenizer) used for
+                embeddings instead of loading `embedding_model_name`, e.g. a SharedEncoder
+                over the fine-tuned classifier.
+        """
+        self.dataset_path = dataset_path
+        self.index_file = index_file
+        self.data_file = data_file
+        self.embedding_model_name = embedding_model_name
+        self.llm_backend = llm_backend or os.environ.get("LLM_BACKEND", "http")
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.search_params = search_params or {}
+        self.embedding_loader = embedding_loader
+
+        self._lock = threading.RLock()
+        self._resources = None
+        self._fingerprint = None
+        self._embedding_model = None
+        self._embedding_tokenizer = None
+        self._query_model = None
+        self._llm_client = None
+        self._reload_listeners = []
+
+    def _artifact_fingerprint(self):
+        """
+        Return the modification time and size of every artifact on disk.
+        Missing files are recorded as None so that deleting one triggers a rebuild.
+        """
+        fingerprint = []
+        for path in (self.dataset_path, self.index_file, self.data_file):
+            try:
+                stat = os.stat(path)
+                fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                fingerprint.append((path, None, None))
+        return tuple(fingerprint)
+
+    def _load_embedding_model(self):
+        if self._embedding_model is None and self.embedding_loader is not None:
+            self._embedding_model, self._embedding_tokenizer = self.embedding_loader()
+        elif self._embedding_model is None:
+            print(f"Loading embedding model {self.embedding_model_name}...")
+            self._embedding_tokenizer = RobertaTokenizerFast.from_pretrained(self.embedding_model_name)
+            self._embedding_model = AutoModel.from_pretrained(self.embedding_model_name)
+            self._embedding_model.eval()
+            print("Embedding model loaded.")
+        if self._query_model is None:
+            # Queries go through the compiled model when torch.compile is on; index
+            # builds keep the eager one, which can be handed to worker processes
+            self._query_model = compile_model(self._embedding_model)
+        return self._embedding_model, self._embedding_tokenizer
+
+    def _load_llm_client(self, llama_model):
+        if self.llm_backend != "http":
+            return None
+        if self._llm_client is None or self._llm_client.model_name != llama_model:
+            self._llm_client = OllamaClient(llama_model)
+            print(f"Generating fixes through the Ollama server at {self._llm_client.host}.")
+        return self._llm_client
+
+    def add_reload_listener(self, callback):
+        """
+        Call `callback()` whenever the resources are loaded again after the first load.
+        """
+        self._reload_listeners.append(callback)
+
+    def _load(self):
+        reloading = self._resources is not None
+        embedding_model, embedding_tokenizer = self._load_embedding_model()
+        llama_model = setup_llama()
+
+        # Streamed from disk on every pass, so the dataset does not have to fit in memory
+        dataset = DatasetStream(self.dataset_path)
+        faiss_index, indexed_data = build_faiss_index(
+            dataset, embedding_model, embedding_tokenizer,
+            index_file=self.index_file, data_file=self.data_file,
+            index_type=self.index_type, index_params=self.index_params, search_params=self.search_params,
+        )
+
+        self._resources = RagResources(
+            dataset=dataset,
+            embedding_model=self._query_model,
+            embedding_tokenizer=embedding_tokenizer,
+            faiss_index=faiss_index,
+            indexed_data=indexed_data,
+            llama_model=llama_model,
+            llm_client=self._load_llm_client(llama_model),
+        )
+        # Take the fingerprint after loading, since building the index writes the artifacts
+        self._fingerprint = self._artifact_fingerprint()
+        if reloading:
+            for callback in self._reload_listeners:
+                callback()
+
+    def get(self):
+        """
+        Return the warm RAG resources, loading or reloading them if needed.
+
+        Returns:
+            RagResources: The dataset, embedding model and tokenizer, FAISS index,
+            indexed data, LLaMA model name and Ollama HTTP client (None for the CLI).
+        """
+        with self._lock:
+            if self._resources is None:
+                self._load()
+            elif self._artifact_fingerprint() != self._fingerprint:
+                print("RAG artifacts changed on disk, reloading...")
+                self._load()
+            return self._resources
+
+    def reload(self, embedding_model=False):
+        """
+        Force the dataset and FAISS index to be reloaded from disk.
+
+        Args:
+            embedding_model (bool): Also load the embedding model again, e.g.
+                when it is a SharedEncoder over a retrained classifier.
+
+        Returns:
+            RagResources: The freshly loaded resources.
+        """
+        with self._lock:
+            if embedding_model:
+                self._embedding_model, self._embedding_tokenizer, self._query_model = None, None, None
+            self._load()
+            return self._resources
+
+    def warm_up(self):
+        """
+        Load everything up front and run a few embedding passes so that the
+        first request does not pay for lazy initialisation or compilation.
+        """
+        resources = self.get()
+        warm_up_model(resources.embedding_model, resources.embedding_tokenizer)
+        print("RAG resources are warm.")
+        return resources
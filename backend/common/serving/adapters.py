@@ -0,0 +1,125 @@
+import threading
+
+import torch
+from peft import PeftModel
+from transformers import RobertaForSequenceClassification
+
+from common.classification.shared_encoder import SharedEncoder
+
+# LoRA classifier variants served from one copy of the base model
+
+
+class AdapterHost:
+    """
+    Hosts LoRA classifier variants on a single copy of the base UniXcoder weights.
+
+    Every adapter is loaded into one PeftModel. With all adapters disabled the
+    same weights produce the base model's retrieval embeddings, so no separate
+    `AutoModel` is needed for retrieval either. Selecting an adapter changes
+    module state, so forward passes through the host are serialized by a lock.
+    """
+
+    def __init__(self, base_model_name="microsoft/unixcoder-base", device=None, num_labels=6):
+        """
+        Args:
+            base_model_name (str): The base model the adapters were trained on.
+            device (torch.device, optional): Device for the shared weights. Defaults to the CPU.
+            num_labels (int): Number of fix categories.
+        """
+        self.base_model_name = base_model_name
+        self.device = device or torch.device("cpu")
+        self.num_labels = num_labels
+
+        self._lock = threading.RLock()
+        self._model = None
+
+    def _load_base(self):
+        with self._lock:
+            if self._model is None:
+                print(f"Loading the shared base model {self.base_model_name}...")
+                self._model = RobertaForSequenceClassification.from_pretrained(
+                    self.base_model_name, num_labels=self.num_labels).to(self.device).eval()
+            return self._model
+
+    @property
+    def config(self):
+        return self._load_base().config
+
+    def classifier(self, name, adapter_dir, merge=False):
+        """
+        Load a LoRA classifier variant.
+
+        Args:
+            name (str): The adapter name.
+            adapter_dir (str): Directory of the saved adapter (e.g. trained_model/peft_unixcoder).
+            merge (bool): Fold the adapter into a private copy of the base weights.
+                This is the fast path: no lock and no LoRA matmuls per request,
+                at the cost of one more copy of the encoder in memory.
+
+        Returns:
+            The classifier, callable like a RobertaForSequenceClassification.
+        """
+        if merge:
+            print(f"Merging adapter '{name}' into its own copy of {self.base_model_name}...")
+            base = RobertaForSequenceClassification.from_pretrained(self.base_model_name, num_labels=self.num_labels)
+            return PeftModel.from_pretrained(base, adapter_dir).merge_and_unload().to(self.device).eval()
+
+        with self._lock:
+            model = self._load_base()
+            if not isinstance(model, PeftModel):
+                self._model = PeftModel.from_pretrained(model, adapter_dir, adapter_name=name).eval()
+            else:
+                # Loading under an existing name replaces the adapter's weights, e.g. after retraining
+                model.load_adapter(adapter_dir, adapter_name=name)
+                model.eval()
+            print(f"Adapter '{name}' attached to the shared base model.")
+        return AdapterView(self, name)
+
+    def embedding_model(self):
+        """
+        Return the base encoder, with every adapter disabled, as a retrieval
+        embedding model. Its index manifest identity matches the base `AutoModel`,
+        so existing indexes built from the base model stay valid.
+        """
+        return SharedEncoder(AdapterView(self, None), self.base_model_name)
+
+    def forward(self, adapter_name, **inputs):
+        """
+        Run the shared model with one adapter, or with none for adapter_name=None.
+        """
+        with self._lock:
+            model = self._load_base()
+            if not isinstance(model, PeftModel):
+                return model(**inputs)
+            if adapter_name is None:
+                with model.disable_adapter():
+                    return model(**inputs)
+            model.set_adapter(adapter_name)
+            return model(**inputs)
+
+
+class AdapterView:
+    """
+    One adapter of an AdapterHost, callable like a RobertaForSequenceClassification.
+    """
+
+    def __init__(self, host, adapter_name):
+        self.host = host
+        self.adapter_name = adapter_name
+
+    @property
+    def config(self):
+        return self.host.config
+
+    @property
+    def device(self):
+        return self.host.device
+
+    def eval(self):
+        return self
+
+    def parameters(self):
+        return self.host._load_base().parameters()
+
+    def __call__(self, **inputs):
+        return self.host.forward(self.adapter_name, **inputs)
@@ -0,0 +1,363 @@
+import json
+import os
+
+from codebleu import calc_codebleu
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask_cors import CORS
+
+from common.bulk_prediction import iter_batch_predictions
+from common.generation.rag_generator import extract_predicted_code, is_failed_fix
+from common.generation.semantic_cache import generate_with_semantic_cache
+from common.jobs import CallbackNotAllowed, JobQueue, JobQueueFull, generate_fix_job
+from common.streaming import format_sse, iter_fix_events
+from common.telemetry import ERRORS, REQUEST_SECONDS, annotate, finish_trace, render_metrics, span, start_trace
+
+# Flask app serving one or more model variants
+
+
+def jobs_from_env():
+    """
+    Create the queue for asynchronous fix generation, with JOB_MAX_WORKERS,
+    JOB_MAX_PENDING, JOB_RETENTION_SECONDS, JOB_CALLBACK_HOSTS (comma-separated
+    hosts callback URLs may point to; callbacks are refused without it) and
+    JOB_STATE_DIR (where processes share job statuses) read from the environment.
+    """
+    return JobQueue(
+        max_workers=int(os.environ.get("JOB_MAX_WORKERS", 2)),
+        max_pending=int(os.environ.get("JOB_MAX_PENDING", 100)),
+        retention_seconds=float(os.environ.get("JOB_RETENTION_SECONDS", 3600)),
+        callback_hosts=[host.strip() for host in os.environ.get("JOB_CALLBACK_HOSTS", "").split(",") if host.strip()],
+        state_dir=os.environ.get("JOB_STATE_DIR") or None,
+    )
+
+
+def json_body():
+    # The request's JSON object, or None when the body is missing, malformed or not an object
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+
+def int_option(data, key, default, low, high):
+    """
+    Read an integer option from a request body, clamped to [low, high].
+
+    Raises:
+        ValueError: If the value is not an integer.
+    """
+    value = data.get(key, default)
+    if isinstance(value, bool):
+        raise ValueError(f"'{key}' must be an integer")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{key}' must be an integer")
+    return max(low, min(value, high))
+
+
+def classify(variant, js_code):
+    # Classify through the variant's micro-batcher, timed as the request's classification stage
+    with span("classification"):
+        return variant.batcher.predict(js_code)
+
+
+def create_app(variants, jobs=None, default_variant=None):
+    """
+    Create the prediction API for a set of model variants.
+
+    Each request picks its variant with a `variant` field in the JSON body or a
+    `?variant=` query parameter, and falls back to the default variant.
+
+    Every request is traced under its X-Request-ID header (or a new id, returned
+    in that header): the time spent in each stage is exported on /metrics and
+    logged as one JSON line when the response has been sent.
+
+    Args:
+        variants (Dict[str, ModelVariant]): The served variants, by name.
+        jobs (JobQueue, optional): Queue for asynchronous fix generation.
+            Defaults to jobs_from_env().
+        default_variant (str, optional): Variant used when a request names none.
+            Defaults to the first variant.
+
+    Returns:
+        Flask: The app.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    # Lets the serving entry point warm up and reload the variants behind the app
+    app.extensions["variants"] = variants
+
+    jobs = jobs or jobs_from_env()
+    default_variant = default_variant or next(iter(variants))
+
+    def variant_for(data=None):
+        name = (data or {}).get('variant') or request.args.get('variant') or default_variant
+        if name not in variants:
+            raise KeyError(f"Unknown model variant '{name}', expected one of {', '.join(variants)}")
+        annotate(variant=name)
+        return variants[name]
+
+    @app.before_request
+    def start_request_trace():
+        # Prometheus scrapes are neither timed nor logged
+        if request.endpoint == "metrics":
+            return
+        g.trace = start_trace(request.headers.get("X-Request-ID"))
+
+    @app.after_request
+    def finish_request_trace(response):
+        trace = g.pop("trace", None)
+        if trace is None:
+            return response
+        response.headers["X-Request-ID"] = trace.request_id
+        endpoint, method, path, status = request.endpoint or "unmatched", request.method, request.path, response.status_code
+
+        def finish():
+            REQUEST_SECONDS.labels(endpoint, method, str(status)).observe(trace.elapsed())
+            if status >= 500:
+                ERRORS.labels("request").inc()
+            finish_trace(trace, method=method, path=path, status=status)
+
+        # Streamed responses are still being generated, so their trace ends when the stream closes
+        if response.is_streamed:
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
+
+    # Prometheus metrics: stage and request latency histograms, cache lookups, errors and queue depths
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+
+    # Home route for API
+    @app.route('/')
+    def home():
+        return "Welcome to the UnixCoder Prediction API (Version 2)!"
+
+    # Readiness probe: 200 once every variant's model and RAG resources are warm, 503 until then
+    @app.route('/ready', methods=['GET'])
+    def ready():
+        status = {name: variant.ready for name, variant in variants.items()}
+        return jsonify({"ready": all(status.values()), "variants": status}), 200 if all(status.values()) else 503
+
+    # The served variants and which one is used by default
+    @app.route('/api/variants', methods=['GET'])
+    def api_variants():
+        return jsonify({"default": default_variant, "variants": [variant.info() for variant in variants.values()]})
+
+    # API endpoint for prediction and fix generation
+    @app.route('/api/predict', methods=['POST'])
+    def api_predict():
+        try:
+            data = json_body()
+            if data is None:
+                return jsonify({"error": "Expected a JSON object as the request body"}), 400
+            js_code = data.get('code')
+
+            if not js_code:
+                return jsonify({"error": "No JavaScript code provided"}), 400
+
+            try:
+                variant = variant_for(data).load()
+            except KeyError as e:
+                return jsonify({"error": e.args[0]}), 400
+            cache = variant.cache
+
+            generated_fix = cache.get("fix", js_code)
+            fix_cached = generated_fix is not None
+            semantic_outcome = None
+            query_embedding = None
+
+            if variant.shared_encoder and not fix_cached:
+                # One encoder pass yields both the category and the retrieval embedding
+                with span("classification"):
+                    fix_category, query_embedding = variant.batcher.predict_with_embedding(js_code)
+                category_cached = False
+                cache.set("category", js_code, fix_category)
+            else:
+                # Predict fix category, reusing the cached result for repeated test cases
+                fix_category, category_cached = cache.get_or_compute("category", js_code,
+                                                                     lambda: classify(variant, js_code))
+
+            # Reuse the warm dataset, embedding model, FAISS index and LLaMA model
+            rag = variant.resources.get()
+
+            if not fix_cached:
+                # In async mode, return the category now and generate the fix in the background
+                if data.get('async'):
+                    try:
+                        job_id = jobs.submit(generate_fix_job, js_code, fix_category, rag, cache, variant.semantic_cache,
+                                             query_embedding=query_embedding,
+                                             callback_url=data.get('callback_url'),
+                                             metadata={"predictedCategory": fix_category, "variant": variant.name})
+                    except CallbackNotAllowed as e:
+                        return jsonify({"predictedCategory": fix_category, "error": str(e)}), 400
+                    except JobQueueFull as e:
+                        return jsonify({"predictedCategory": fix_category, "error": str(e)}), 503
+
+                    return jsonify({
+                        "predictedCategory": fix_category,
+                        "variant": variant.name,
+                        "jobId": job_id,
+                        "status": "queued"
+                    }), 202
+
+                # Generate the fix using the full RAG pipeline, unless a near-duplicate query was already answered
+                generated_fix, semantic_outcome = generate_with_semantic_cache(js_code, fix_category, rag,
+                                                                               variant.semantic_cache,
+                                                                               query_embedding=query_embedding)
+
+                if not is_failed_fix(generated_fix):
+                    cache.set("fix", js_code, generated_fix)
+
+            # Extract predicted code from the generated fix
+            predicted_code = extract_predicted_code(generated_fix)
+
+            # Return the generated fix
+            return jsonify({
+                "predictedCategory": fix_category,
+                "generatedFix": generated_fix,
+                "predictedCode": predicted_code,
+                "variant": variant.name,
+                "cached": {"category": category_cached, "fix": fix_cached},
+                "semanticCache": semantic_outcome
+            })
+
+        except Exception as e:
+            print(f"Error occurred: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+
+    # Status and result of an asynchronous fix generation job
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def api_job_status(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown or expired job id"}), 404
+        return jsonify(job)
+
+    # Streaming endpoint, sends the category first and then the fix token by token as Server-Sent Events
+    @app.route('/api/predict_stream', methods=['POST'])
+    def api_predict_stream():
+        data = json_body()
+        if data is None:
+            return jsonify({"error": "Expected a JSON object as the request body"}), 400
+        js_code = data.get('code')
+
+        if not js_code:
+            return jsonify({"error": "No JavaScript code provided"}), 400
+
+        try:
+            variant = variant_for(data).load()
+        except KeyError as e:
+            return jsonify({"error": e.args[0]}), 400
+
+        try:
+            query_embedding = None
+            if variant.shared_encoder:
+                with span("classification"):
+                    fix_category, query_embedding = variant.batcher.predict_with_embedding(js_code)
+            else:
+                fix_category, _ = variant.cache.get_or_compute("category", js_code,
+                                                               lambda: classify(variant, js_code))
+            rag = variant.resources.get()
+        except Exception as e:
+            print(f"Error occurred: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+
+        def stream_events():
+            yield format_sse("category", {"predictedCategory": fix_category, "variant": variant.name})
+            yield from iter_fix_events(js_code, fix_category, rag, variant.cache, variant.semantic_cache, query_embedding)
+
+        return Response(stream_with_context(stream_events()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    # Bulk prediction endpoint, streams one JSON result per line as each test case finishes
+    @app.route('/api/predict_batch', methods=['POST'])
+    def api_predict_batch():
+        data = json_body()
+        if data is None:
+            return jsonify({"error": "Expected a JSON object as the request body"}), 400
+        test_cases = data.get('codes')
+
+        if not isinstance(test_cases, list) or not test_cases:
+            return jsonify({"error": "Provide a non-empty list of JavaScript test cases in 'codes'"}), 400
+
+        try:
+            variant = variant_for(data).load()
+        except KeyError as e:
+            return jsonify({"error": e.args[0]}), 400
+
+        generate = bool(data.get('generate', False))
+        try:
+            batch_size = int_option(data, 'batch_size', 32, 1, 128)
+            generation_workers = int_option(data, 'generation_workers', 2, 1, 8)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        def stream_results():
+            rag = variant.resources.get() if generate else None
+            for result in iter_batch_predictions(test_cases, variant.model, variant.tokenizer, variant.device, rag=rag,
+                                                 batch_size=batch_size, generation_workers=generation_workers):
+                yield json.dumps(result) + "\n"
+
+        return Response(stream_with_context(stream_results()), mimetype='application/x-ndjson')
+
+    # Queue depth and batch-size distribution of the classification micro-batcher
+    @app.route('/api/batcher_metrics', methods=['GET'])
+    def api_batcher_metrics():
+        try:
+            variant = variant_for()
+        except KeyError as e:
+            return jsonify({"error": e.args[0]}), 400
+        if variant.batcher is None:
+            return jsonify({"error": "Model is not loaded"}), 503
+        return jsonify(variant.batcher.metrics())
+
+    # Hit and miss counters of the result cache
+    @app.route('/api/cache_stats', methods=['GET'])
+    def api_cache_stats():
+        try:
+            variant = variant_for()
+        except KeyError as e:
+            return jsonify({"error": e.args[0]}), 400
+        return jsonify({"result_cache": variant.cache.stats(), "semantic_cache": variant.semantic_cache.stats()})
+
+    @app.route('/api/compute_codebleu', methods=['POST'])
+    def api_compute_codebleu():
+        try:
+            data = json_body()
+            if data is None:
+                return jsonify({"error": "Expected a JSON object as the request body"}), 400
+            predicted_code = data.get('predicted_code')
+            reference_code = data.get('reference_code')
+
+            if not predicted_code:
+                return jsonify({"error": "No predicted code provided"}), 400
+
+            if not reference_code:
+                return jsonify({"error": "No reference code provided"}), 400
+
+            # Calculate CodeBLEU
+            formatted_reference = reference_code.strip()
+            result = calc_codebleu([formatted_reference], [predicted_code], lang="javascript", weights=(0.10, 0.10, 0.40, 0.40), tokenizer=None)
+
+            if any(value is None for value in result.values()):
+                raise ValueError("CodeBLEU calculation returned None values.")
+
+            # Return the CodeBLEU result
+            return jsonify({
+                "codebleu": {
+                    "ngram_match_score": result['ngram_match_score'],
+                    "weighted_ngram_match_score": result['weighted_ngram_match_score'],
+                    "syntax_match": result['syntax_match_score'],
+                    "semantic_match": result['dataflow_match_score'],
+                    "codebleu_score": result['codebleu']
+                }
+            })
+
+        except Exception as e:
+            print(f"Error occurred: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+
+    return app
@@ -0,0 +1,241 @@
+import os
+import threading
+
+from transformers import RobertaTokenizerFast
+
+from common.cache import ResultCache
+from common.classification.batching import MicroBatcher
+from common.classification.runtimes import load_classifier
+from common.classification.shared_encoder import SharedEncoder
+from common.generation.index_factory import index_settings_from_env
+from common.generation.semantic_cache import DEFAULT_THRESHOLD, SemanticCache
+from common.inference_config import compile_model, warm_up_model
+from common.resources import ResourceRegistry
+
+# Model variants served by the prediction API
+
+
+class ModelVariant:
+    """
+    A fine-tuned classifier served by the API, together with its micro-batcher,
+    result cache, semantic cache and RAG resources.
+
+    The model is loaded on first use (or by an explicit `load()` at startup)
+    through `loader`, which returns the model and its tokenizer.
+    """
+
+    def __init__(self, name, model_dir, loader, device, cache, semantic_cache, resources=None,
+                 runtime="torch", shared_encoder=False, max_batch_size=16, max_wait_ms=5):
+        """
+        Args:
+            name (str): The variant name used in requests.
+            model_dir (str): Directory of the fine-tuned model or adapter.
+            loader (Callable): Returns the (model, tokenizer) pair.
+            device (torch.device): The device the model runs on.
+            cache (ResultCache): Cache of categories and generated fixes.
+            semantic_cache (SemanticCache): Fixes reused for near-duplicate test cases.
+            resources (ResourceRegistry, optional): The RAG resources; may be shared between variants.
+            runtime (str): The classifier runtime, reported by `info()`.
+            shared_encoder (bool): Retrieve with the classifier's own encoder.
+            max_batch_size (int): Maximum requests per classification forward pass.
+            max_wait_ms (float): How long the micro-batcher waits for more requests.
+        """
+        self.name = name
+        self.model_dir = model_dir
+        self.loader = loader
+        self.device = device
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.resources = resources
+        self.runtime = runtime
+        self.shared_encoder = shared_encoder
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self.model, self.tokenizer, self.batcher = None, None, None
+        self.ready = False
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def load(self):
+        """
+        Load the model, tokenizer and micro-batcher if they are not loaded yet.
+
+        Returns:
+            ModelVariant: The variant itself.
+        """
+        with self._load_lock:
+            if self.model is None:
+                print(f"Loading the {self.name} model...")
+                model, tokenizer = self._load_model()
+                self.batcher = MicroBatcher(model, tokenizer, self.device, max_batch_size=self.max_batch_size,
+                                            max_wait_ms=self.max_wait_ms, name=self.name)
+                self.model, self.tokenizer = model, tokenizer
+                print(f"The {self.name} model and tokenizer are ready for use.")
+        return self
+
+    def _load_model(self):
+        if not os.path.exists(self.model_dir):
+            raise FileNotFoundError(f"Fine-tuned model for '{self.name}' not found at {self.model_dir}. "
+                                    "Train the model before using the API.")
+        model, tokenizer = self.loader()
+        return compile_model(model), tokenizer
+
+    def warm_up(self):
+        """
+        Load the model and the RAG resources, and run a few forward passes of
+        different lengths so that torch.compile has traced the models before
+        the first request. The variant reports itself ready afterwards.
+
+        Returns:
+            ModelVariant: The variant itself.
+        """
+        self.load()
+        warm_up_model(self.model, self.tokenizer, output_hidden_states=self.shared_encoder)
+        self.resources.warm_up()
+        self.ready = True
+        print(f"The {self.name} model is warm.")
+        return self
+
+    def reload(self):
+        """
+        Load the model and the RAG resources again from disk, e.g. after
+        retraining, and warm them up. Requests keep using the current model
+        until the new one is ready.
+
+        Returns:
+            ModelVariant: The variant itself.
+        """
+        print(f"Reloading the {self.name} model...")
+        model, tokenizer = self._load_model()
+        warm_up_model(model, tokenizer, output_hidden_states=self.shared_encoder)
+        with self._load_lock:
+            if self.batcher is None:
+                self.batcher = MicroBatcher(model, tokenizer, self.device, max_batch_size=self.max_batch_size,
+                                            max_wait_ms=self.max_wait_ms, name=self.name)
+            else:
+                self.batcher.model, self.batcher.tokenizer = model, tokenizer
+            self.model, self.tokenizer = model, tokenizer
+        # A shared-encoder index embeds with the classifier, so it is rebuilt from the new weights
+        self.resources.reload(embedding_model=self.shared_encoder)
+        self.resources.warm_up()
+        self.ready = True
+        print(f"The {self.name} model was reloaded.")
+        return self
+
+    def info(self):
+        return {
+            "name": self.name,
+            "model_dir": self.model_dir,
+            "runtime": self.runtime,
+            "shared_encoder": self.shared_encoder,
+            "loaded": self.loaded,
+            "ready": self.ready,
+        }
+
+
+def create_resources(index_dir, dataset_path, embedding_loader=None, shared_encoder=False):
+    """
+    Create the RAG resources for an index directory, with the FAISS settings
+    read from the environment (see index_settings_from_env).
+
+    Args:
+        index_dir (str): Directory holding the FAISS index and indexed data.
+        dataset_path (str): Path to the JSON dataset used to build the index.
+        embedding_loader (Callable, optional): Returns the (model, tokenizer) used
+            for embeddings instead of the base UniXcoder model.
+        shared_encoder (bool): Whether the embeddings come from a fine-tuned
+            classifier; such indexes get their own files.
+
+    Returns:
+        ResourceRegistry: The lazily loaded resources.
+    """
+    # The index is only written after the whole dataset is embedded, so create its directory up front
+    os.makedirs(index_dir, exist_ok=True)
+    suffix = ".shared" if shared_encoder else ""
+    index_type, index_params, search_params = index_settings_from_env()
+    return ResourceRegistry(
+        dataset_path=dataset_path,
+        index_file=os.path.join(index_dir, f"faiss_index{suffix}.bin"),
+        data_file=os.path.join(index_dir, f"indexed_data{suffix}.store"),
+        index_type=index_type,
+        index_params=index_params,
+        search_params=search_params,
+        embedding_loader=embedding_loader,
+    )
+
+
+def build_variant(name, variant_dir, model_dir, dataset_path, device, runtime="torch", loader=None,
+                  resources=None, shared_encoder=False):
+    """
+    Create a model variant with its settings read from the environment:
+    MICROBATCH_MAX_BATCH_SIZE, MICROBATCH_MAX_WAIT_MS, RESULT_CACHE_DIR,
+    RESULT_CACHE_MEMORY_ENTRIES, RESULT_CACHE_MAX_DISK_BYTES,
+    SEMANTIC_CACHE_THRESHOLD (a minimum cosine similarity) and
+    SEMANTIC_CACHE_TTL_SECONDS.
+
+    Args:
+        name (str): The variant name used in requests and cache entries.
+        variant_dir (str): Directory for the variant's own index files and result cache.
+        model_dir (str): Directory of the fine-tuned model or adapter.
+        dataset_path (str): Path to the JSON dataset used to build the index.
+        device (torch.device): The device the model runs on.
+        runtime (str): Classifier runtime for the default loader (see load_classifier).
+        loader (Callable, optional): Returns the (model, tokenizer) pair. Defaults to
+            loading `model_dir` with `runtime`.
+        resources (ResourceRegistry, optional): RAG resources shared with other
+            variants. Ignored with `shared_encoder`, which needs an index of its own.
+        shared_encoder (bool): Retrieve with the classifier's own encoder, so a
+            request needs a single forward pass.
+
+    Returns:
+        ModelVariant: The variant, not loaded yet.
+    """
+    if loader is None:
+        def loader():
+            return load_classifier(model_dir, runtime, device), RobertaTokenizerFast.from_pretrained(model_dir)
+
+    variant = ModelVariant(
+        name,
+        model_dir,
+        loader,
+        device,
+        cache=None,
+        semantic_cache=SemanticCache(
+            threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+            ttl_seconds=float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", 3600)),
+        ),
+        runtime=runtime,
+        shared_encoder=shared_encoder,
+        max_batch_size=int(os.environ.get("MICROBATCH_MAX_BATCH_SIZE", 16)),
+        max_wait_ms=float(os.environ.get("MICROBATCH_MAX_WAIT_MS", 5)),
+    )
+
+    if shared_encoder:
+        def embedding_loader():
+            variant.load()
+            return SharedEncoder(variant.model, model_dir), variant.tokenizer
+
+        resources = create_resources(variant_dir, dataset_path, embedding_loader, shared_encoder=True)
+    elif resources is None:
+        resources = create_resources(variant_dir, dataset_path)
+    variant.resources = resources
+    # Fixes generated with an older model or index are not reused after a reload
+    resources.add_reload_listener(variant.semantic_cache.clear)
+
+    # Cache of categories and generated fixes, invalidated when the model or index changes.
+    # Quantized runtimes can disagree with fp32 on borderline inputs, so they get their own entries.
+    variant.cache = ResultCache(
+        variant=name if runtime == "torch" else f"{name}-{runtime}",
+        cache_dir=os.environ.get("RESULT_CACHE_DIR", os.path.join(variant_dir, "result_cache")),
+        dependencies={
+            "category": [model_dir],
+            "fix": [model_dir, resources.index_file, resources.data_file],
+        },
+        memory_entries=int(os.environ.get("RESULT_CACHE_MEMORY_ENTRIES", 1024)),
+        max_disk_bytes=int(os.environ.get("RESULT_CACHE_MAX_DISK_BYTES", 256 * 1024 * 1024)),
+    )
+    return variant
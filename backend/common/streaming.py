@@ -0,0 +1,95 @@
+import json
+
+from common.generation.rag_generator import embed_query, extract_predicted_code, is_failed_fix, rag_stream_solution
+from common.telemetry import span
+
+# Server-Sent Events helpers for streaming generated fixes to the frontend
+
+
+def format_sse(event, data):
+    """
+    Format one Server-Sent Event with a JSON payload.
+
+    Args:
+        event (str): The event name.
+        data (Dict): The payload, serialized as JSON on a single data line.
+
+    Returns:
+        str: The encoded event, terminated by a blank line.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def iter_fix_events(test_case, fix_category, rag, cache=None, semantic_cache=None, query_embedding=None):
+    """
+    Stream a generated fix as Server-Sent Events.
+
+    Emits a `token` event for every generated chunk and a final `done` event with
+    the complete fix and the extracted code, or an `error` event if generation fails.
+    A fix found in the result cache, or stored for a near-duplicate query in the
+    semantic cache, is sent as a single `done` event.
+
+    Args:
+        test_case (str): The input test case to fix.
+        fix_category (str): The predicted fix category.
+        rag (RagResources): Warm RAG resources.
+        cache (ResultCache, optional): Cache of previously generated fixes.
+        semantic_cache (SemanticCache, optional): Cache of fixes for similar queries.
+        query_embedding (np.ndarray, optional): A precomputed embedding of the test case.
+
+    Yields:
+        str: The encoded events.
+    """
+    cached_fix = cache.get("fix", test_case) if cache is not None else None
+    if cached_fix is not None:
+        yield format_sse("done", {
+            "predictedCategory": fix_category,
+            "generatedFix": cached_fix,
+            "predictedCode": extract_predicted_code(cached_fix),
+            "cached": True,
+        })
+        return
+
+    semantic_outcome = None
+    if semantic_cache is not None:
+        if query_embedding is None:
+            query_embedding = embed_query(test_case, rag.embedding_model, rag.embedding_tokenizer)
+        with span("semantic_cache"):
+            entry, similarity = semantic_cache.lookup(query_embedding, fix_category)
+        semantic_outcome = {"hit": entry is not None, "similarity": similarity}
+        if entry is not None:
+            yield format_sse("done", {
+                "predictedCategory": fix_category,
+                "generatedFix": entry["fix"],
+                "predictedCode": extract_predicted_code(entry["fix"]),
+                "cached": False,
+                "semanticCache": semantic_outcome,
+            })
+            return
+
+    chunks = []
+    try:
+        for token in rag_stream_solution(test_case, fix_category, rag.embedding_model, rag.embedding_tokenizer,
+                                         rag.faiss_index, rag.indexed_data, rag.llama_model, rag.llm_client,
+                                         query_embedding=query_embedding):
+            chunks.append(token)
+            yield format_sse("token", {"token": token})
+    except Exception as e:
+        print(f"Error during streamed fix generation: {e}")
+        yield format_sse("error", {"error": str(e)})
+        return
+
+    generated_fix = "".join(chunks).strip()
+    if not is_failed_fix(generated_fix):
+        if cache is not None:
+            cache.set("fix", test_case, generated_fix)
+        if semantic_cache is not None:
+            semantic_cache.add(query_embedding, generated_fix, fix_category, test_case)
+
+    yield format_sse("done", {
+        "predictedCategory": fix_category,
+        "generatedFix": generated_fix,
+        "predictedCode": extract_predicted_code(generated_fix),
+        "cached": False,
+        "semanticCache": semantic_outcome,
+    })
@@ -0,0 +1,144 @@
+import contextlib
+import contextvars
+import json
+import os
+import time
+import uuid
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+# Timing spans, Prometheus metrics and structured request logs
+
+# Seconds, from sub-millisecond cache and FAISS lookups up to slow LLM generations
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram("deflakynator_stage_duration_seconds", "Time spent in each stage of serving a request.",
+                          ["stage"], buckets=LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram("deflakynator_request_duration_seconds", "Request latency by endpoint and status.",
+                            ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS)
+ERRORS = Counter("deflakynator_errors", "Errors raised in a stage.", ["stage"])
+CACHE_LOOKUPS = Counter("deflakynator_cache_lookups", "Cache lookups by cache, entry kind and outcome.",
+                        ["cache", "kind", "outcome"])
+# Summed over the live workers when gunicorn runs several
+QUEUE_DEPTH = Gauge("deflakynator_queue_depth", "Items waiting in a queue.", ["queue"], multiprocess_mode="livesum")
+BATCH_SIZE = Histogram("deflakynator_batch_size", "Requests per classification forward pass.", ["batcher"],
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+# REQUEST_LOGS=0 turns the per-request JSON log lines off
+REQUEST_LOGS = os.environ.get("REQUEST_LOGS", "1") != "0"
+
+
+class RequestTrace:
+    """
+    The spans recorded while serving one request or background job, logged as
+    a single JSON line when it finishes.
+    """
+
+    def __init__(self, request_id, event="request"):
+        self.request_id = request_id
+        self.event = event
+        self.fields = {}
+        self.spans = []
+        self.start = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def start_trace(request_id=None, event="request"):
+    """
+    Start collecting the spans of the current request (or job) under a request
+    id, a new one unless the caller passed one in.
+
+    Returns:
+        RequestTrace: The trace, to pass to finish_trace.
+    """
+    trace = RequestTrace(request_id or uuid.uuid4().hex, event)
+    _current_trace.set(trace)
+    return trace
+
+
+def annotate(**fields):
+    # Add fields, e.g. the variant, to the log line of the current request
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+def finish_trace(trace, **fields):
+    """
+    Stop collecting spans for a trace and write its log line: the request id,
+    total duration, the given fields and the milliseconds spent in each stage.
+    """
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+    if not REQUEST_LOGS:
+        return
+
+    spans = {}
+    for stage, milliseconds in trace.spans:
+        spans[stage] = round(spans.get(stage, 0.0) + milliseconds, 3)
+    record = {"event": trace.event, "request_id": trace.request_id, "duration_ms": round(trace.elapsed() * 1000, 3),
+              **trace.fields, **fields, "spans": spans}
+    print(json.dumps(record), flush=True)
+
+
+@contextlib.contextmanager
+def traced(event, request_id=None, **fields):
+    """
+    Trace a unit of work outside a Flask request, such as a background job,
+    and log it when it finishes.
+    """
+    trace = start_trace(request_id, event)
+    status = "ok"
+    try:
+        yield trace
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        finish_trace(trace, status=status, **fields)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """
+    Time a stage: the duration goes into the stage histogram and the current
+    request's trace, and an exception raised inside counts as an error of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, elapsed * 1000))
+
+
+def render_metrics():
+    """
+    Return the metrics in the Prometheus text format and its content type.
+    Under serve.py, which sets PROMETHEUS_MULTIPROC_DIR, the samples of all
+    gunicorn workers are merged, so any worker can answer a scrape.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,102 @@
+"""
+Serve several classifier variants (FFT and PEFT by default) from one process.
+
+Requests choose a variant with a `variant` field in the JSON body or a
+`?variant=` query parameter; GET /api/variants lists them. The PEFT LoRA
+adapters attach to one shared copy of the base UniXcoder weights, which also
+produces the retrieval embeddings, so the process holds two encoders instead
+of the four used by the separate FFT and PEFT servers.
+
+Environment:
+    MODEL_VARIANTS          Comma-separated variants to serve (default: fft,peft).
+    DEFAULT_VARIANT         Variant used when a request names none (default: the first).
+    PEFT_MERGE_ADAPTERS     1 to merge each adapter into its own copy of the base
+                            weights: faster per request, but uses more memory.
+    CLASSIFIER_RUNTIME      torch, int8, onnx or onnx-int8 (see common.classification.runtimes).
+                            Adapters are only shared with the torch runtime.
+    SHARED_ENCODER          1 to retrieve with each variant's own encoder.
+    INFERENCE_*, TORCH_*    Inference threads, pinning and torch.compile (see common.inference_config).
+
+Usage (from the backend directory):
+    python multi-rag.py
+"""
+import os
+import sys
+import torch
+import warnings
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(backend_dir)
+
+from transformers import RobertaTokenizerFast
+from common.inference_config import configure_inference, inference_config_from_env
+from common.serving.adapters import AdapterHost
+from common.serving.app import create_app
+from common.serving.variants import build_variant, create_resources
+
+# Ignore weight initialization warnings
+warnings.filterwarnings("ignore", message="Some weights of")
+
+CLASSIFIER_RUNTIME = os.environ.get("CLASSIFIER_RUNTIME", "torch")
+SHARED_ENCODER = os.environ.get("SHARED_ENCODER", "0") == "1"
+PEFT_MERGE_ADAPTERS = os.environ.get("PEFT_MERGE_ADAPTERS", "0") == "1"
+MODEL_VARIANTS = [name.strip() for name in os.environ.get("MODEL_VARIANTS", "fft,peft").split(",") if name.strip()]
+
+# Thread counts, core pinning, inference mode and torch.compile (see common.inference_config)
+configure_inference(inference_config_from_env())
+
+# Determine if MPS is available, otherwise use CPU (the quantized and ONNX runtimes are CPU only)
+device = torch.device("mps" if torch.backends.mps.is_available() and CLASSIFIER_RUNTIME == "torch" else "cpu")
+
+dataset_path = os.path.join(backend_dir, 'data', '6000-merged_dataset.json')
+
+# Base UniXcoder weights shared by the LoRA adapters and the retrieval embeddings
+adapter_host = AdapterHost(device=device)
+
+
+def load_base_encoder():
+    return adapter_host.embedding_model(), RobertaTokenizerFast.from_pretrained(adapter_host.base_model_name)
+
+
+# One FAISS index over the base embeddings, shared by every variant that does not use its own encoder
+resources = create_resources(os.path.join(backend_dir, 'rag_index'), dataset_path, embedding_loader=load_base_encoder)
+
+
+def peft_loader(model_dir):
+    def loader():
+        model = adapter_host.classifier("peft", model_dir, merge=PEFT_MERGE_ADAPTERS)
+        return model, RobertaTokenizerFast.from_pretrained(model_dir)
+    return loader
+
+
+# Fine-tuned model directory and, for LoRA variants, the loader attaching it to the shared base
+VARIANT_MODELS = {
+    "fft": (os.path.join(backend_dir, 'unixcoder-fft', 'trained_model', 'fft_unixcoder'), None),
+    "peft": (os.path.join(backend_dir, 'unixcoder-peft', 'trained_model', 'peft_unixcoder'), peft_loader),
+}
+
+variants = {}
+for name in MODEL_VARIANTS:
+    if name not in VARIANT_MODELS:
+        raise ValueError(f"Unknown model variant '{name}', expected one of {', '.join(VARIANT_MODELS)}")
+    model_dir, adapter_loader = VARIANT_MODELS[name]
+    variants[name] = build_variant(
+        name,
+        variant_dir=os.path.dirname(os.path.dirname(model_dir)),
+        model_dir=model_dir,
+        dataset_path=dataset_path,
+        device=device,
+        runtime=CLASSIFIER_RUNTIME,
+        loader=adapter_loader(model_dir) if adapter_loader and CLASSIFIER_RUNTIME == "torch" else None,
+        resources=resources,
+        shared_encoder=SHARED_ENCODER,
+    )
+
+app = create_app(variants, default_variant=os.environ.get("DEFAULT_VARIANT"))
+
+# Main entry point for the Flask app
+if __name__ == '__main__':
+    for variant in variants.values():
+        variant.warm_up()
+    app.run(debug=True, host='0.0.0.0', port=5006)
@@ -0,0 +1,190 @@
+"""
+Production entry point: serve one of the Flask apps with gunicorn workers.
+
+The parent process loads the models, the FAISS index and the indexed dataset
+and warms them up before forking, so the workers share the weights
+copy-on-write instead of each loading their own. Every worker gets its own
+slice of the cores (see common.inference_config) and a few threads, whose
+requests the micro-batcher groups into shared forward passes.
+
+GET /ready answers 503 until warm-up has finished and 200 afterwards, so a
+load balancer only routes to warm workers. `kill -HUP <parent pid>` reloads
+gracefully: the parent loads the models and index again from disk, then
+replaces the workers one generation at a time while in-flight requests finish.
+
+GET /metrics serves the Prometheus metrics of all workers together: their
+samples are kept in PROMETHEUS_MULTIPROC_DIR (a fresh temporary directory
+unless set), so any worker can answer a scrape.
+
+Asynchronous fix jobs (`"async": true`) run in the worker that accepted them,
+and their statuses are shared through JOB_STATE_DIR (a fresh temporary
+directory unless set), so /api/jobs/<id> answers from any worker. A job whose
+worker dies while it runs stays 'running' until it expires.
+
+Environment (the command-line options take precedence):
+    SERVE_WORKERS           Worker processes (default: 2).
+    SERVE_THREADS           Request threads per worker (default: 8).
+    SERVE_BIND              Address to listen on (default: 0.0.0.0 and the app's usual port).
+    SERVE_TIMEOUT           Seconds before a silent worker is restarted (default: 300, fix generation is slow).
+    SERVE_PRELOAD           0 to load the models in every worker instead of once in the parent.
+    PROMETHEUS_MULTIPROC_DIR  Where the workers write their metric samples; emptied at startup.
+    JOB_STATE_DIR           Where the workers share the statuses of asynchronous jobs.
+    Plus the settings of the served app, e.g. CLASSIFIER_RUNTIME or MODEL_VARIANTS.
+
+Usage (from the backend directory):
+    python serve.py multi --workers 4
+    python serve.py fft --bind 127.0.0.1:5004
+"""
+import argparse
+import glob
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+
+from gunicorn.app.base import BaseApplication
+
+# Add the backend directory to the Python path
+backend_dir = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(backend_dir)
+
+# Launcher module and usual port of every app
+APPS = {
+    "fft": (os.path.join(backend_dir, 'unixcoder-fft', 'fft-rag.py'), 5004),
+    "peft": (os.path.join(backend_dir, 'unixcoder-peft', 'peft-rag.py'), 5005),
+    "multi": (os.path.join(backend_dir, 'multi-rag.py'), 5006),
+}
+
+
+def load_app(path):
+    """
+    Import a launcher script (their file names are not valid module names) and return its Flask app.
+    """
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def warm_up_variants(app):
+    for variant in app.extensions["variants"].values():
+        variant.warm_up()
+
+
+def pre_fork(server, worker):
+    # Runs in the parent: give the new worker the lowest core slice no live worker holds
+    taken = {getattr(other, "slot", None) for other in server.WORKERS.values()}
+    free = [slot for slot in range(server.cfg.workers) if slot not in taken]
+    worker.slot = free[0] if free else len(server.WORKERS) % server.cfg.workers
+
+
+def post_fork(server, worker):
+    from common.inference_config import configure_inference, inference_config_from_env
+
+    configure_inference(inference_config_from_env(), worker.slot)
+
+
+def post_worker_init(worker):
+    # Without preloading every worker loads its own models; /ready reports 503 until they are warm
+    if not worker.cfg.preload_app:
+        threading.Thread(target=warm_up_variants, args=(worker.wsgi,), name="warm-up", daemon=True).start()
+
+
+def child_exit(server, worker):
+    # Stop counting the queue depths of a worker that has exited
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def prepare_metrics_dir():
+    """
+    Point prometheus_client at a directory the workers share their samples
+    through. This has to happen before the app (and prometheus_client) is imported.
+    """
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not metrics_dir:
+        metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    os.makedirs(metrics_dir, exist_ok=True)
+    # Samples of an earlier run would be added to this one's
+    for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+        os.remove(path)
+
+
+def prepare_job_state_dir():
+    # Must be set before the app creates its job queue
+    if not os.environ.get("JOB_STATE_DIR"):
+        os.environ["JOB_STATE_DIR"] = tempfile.mkdtemp(prefix="jobs-")
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        warm_up_variants(server.app.wsgi())
+        server.log.info("Models and RAG resources are warm, starting the workers.")
+
+
+def on_reload(server):
+    # Reload in the parent, so that the replacement workers fork from the new models
+    if server.cfg.preload_app:
+        for variant in server.app.wsgi().extensions["variants"].values():
+            variant.reload()
+
+
+class PreforkServer(BaseApplication):
+    """
+    Runs a Flask app under gunicorn with the options and hooks above.
+    """
+
+    def __init__(self, app_path, options):
+        self.app_path = app_path
+        self.options = options
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        if self.application is None:
+            self.application = load_app(self.app_path)
+        return self.application
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", choices=list(APPS), help="Which app to serve.")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVE_WORKERS", 2)))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("SERVE_THREADS", 8)))
+    parser.add_argument("--bind", default=os.environ.get("SERVE_BIND"))
+    parser.add_argument("--timeout", type=int, default=int(os.environ.get("SERVE_TIMEOUT", 300)))
+    parser.add_argument("--no-preload", action="store_true", default=os.environ.get("SERVE_PRELOAD", "1") == "0",
+                        help="Load the models in every worker instead of once in the parent.")
+    args = parser.parse_args()
+
+    app_path, port = APPS[args.app]
+    # The workers split the cores between them (see common.inference_config)
+    os.environ.setdefault("INFERENCE_WORKERS", str(args.workers))
+    prepare_metrics_dir()
+    prepare_job_state_dir()
+
+    PreforkServer(app_path, {
+        "bind": args.bind or f"0.0.0.0:{port}",
+        "workers": args.workers,
+        "worker_class": "gthread",
+        "threads": args.threads,
+        "timeout": args.timeout,
+        "graceful_timeout": args.timeout,
+        "preload_app": not args.no_preload,
+        "pre_fork": pre_fork,
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+        "child_exit": child_exit,
+        "when_ready": when_ready,
+        "on_reload": on_reload,
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Tests for the micro-batcher's worker and queue bookkeeping, with the
+classifier replaced by a stand-in that labels every test case.
+
+Run from the backend directory:
+
+    python3 -m pytest tests
+"""
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from common.classification import batching
+from common.classification.batching import MicroBatcher
+
+STOP = "stop the worker"
+
+
+@pytest.fixture
+def release(monkeypatch):
+    # Forward passes wait until the test sets the event
+    event = threading.Event()
+
+    def predict_fix_categories(texts, model, tokenizer, device, length_buckets=None):
+        event.wait(5)
+        if STOP in texts:
+            # Not an Exception, so it escapes the worker's error handling and ends its thread
+            raise SystemExit
+        return [f"category of {text}" for text in texts]
+
+    monkeypatch.setattr(batching, "predict_fix_categories", predict_fix_categories)
+    return event
+
+
+def queue_depth(batcher):
+    return batcher._queue_depth._value.get()
+
+
+def test_cancelled_request_does_not_stop_the_worker(release):
+    batcher = MicroBatcher(None, None, None, max_batch_size=1, max_wait_ms=0, name="test-cancel")
+    first = batcher.submit("a")
+    cancelled = batcher.submit("b")
+    assert cancelled.cancel()
+    last = batcher.submit("c")
+    release.set()
+
+    assert first.result(timeout=5) == "category of a"
+    assert last.result(timeout=5) == "category of c"
+    assert batcher._worker.is_alive()
+    assert queue_depth(batcher) == 0
+
+
+# The worker is stopped on purpose, so its uncaught SystemExit is expected
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_replacement_worker_answers_waiting_requests(release):
+    batcher = MicroBatcher(None, None, None, max_batch_size=1, max_wait_ms=0, name="test-replace")
+    release.set()
+    batcher.submit(STOP)
+    dead_worker = batcher._worker
+    dead_worker.join(5)
+    assert not dead_worker.is_alive()
+
+    # A request left in the queue of the worker that died
+    waiting = Future()
+    batcher._queue_depth.inc()
+    batcher._queue.put(("waiting", waiting, False))
+
+    assert batcher.predict("new", timeout=5) == "category of new"
+    assert batcher._worker is not dead_worker and batcher._worker.is_alive()
+    assert waiting.result(timeout=5) == "category of waiting"
+    assert queue_depth(batcher) == 0
+
+
+def test_forked_child_starts_with_an_empty_queue(release):
+    batcher = MicroBatcher(None, None, None, max_wait_ms=0, name="test-fork")
+    # Requests the parent queued before the fork, which no worker in the child will answer
+    batcher._worker_pid = -1
+    batcher._queue = queue.Queue()
+    for text in ("a", "b"):
+        batcher._queue_depth.inc()
+        batcher._queue.put((text, Future(), False))
+
+    release.set()
+    assert batcher.predict("c", timeout=5) == "category of c"
+    assert batcher._worker_pid == os.getpid()
+    assert queue_depth(batcher) == 0
@@ -0,0 +1,106 @@
+"""
+Tests for the Ollama HTTP client and the CLI fallback of the fix generators,
+run against the stub server in common.generation.stub_llm_server.
+
+Run from the backend directory:
+
+    python3 -m pytest tests
+"""
+import os
+import socket
+import sys
+
+import pytest
+import requests
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from common.generation import rag_generator
+from common.generation.llm_client import OllamaClient
+from common.generation.stub_llm_server import STUB_RESPONSE, start_stub_server
+
+
+@pytest.fixture
+def server():
+    server = start_stub_server("127.0.0.1")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cli_calls(monkeypatch):
+    # Stands in for `ollama run`, which is not installed where the tests run
+    calls = []
+
+    def generate_fix_cli(model_name, prompt):
+        calls.append(model_name)
+        return "cli fix"
+
+    monkeypatch.setattr(rag_generator, "generate_fix_cli", generate_fix_cli)
+    return calls
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_generate(server):
+    client = OllamaClient("llama3.1", host=server.url)
+    assert client.generate("Fix this test") == STUB_RESPONSE
+    assert server.requests_served == 1
+
+
+def test_stream(server):
+    client = OllamaClient("llama3.1", host=server.url)
+    chunks = list(client.stream("Fix this test"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == STUB_RESPONSE
+
+
+def test_connections_are_reused(server):
+    client = OllamaClient("llama3.1", host=server.url)
+    for _ in range(3):
+        client.generate("Fix this test")
+        list(client.stream("Fix this test"))
+    assert server.requests_served == 6
+    # Streamed responses are read to the end, so they hand their connection back to the pool too
+    assert server.connections_accepted == 1
+    client.close()
+
+
+def test_is_available(server):
+    assert OllamaClient("llama3.1", host=server.url).is_available()
+    assert not OllamaClient("llama3.1", host=f"http://127.0.0.1:{unused_port()}").is_available()
+
+
+def test_unknown_model_raises_http_error(server):
+    client = OllamaClient("missing-model", host=server.url)
+    with pytest.raises(requests.HTTPError):
+        client.generate("Fix this test")
+    with pytest.raises(requests.HTTPError):
+        list(client.stream("Fix this test"))
+
+
+def test_generate_fix_uses_the_server(server, cli_calls):
+    client = OllamaClient("llama3.1", host=server.url)
+    assert rag_generator.generate_fix("llama3.1", "Fix this test", client) == STUB_RESPONSE.strip()
+    assert "".join(rag_generator.stream_fix("llama3.1", "Fix this test", client)) == STUB_RESPONSE
+    assert cli_calls == []
+
+
+def test_generate_fix_falls_back_on_http_error(server, cli_calls):
+    client = OllamaClient("missing-model", host=server.url)
+    assert rag_generator.generate_fix("missing-model", "Fix this test", client) == "cli fix"
+    assert list(rag_generator.stream_fix("missing-model", "Fix this test", client)) == ["cli fix"]
+    assert cli_calls == ["missing-model", "missing-model"]
+
+
+def test_generate_fix_falls_back_when_unreachable(cli_calls):
+    client = OllamaClient("llama3.1", host=f"http://127.0.0.1:{unused_port()}")
+    assert rag_generator.generate_fix("llama3.1", "Fix this test", client) == "cli fix"
+    assert list(rag_generator.stream_fix("llama3.1", "Fix this test", client)) == ["cli fix"]
+    assert cli_calls == ["llama3.1", "llama3.1"]
@@ -0,0 +1,50 @@
+"""
+Tests for the semantic cache of generated fixes.
+
+Run from the backend directory:
+
+    python3 -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from common.generation.semantic_cache import SemanticCache
+
+
+def embedding(*values):
+    return np.array([values], dtype="float32")
+
+
+def test_hits_by_cosine_similarity_whatever_the_scale():
+    cache = SemanticCache(dimension=3, threshold=0.95)
+    cache.add(embedding(10.0, 0.0, 0.0), "fix", "Add Mock")
+
+    entry, similarity = cache.lookup(embedding(0.5, 0.05, 0.0), "Add Mock")
+    assert entry["fix"] == "fix"
+    assert similarity > 0.99
+
+    entry, similarity = cache.lookup(embedding(10.0, 10.0, 0.0), "Add Mock")
+    assert entry is None
+    assert abs(similarity - 0.7071) < 1e-3
+
+
+def test_category_must_match():
+    cache = SemanticCache(dimension=3, threshold=0.95)
+    cache.add(embedding(1.0, 0.0, 0.0), "fix", "Add Mock")
+    assert cache.lookup(embedding(1.0, 0.0, 0.0), "Change Assertion")[0] is None
+
+
+def test_clear_drops_every_entry():
+    cache = SemanticCache(dimension=3, threshold=0.95)
+    cache.add(embedding(1.0, 0.0, 0.0), "fix", "Add Mock")
+    cache.clear()
+    assert cache.lookup(embedding(1.0, 0.0, 0.0), "Add Mock") == (None, None)
+    assert cache.stats()["entries"] == 0
+
+    cache.add(embedding(0.0, 1.0, 0.0), "new fix", "Add Mock")
+    assert cache.lookup(embedding(0.0, 2.0, 0.0), "Add Mock")[0]["fix"] == "new fix"
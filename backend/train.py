@@ -0,0 +1,62 @@
+"""
+Fine-tune the classifier from a config file, or sweep hyperparameters around one.
+
+A training config (see configs/fft.json and configs/peft.json) lists the
+settings that differ from common.classification.finetune.DEFAULT_CONFIG, with
+paths relative to the config file. `run` trains one model; `sweep` trains a
+grid of variations concurrently, each trial pinned to its own cores, stops
+trials whose eval F1 falls behind the others and ranks them all by F1 and
+training throughput in <output_dir>/leaderboard.json.
+
+Both pick up where they left off: a training run continues from the latest
+checkpoint in its output_dir (--set resume=false starts over) unless it was
+trained with different settings, and a sweep skips the trials that already
+finished.
+
+Usage (from the backend directory):
+    python train.py run configs/fft.json
+    python train.py run configs/peft.json --set epochs=3 --set training_mode=throughput
+    python train.py sweep configs/sweep_lora.json
+"""
+import argparse
+import os
+import sys
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from common.classification.finetune import load_config, parse_value, train_model
+from common.classification.sweep import load_sweep, run_sweep
+
+
+def parse_overrides(assignments):
+    overrides = {}
+    for assignment in assignments:
+        key, separator, value = assignment.partition("=")
+        if not separator:
+            raise SystemExit(f"Expected key=value, got '{assignment}'")
+        overrides[key] = parse_value(value)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Train one model from a config file.")
+    run_parser.add_argument("config", help="Training config (JSON).")
+    run_parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                            help="Override a config setting; values are parsed as JSON where possible.")
+
+    sweep_parser = commands.add_parser("sweep", help="Run a hyperparameter sweep.")
+    sweep_parser.add_argument("config", help="Sweep config (JSON).")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        train_model(load_config(args.config, parse_overrides(args.set)))
+    else:
+        run_sweep(load_sweep(args.config))
+
+
+if __name__ == '__main__':
+    main()
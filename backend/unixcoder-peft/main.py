@@ -1,24 +1,27 @@
 # Standard Library Imports
+import argparse
 import json
 import os
 import re
+import sys
 
 # Third-Party Library Imports 
 from codebleu import calc_codebleu
-from peft import get_peft_model, LoraConfig, TaskType
 import torch
-from transformers import RobertaForSequenceClassification, RobertaTokenizerFast, Trainer, TrainingArguments, AutoModel
+from transformers import RobertaForSequenceClassification, RobertaTokenizerFast, AutoModel
 import random
 import numpy as np
 
 # Local Relative Imports
-from common.classification.dataset import load_dataset
-from common.classification.preprocess import preprocess_data
-from common.classification.tokenization import tokenize_data
+from common.classification.finetune import load_config, train_model
 from common.classification.prediction import predict_fix_category
-from common.classification.metrics import compute_metrics
 from common.generation.rag_generator import build_faiss_index, rag_generate_solution, setup_llama
 
+parser = argparse.ArgumentParser(description="Train or load the PEFT classifier, then try it on test cases interactively.")
+parser.add_argument("--non-interactive", action="store_true", default=os.environ.get("NON_INTERACTIVE") == "1",
+                    help="Train (resuming from the latest checkpoint in ./results), evaluate, save the model and exit.")
+args = parser.parse_args()
+
 torch.manual_seed(3)
 random.seed(3)
 np.random.seed(3)
@@ -26,7 +29,6 @@ np.random.seed(3)
 device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
 
 dataset_path = '../data/6000-merged_dataset.json'
-raw_dataset = load_dataset(dataset_path)
 
 save_directory = './trained_model/peft_unixcoder'
 
@@ -39,71 +41,13 @@ if os.path.exists(save_directory):
     model.to(device)
 
 else:
-    dataset = preprocess_data(raw_dataset)
-
-    dataset = dataset.train_test_split(test_size=0.2)
-
-    unixcoder = "microsoft/unixcoder-base"
-    tokenizer = RobertaTokenizerFast.from_pretrained(unixcoder)
-
-    model = RobertaForSequenceClassification.from_pretrained(unixcoder, num_labels=6)
-
-    peft_config = LoraConfig(
-        task_type=TaskType.SEQ_CLS,  # For sequence-to-sequence tasks like code generation
-        inference_mode=False,             # Enable training mode
-        r=16,                              # The rank of the LoRA approximation
-        lora_alpha=64,                    # The scaling factor for LoRA
-        lora_dropout=0.05,                 # Dropout to avoid overfitting
-    )
-
-    model = get_peft_model(model, peft_config)
-
-    model.to(device)
+    # The training settings live in configs/peft.json; train.py runs it, or a sweep around it, on its own
+    model, tokenizer, _ = train_model(load_config('../configs/peft.json'), device)
 
-    tokenized_datasets = dataset.map(lambda x: tokenize_data(x, tokenizer), batched=True)
-
-    # Set training arguments
-    training_args = TrainingArguments(
-        output_dir="./results",
-        eval_strategy="epoch",
-        save_strategy="epoch",
-        learning_rate=1e-5,
-        per_device_train_batch_size=8,
-        per_device_eval_batch_size=8,
-        num_train_epochs=10,
-        weight_decay=0.01,
-        logging_dir='./logs',
-        logging_steps=10,
-        save_steps=500,
-        save_total_limit=2,
-        load_best_model_at_end=True,
-        metric_for_best_model="f1"
-    )
-
-    trainer = Trainer(
-        model=model,
-        args=training_args,
-        train_dataset=tokenized_datasets["train"],
-        eval_dataset=tokenized_datasets["test"],
-        tokenizer=tokenizer,
-        compute_metrics=compute_metrics
-    )
-
-    print("Training the model...")
-    trainer.train()
-
-    training_logs = trainer.state.log_history
-    print(f"Training Log: {training_logs}")
-
-    eval_results = trainer.evaluate()
-    print(f"Evalution Results: {eval_results}")
-
-    with open('./result_logs.json', 'w') as f:
-        json.dump({'training_logs': training_logs, 'eval_results': eval_results}, f, indent=4)
-
-    print("Saving the fine-tuned model...")
-    model.save_pretrained(save_directory)
-    tokenizer.save_pretrained(save_directory)
+# Batch jobs stop here; rerunning one after a crash resumes from the last epoch's checkpoint
+if args.non_interactive:
+    print(f"The fine-tuned model is saved in {save_directory}.")
+    sys.exit(0)
 
 with open('./result_logs.json', 'r') as f:
     data = json.load(f)